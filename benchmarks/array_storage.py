@@ -0,0 +1,70 @@
+"""Compare text and binary storage of measurement arrays in sqlite.
+
+Run from the repository root with python -m benchmarks.array_storage.
+"""
+
+import os as _os
+import json as _json
+import time as _time
+import sqlite3 as _sqlite3
+import tempfile as _tempfile
+import numpy as _np
+
+from stretchedwire.data.arraycodec import (
+    encode_array as _encode_array,
+    decode_array as _decode_array,
+    )
+
+
+def _save_load(con, column_type, encode, decode, arrays, repeat):
+    con.execute('DROP TABLE IF EXISTS bench')
+    con.execute('CREATE TABLE bench (id INTEGER PRIMARY KEY, '
+                'a {0:s}, b {0:s}, c {0:s})'.format(column_type))
+    t0 = _time.perf_counter()
+    for _ in range(repeat):
+        with con:
+            con.execute('INSERT INTO bench (a, b, c) VALUES (?, ?, ?)',
+                        [encode(a) for a in arrays])
+    t1 = _time.perf_counter()
+    for row in con.execute('SELECT a, b, c FROM bench'):
+        [decode(value) for value in row]
+    t2 = _time.perf_counter()
+    size = con.execute(
+        'SELECT SUM(LENGTH(a) + LENGTH(b) + LENGTH(c)) FROM bench'
+        ).fetchone()[0]
+    return (t1 - t0)/repeat, (t2 - t1)/repeat, size/repeat
+
+
+def run(npts=100000, repeat=10):
+    """Print save/load times for the text and binary array encodings."""
+    arrays = [_np.cumsum(_np.random.normal(size=npts)) for _ in range(3)]
+    cases = [
+        ('text', 'TEXT',
+         lambda a: _json.dumps(a.tolist()),
+         lambda v: _np.array(_json.loads(v))),
+        ('binary', 'BLOB',
+         lambda a: _encode_array(a),
+         _decode_array),
+        ('binary+zlib', 'BLOB',
+         lambda a: _encode_array(a, compress=True),
+         _decode_array),
+        ]
+
+    with _tempfile.TemporaryDirectory() as tmp:
+        con = _sqlite3.connect(_os.path.join(tmp, 'bench.db'))
+        try:
+            print('{0:d} points x 3 arrays, {1:d} records'.format(
+                npts, repeat))
+            print('{0:12s} {1:>10s} {2:>10s} {3:>10s}'.format(
+                'encoding', 'save [ms]', 'load [ms]', 'size [MB]'))
+            for name, column_type, encode, decode in cases:
+                save, load, size = _save_load(
+                    con, column_type, encode, decode, arrays, repeat)
+                print('{0:12s} {1:10.2f} {2:10.2f} {3:10.2f}'.format(
+                    name, save*1e3, load*1e3, size/1e6))
+        finally:
+            con.close()
+
+
+if __name__ == '__main__':
+    run()
@@ -21,6 +21,9 @@ setup(
         'pyqtgraph',
         'qtpy',
     ],
+    extras_require={
+        'columnar': ['pyarrow'],
+    },
     package_data={'stretched-wire': ['VERSION']},
     include_package_data=True,
     test_suite='nose.collector',
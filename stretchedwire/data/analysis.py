@@ -0,0 +1,157 @@
+"""Stretched wire data analysis module."""
+
+import numpy as _np
+
+from . import cache as _cache
+
+
+ANALYSIS_VERSION = 1
+
+DEFAULT_PARAMETERS = {
+    # factor applied to the field integrals (e.g. integrator calibration)
+    'integration_constant': 1.0,
+    # order of the drift polynomial removed from each scan (None disables)
+    'drift_order': None,
+    # number of points at each end of a scan used to fit the drift
+    'drift_points': 0,
+    }
+
+# analysis results of the measurement, results and reprocessing paths. The
+# cheap results are only kept in memory, the expensive ones also on disk.
+cache = _cache.AnalysisCache(directory=_cache.CACHE_DIR)
+
+
+def get_parameters(parameters=None):
+    """Return the analysis parameters completed with the default values."""
+    params = dict(DEFAULT_PARAMETERS)
+    if parameters is not None:
+        params.update(parameters)
+    return params
+
+
+def get_scans(raw_data, start, end, step):
+    """Reshape raw data to a (n_scans, n_points) array.
+
+    Args:
+        raw_data (array_like): integrator readings of all scans.
+        start (float): scan start position [mm].
+        end (float): scan end position [mm].
+        step (float): distance between trigger positions [mm].
+
+    Returns:
+        numpy.ndarray: raw data of each scan.
+
+    """
+    raw_data = _np.ravel(_np.asarray(raw_data, dtype=float))
+    npts = abs(int((end - start)/step)) - 1
+    if npts < 1 or raw_data.size % npts != 0:
+        raise ValueError(
+            'Raw data size {0:d} is not a multiple of the number of '
+            'scan points {1:d}.'.format(raw_data.size, npts))
+    return raw_data.reshape(-1, npts)
+
+
+def get_positions(start, end, npts):
+    """Return the trigger positions of a scan [mm]."""
+    return _np.linspace(start, end, npts + 1)[1:]
+
+
+def remove_drift(scans, order, npts):
+    """Remove the integrator drift from each scan.
+
+    A polynomial of the sample index is fitted to the first and last npts
+    samples of each scan, where the wire is assumed to be outside the field
+    region, and subtracted from the whole scan.
+
+    Args:
+        scans (numpy.ndarray): (n_scans, n_points) raw data.
+        order (int): polynomial order.
+        npts (int): number of samples used at each end of the scan.
+
+    Returns:
+        numpy.ndarray: corrected scans.
+
+    """
+    if order is None or npts <= 0:
+        return scans
+
+    nscan_pts = scans.shape[1]
+    npts = min(npts, nscan_pts // 2)
+    index = _np.arange(nscan_pts, dtype=float)
+    fit_index = _np.concatenate([index[:npts], index[nscan_pts-npts:]])
+    fit_data = _np.concatenate(
+        [scans[:, :npts], scans[:, nscan_pts-npts:]], axis=1)
+
+    # a single least squares solve for all scans
+    coeffs = _np.polynomial.polynomial.polyfit(
+        fit_index, fit_data.T, order)
+    drift = _np.polynomial.polynomial.polyval(index, coeffs)
+    return scans - drift
+
+
+def field_integral_scans(raw_data, start, end, step, parameters=None,
+                         use_cache=True):
+    """Return the field integral of each scan.
+
+    Args:
+        raw_data (array_like): integrator readings of all scans [V.s].
+        start (float): scan start position [mm].
+        end (float): scan end position [mm].
+        step (float): distance between trigger positions [mm].
+        parameters (dict): analysis parameters.
+        use_cache (bool): return the cached result of the same inputs.
+
+    Returns:
+        numpy.ndarray: (n_scans, n_points) field integrals.
+
+    """
+    params = get_parameters(parameters)
+    if not use_cache:
+        return _field_integral_scans(raw_data, start, end, step, params)
+
+    raw_data = _np.asarray(raw_data, dtype=float)
+    key = _cache.get_key(
+        'field_integral_scans', [raw_data],
+        parameters={
+            'start': start, 'end': end, 'step': step,
+            'parameters': params},
+        version=ANALYSIS_VERSION)
+    return cache.get_or_calculate(
+        key, lambda: {'scans': _field_integral_scans(
+            raw_data, start, end, step, params)}, disk=False)['scans']
+
+
+def _field_integral_scans(raw_data, start, end, step, params):
+    scans = get_scans(raw_data, start, end, step)
+    scans = remove_drift(
+        scans, params['drift_order'], params['drift_points'])
+    return scans/(abs(step)*0.001)*params['integration_constant']
+
+
+def field_integral(raw_data, start, end, step, parameters=None):
+    """Return the field integral averaged over the scans."""
+    return field_integral_scans(
+        raw_data, start, end, step, parameters=parameters).mean(axis=0)
+
+
+def calculate_integrals(meas_type, raw_data, start, end, step,
+                        parameters=None):
+    """Calculate the field integrals of a measurement.
+
+    Args:
+        meas_type (str): 'First Integral' or 'Second Integral'.
+        raw_data (array_like): integrator readings of all scans [V.s].
+        start (float): scan start position [mm].
+        end (float): scan end position [mm].
+        step (float): distance between trigger positions [mm].
+        parameters (dict): analysis parameters.
+
+    Returns:
+        dict: the calculated integral attribute ('first_integral' or
+            'second_integral') and its values.
+
+    """
+    attr = 'second_integral' if meas_type == 'Second Integral' else (
+        'first_integral')
+    return {attr: field_integral(
+        raw_data, start, end, step, parameters=parameters)}
@@ -0,0 +1,394 @@
+"""Measurement archive module.
+
+A measurement archive is a directory with a metadata.json file holding the
+scalar fields of each measurement, including the database only fields, and
+one file per array field, so that arrays can be read and sliced without
+reading the whole archive.
+
+Uncompressed arrays are saved as .npy files and memory-mapped. Compressed
+arrays are split along their first axis in chunks of about chunk_size
+bytes, each one encoded with arraycodec, so slicing a compressed array only
+decompresses the chunks holding the selected rows.
+"""
+
+import os as _os
+import json as _json
+import collections as _collections
+import numpy as _np
+
+from .arraycodec import encode_array as _encode_array
+from .arraycodec import decode_array as _decode_array
+
+
+ARCHIVE_EXTENSION = '.swa'
+METADATA_FILENAME = 'metadata.json'
+CHUNKS_EXTENSION = '.swz'
+DEFAULT_CHUNK_SIZE = 2**20
+
+
+class ChunkedArray():
+    """Read-only array saved in compressed chunks along its first axis.
+
+    Indexing the first axis with an integer or a slice only reads and
+    decompresses the chunks holding the selected rows, and the last chunks
+    read are kept in memory. Other indexes and numpy functions read the
+    whole array.
+    """
+
+    def __init__(self, filename, shape, dtype, chunk_rows, offsets,
+                 max_chunks=4):
+        """Create array.
+
+        Args:
+            filename (str): chunks file path.
+            shape (tuple): array shape.
+            dtype (str): array dtype descriptor.
+            chunk_rows (int): number of rows of each chunk.
+            offsets (list): offsets of the chunks in the file, followed by
+                the file size.
+            max_chunks (int): number of decompressed chunks kept in memory.
+
+        """
+        self.filename = filename
+        self.shape = tuple(shape)
+        self.dtype = _np.dtype(dtype)
+        self.chunk_rows = chunk_rows
+        self.offsets = list(offsets)
+        self.max_chunks = max_chunks
+        self._chunks = _collections.OrderedDict()
+
+    @property
+    def ndim(self):
+        """Number of dimensions."""
+        return len(self.shape)
+
+    @property
+    def size(self):
+        """Number of elements."""
+        return int(_np.prod(self.shape, dtype=_np.int64))
+
+    @property
+    def nbytes(self):
+        """Size of the decompressed array [bytes]."""
+        return self.size*self.dtype.itemsize
+
+    def __len__(self):
+        if self.ndim == 0:
+            raise TypeError('len() of a 0-d array.')
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        if self.ndim == 0:
+            data = self._read_chunk(0)
+        else:
+            data = self._read_rows(0, self.shape[0])
+        if dtype is not None:
+            data = data.astype(dtype)
+        return data
+
+    def __getitem__(self, index):
+        if not isinstance(index, tuple):
+            index = (index, )
+        if self.ndim == 0 or len(index) == 0:
+            return _np.asarray(self)[index]
+
+        first, rest = index[0], index[1:]
+        nrows = self.shape[0]
+        if isinstance(first, (int, _np.integer)):
+            row = first + nrows if first < 0 else first
+            if row < 0 or row >= nrows:
+                raise IndexError(
+                    'Index {0:d} is out of bounds for axis 0 with size '
+                    '{1:d}.'.format(first, nrows))
+            return self._read_rows(row, row + 1)[0][rest]
+
+        if isinstance(first, slice):
+            rows = range(*first.indices(nrows))
+            if len(rows) == 0:
+                data = _np.empty((0, ) + self.shape[1:], dtype=self.dtype)
+            else:
+                low = min(rows[0], rows[-1])
+                data = self._read_rows(low, max(rows[0], rows[-1]) + 1)
+                data = data[rows[0] - low::rows.step]
+            return data[(slice(None), ) + rest]
+
+        return _np.asarray(self)[index]
+
+    def _read_chunk(self, chunk):
+        data = self._chunks.get(chunk)
+        if data is not None:
+            self._chunks.move_to_end(chunk)
+            return data
+
+        start, end = self.offsets[chunk], self.offsets[chunk + 1]
+        with open(self.filename, 'rb') as f:
+            f.seek(start)
+            data = _decode_array(f.read(end - start))
+
+        self._chunks[chunk] = data
+        while len(self._chunks) > self.max_chunks:
+            self._chunks.popitem(last=False)
+        return data
+
+    def _read_rows(self, start, stop):
+        if stop <= start:
+            return _np.empty((0, ) + self.shape[1:], dtype=self.dtype)
+
+        first = start // self.chunk_rows
+        last = (stop - 1) // self.chunk_rows
+        parts = []
+        for chunk in range(first, last + 1):
+            offset = chunk*self.chunk_rows
+            data = self._read_chunk(chunk)
+            parts.append(data[max(start - offset, 0):stop - offset])
+        if len(parts) == 1:
+            return parts[0]
+        return _np.concatenate(parts)
+
+
+def write_chunks(filename, array, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Save an array in compressed chunks along its first axis.
+
+    Only one chunk of the array is copied at a time, so memory-mapped
+    arrays are saved without reading them whole in memory.
+
+    Args:
+        filename (str): chunks file path.
+        array (numpy.ndarray): array data.
+        chunk_size (int): approximate size of each chunk [bytes].
+
+    Returns:
+        dict: shape, dtype, chunk_rows and offsets of the saved chunks.
+
+    """
+    if array.ndim == 0:
+        chunks = [array]
+        chunk_rows = 1
+    else:
+        row_size = max(array.dtype.itemsize*int(
+            _np.prod(array.shape[1:], dtype=_np.int64)), 1)
+        chunk_rows = max(chunk_size // row_size, 1)
+        chunks = (
+            array[start:start+chunk_rows]
+            for start in range(0, array.shape[0], chunk_rows))
+
+    offsets = [0]
+    with open(filename, 'wb') as f:
+        for chunk in chunks:
+            blob = _encode_array(chunk, compress=True)
+            f.write(blob)
+            offsets.append(offsets[-1] + len(blob))
+
+    return {
+        'shape': list(array.shape), 'dtype': array.dtype.str,
+        'chunk_rows': chunk_rows, 'offsets': offsets}
+
+
+class MeasurementArchive():
+    """Directory archive of stretched wire measurements."""
+
+    def __init__(self, path, mode='r', compress=True,
+                 chunk_size=DEFAULT_CHUNK_SIZE):
+        """Open archive.
+
+        Args:
+            path (str): archive directory path.
+            mode (str): 'r' to read or 'a' to read and append measurements.
+            compress (bool): save appended arrays in compressed chunks.
+                Uncompressed arrays are memory-mapped when read.
+            chunk_size (int): approximate size of the compressed chunks
+                [bytes].
+
+        """
+        if mode not in ('r', 'a'):
+            raise ValueError('Invalid archive mode: {0!s}'.format(mode))
+
+        self.path = path
+        self.mode = mode
+        self.compress = compress
+        self.chunk_size = chunk_size
+
+        if _os.path.isdir(path):
+            with open(self._metadata_path, 'r') as f:
+                self.records = _json.load(f)
+        elif mode == 'a':
+            _os.makedirs(path)
+            self.records = []
+            self._write_metadata()
+        else:
+            raise FileNotFoundError(path)
+
+    @property
+    def _metadata_path(self):
+        return _os.path.join(self.path, METADATA_FILENAME)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        return self.read(index)
+
+    def _write_metadata(self):
+        tmp = self._metadata_path + '.tmp'
+        with open(tmp, 'w') as f:
+            _json.dump(self.records, f, indent=1)
+        _os.replace(tmp, self._metadata_path)
+
+    def append(self, meas):
+        """Append a measurement to the archive.
+
+        Args:
+            meas (StretchedWireMeas): measurement object.
+
+        Returns:
+            int: archive index of the measurement.
+
+        """
+        if self.mode != 'a':
+            raise IOError('Archive opened in read-only mode.')
+
+        get_fields_dict = getattr(meas, 'get_fields_dict', None)
+        if get_fields_dict is not None:
+            fields_dict = get_fields_dict()
+        else:
+            fields_dict = meas.db_dict
+
+        index = len(self.records)
+        record = {'fields': {}, 'arrays': {}}
+        for attr, value in fields_dict.items():
+            data = getattr(meas, attr, None)
+            if value['dtype'] is _np.ndarray:
+                if data is not None:
+                    record['arrays'][attr] = self._write_array(
+                        index, attr, _np.asarray(data))
+            elif isinstance(data, _np.generic):
+                record['fields'][attr] = data.item()
+            else:
+                record['fields'][attr] = data
+
+        self.records.append(record)
+        self._write_metadata()
+        return index
+
+    def _write_array(self, index, attr, data):
+        if self.compress:
+            filename = '{0:06d}_{1:s}{2:s}'.format(
+                index, attr, CHUNKS_EXTENSION)
+            info = write_chunks(
+                _os.path.join(self.path, filename), data,
+                chunk_size=self.chunk_size)
+        else:
+            filename = '{0:06d}_{1:s}.npy'.format(index, attr)
+            _np.save(_os.path.join(self.path, filename), data)
+            info = {'shape': list(data.shape), 'dtype': data.dtype.str}
+        info['file'] = filename
+        return info
+
+    def get_fields(self, index):
+        """Return the scalar fields of the measurement."""
+        return dict(self.records[index]['fields'])
+
+    def get_array(self, index, attr):
+        """Return the array of the measurement.
+
+        Uncompressed arrays are returned as read-only memory maps and
+        compressed arrays as ChunkedArray objects, which read their chunks
+        on access.
+
+        Args:
+            index (int): archive index of the measurement.
+            attr (str): array attribute name (e.g. 'raw_data').
+
+        Returns:
+            numpy.ndarray or ChunkedArray: array data or None if not saved.
+
+        """
+        info = self.records[index]['arrays'].get(attr)
+        if info is None:
+            return None
+
+        filename = _os.path.join(self.path, info['file'])
+        if filename.endswith(CHUNKS_EXTENSION):
+            return ChunkedArray(
+                filename, info['shape'], info['dtype'], info['chunk_rows'],
+                info['offsets'])
+        if filename.endswith('.npz'):
+            # archives saved before the arrays were chunked
+            with _np.load(filename) as npz:
+                return npz[attr]
+        return _np.load(filename, mmap_mode='r')
+
+    def read(self, index):
+        """Return a dict with the scalar fields and arrays of the measurement.
+        """
+        data = self.get_fields(index)
+        for attr in self.records[index]['arrays']:
+            data[attr] = self.get_array(index, attr)
+        return data
+
+    def load(self, index, meas):
+        """Load the archived measurement into the measurement object.
+
+        Compressed arrays are read whole, so the measurement can be
+        analysed and saved as usual. Uncompressed arrays are kept as
+        memory maps.
+        """
+        for attr, value in self.read(index).items():
+            if isinstance(value, ChunkedArray):
+                value = _np.asarray(value)
+            setattr(meas, attr, value)
+        return meas
+
+    def find(self, **fields):
+        """Return the archive indices of the measurements matching fields."""
+        return [
+            index for index, record in enumerate(self.records)
+            if all(record['fields'].get(k) == v for k, v in fields.items())]
+
+
+def is_archive_filename(filename):
+    """Check if the filename is a measurement archive path."""
+    return filename.endswith(ARCHIVE_EXTENSION)
+
+
+def get_archive_path(filename):
+    """Return the archive path of an archive or of its metadata file.
+
+    Returns:
+        str: archive path, or None if filename is not in an archive.
+
+    """
+    if _os.path.basename(filename) == METADATA_FILENAME:
+        filename = _os.path.dirname(filename)
+    filename = filename.rstrip('/\\')
+    if is_archive_filename(filename):
+        return filename
+    return None
+
+
+def save_measurement(meas, filename):
+    """Save measurement to a text file or append it to an archive."""
+    if is_archive_filename(filename):
+        MeasurementArchive(filename, mode='a').append(meas)
+    else:
+        meas.save_file(filename)
+
+
+def load_measurement(meas, filename, index=-1):
+    """Load measurement from a text file or an archive.
+
+    Args:
+        meas (StretchedWireMeas): measurement object.
+        filename (str): text file, archive or archive metadata file path.
+        index (int): archive index of the measurement, the last one by
+            default.
+
+    Returns:
+        StretchedWireMeas: the measurement object.
+
+    """
+    path = get_archive_path(filename)
+    if path is None:
+        meas.read_file(filename)
+        return meas
+    return MeasurementArchive(path).load(index, meas)
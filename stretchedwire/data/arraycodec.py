@@ -0,0 +1,90 @@
+"""Binary encoding of measurement arrays."""
+
+import zlib as _zlib
+import struct as _struct
+import numpy as _np
+
+
+MAGIC = b'SWA1'
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+
+# magic, dtype descriptor, compression flag, number of dimensions
+_header = _struct.Struct('<4s8sBB')
+_dimension = _struct.Struct('<q')
+
+
+def encode_array(array, compress=False, level=1):
+    """Encode an array as a little-endian binary blob.
+
+    The blob starts with a fixed-size header holding the dtype descriptor,
+    the compression flag and the array shape, followed by the raw buffer.
+
+    Args:
+        array (array_like): numeric array.
+        compress (bool): compress the raw buffer with zlib.
+        level (int): zlib compression level.
+
+    Returns:
+        bytes: encoded array.
+
+    """
+    array = _np.asarray(array)
+    if array.dtype.kind not in 'biufc':
+        raise ValueError(
+            'Unsupported array dtype: {0!s}'.format(array.dtype))
+
+    dtype = array.dtype.newbyteorder('<')
+    array = _np.asarray(array, dtype=dtype, order='C')
+    descr = dtype.str.encode('ascii')
+
+    payload = array.tobytes()
+    if compress:
+        payload = _zlib.compress(payload, level)
+        compression = COMPRESSION_ZLIB
+    else:
+        compression = COMPRESSION_NONE
+
+    header = _header.pack(MAGIC, descr, compression, array.ndim)
+    shape = b''.join(_dimension.pack(n) for n in array.shape)
+    return b''.join([header, shape, payload])
+
+
+def decode_array(blob):
+    """Decode a binary blob created by encode_array.
+
+    Uncompressed blobs are decoded without copying, so the returned array
+    is read-only and shares memory with the blob.
+
+    Args:
+        blob (bytes): encoded array.
+
+    Returns:
+        numpy.ndarray: decoded array.
+
+    """
+    view = memoryview(blob)
+    magic, descr, compression, ndim = _header.unpack_from(view, 0)
+    if magic != MAGIC:
+        raise ValueError('Invalid array blob.')
+
+    offset = _header.size
+    shape = []
+    for _ in range(ndim):
+        shape.append(_dimension.unpack_from(view, offset)[0])
+        offset += _dimension.size
+
+    payload = view[offset:]
+    if compression == COMPRESSION_ZLIB:
+        payload = _zlib.decompress(payload)
+    elif compression != COMPRESSION_NONE:
+        raise ValueError('Invalid array compression flag.')
+
+    dtype = _np.dtype(descr.rstrip(b'\x00').decode('ascii'))
+    return _np.frombuffer(payload, dtype=dtype).reshape(shape)
+
+
+def is_encoded_array(value):
+    """Check if the value is an encoded array blob."""
+    return (isinstance(value, (bytes, bytearray, memoryview)) and
+            bytes(value[:len(MAGIC)]) == MAGIC)
@@ -0,0 +1,181 @@
+"""Bootstrap confidence intervals of field integrals.
+
+The scans of a measurement are resampled with replacement. A resample is
+represented by the number of times each scan is drawn, so the mean of a
+batch of resamples is a single matrix product of the counts and the scans.
+As the polynomial fit is linear in the data, the coefficients of the mean
+of a resample are the same mean of the coefficients of each scan, and the
+scans are fitted only once.
+"""
+
+import collections as _collections
+import concurrent.futures as _futures
+import numpy as _np
+
+from . import cache as _cache
+from . import analysis as _analysis
+from . import fitting as _fitting
+
+
+DEFAULT_RESAMPLES = 2000
+DEFAULT_CONFIDENCE = 0.95
+
+BootstrapResult = _collections.namedtuple(
+    'BootstrapResult',
+    ['integral_lower', 'integral_upper', 'multipoles_lower',
+     'multipoles_upper', 'confidence', 'nresamples'])
+
+_INTERVALS = [
+    'integral_lower', 'integral_upper', 'multipoles_lower',
+    'multipoles_upper']
+
+_ScanData = _collections.namedtuple(
+    '_ScanData', ['raw_data', 'start', 'end', 'step'])
+
+pool = _futures.ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix='Bootstrap')
+
+
+def resample_means(data, nresamples=DEFAULT_RESAMPLES, chunk_size=500,
+                   seed=None):
+    """Return the means of resamples of the rows of data.
+
+    Args:
+        data (array_like): (n_rows, n_columns) array.
+        nresamples (int): number of resamples.
+        chunk_size (int): number of resamples calculated at once, which
+            bounds the size of the temporary arrays.
+        seed (int): random generator seed.
+
+    Returns:
+        numpy.ndarray: (nresamples, n_columns) means.
+
+    """
+    data = _np.atleast_2d(_np.asarray(data, dtype=float))
+    nrows = data.shape[0]
+    if nrows < 2:
+        raise ValueError('At least two scans are needed for a bootstrap.')
+
+    rng = _np.random.default_rng(seed)
+    probabilities = _np.full(nrows, 1/nrows)
+    means = _np.empty((nresamples, data.shape[1]))
+    for start in range(0, nresamples, chunk_size):
+        size = min(chunk_size, nresamples - start)
+        counts = rng.multinomial(nrows, probabilities, size=size)
+        _np.matmul(counts, data, out=means[start:start+size])
+    means /= nrows
+    return means
+
+
+def confidence_interval(samples, confidence=DEFAULT_CONFIDENCE):
+    """Return the (lower, upper) percentile interval of each column."""
+    alpha = (1 - confidence)/2
+    lower, upper = _np.percentile(
+        samples, [100*alpha, 100*(1 - alpha)], axis=0)
+    return lower, upper
+
+
+def bootstrap_scans(positions, scans, nresamples=DEFAULT_RESAMPLES,
+                    confidence=DEFAULT_CONFIDENCE, order=2, chunk_size=500,
+                    seed=None):
+    """Calculate bootstrap intervals of the mean scan and its multipoles.
+
+    Args:
+        positions (array_like): positions of the scan points [m].
+        scans (array_like): (n_scans, n_points) field integrals.
+        nresamples (int): number of resamples.
+        confidence (float): confidence level of the intervals.
+        order (int): polynomial order of the multipole fit.
+        chunk_size (int): number of resamples calculated at once.
+        seed (int): random generator seed.
+
+    Returns:
+        BootstrapResult: intervals of the mean integral of each point and
+            of the multipole coefficients.
+
+    """
+    scans = _np.atleast_2d(_np.asarray(scans, dtype=float))
+    coefficients = _fitting.fit_polynomial(
+        positions, scans, order=order).coefficients
+
+    # resample the scans and their coefficients with the same draws
+    data = _np.concatenate([scans, coefficients], axis=1)
+    means = resample_means(
+        data, nresamples=nresamples, chunk_size=chunk_size, seed=seed)
+    lower, upper = confidence_interval(means, confidence=confidence)
+
+    npts = scans.shape[1]
+    return BootstrapResult(
+        lower[:npts], upper[:npts], lower[npts:], upper[npts:],
+        confidence, nresamples)
+
+
+def bootstrap_measurement(meas, nresamples=DEFAULT_RESAMPLES,
+                          confidence=DEFAULT_CONFIDENCE, order=2,
+                          chunk_size=500, seed=None, parameters=None,
+                          use_cache=True):
+    """Calculate the bootstrap intervals of a measurement.
+
+    The intervals are cached in memory and on disk, keyed by the raw data
+    and all the other arguments.
+
+    Args:
+        meas (StretchedWireMeas): measurement with raw data of two or more
+            scans.
+        nresamples (int): number of resamples.
+        confidence (float): confidence level of the intervals.
+        order (int): polynomial order of the multipole fit.
+        chunk_size (int): number of resamples calculated at once.
+        seed (int): random generator seed.
+        parameters (dict): analysis parameters.
+        use_cache (bool): return the cached result of the same inputs.
+
+    Returns:
+        BootstrapResult: intervals of the integral [T.m] and of the
+            multipoles [T.m/m^n].
+
+    """
+    def _calculate():
+        scans = _analysis.field_integral_scans(
+            meas.raw_data, meas.start, meas.end, meas.step,
+            parameters=parameters, use_cache=use_cache)
+        positions = _analysis.get_positions(
+            meas.start, meas.end, scans.shape[1])*0.001
+        result = bootstrap_scans(
+            positions, scans, nresamples=nresamples, confidence=confidence,
+            order=order, chunk_size=chunk_size, seed=seed)
+        return {name: getattr(result, name) for name in _INTERVALS}
+
+    if use_cache:
+        key = _cache.get_key(
+            'bootstrap_measurement',
+            [_np.asarray(meas.raw_data, dtype=float)],
+            parameters={
+                'start': meas.start, 'end': meas.end, 'step': meas.step,
+                'parameters': _analysis.get_parameters(parameters),
+                'nresamples': nresamples, 'confidence': confidence,
+                'order': order, 'chunk_size': chunk_size, 'seed': seed},
+            version=_analysis.ANALYSIS_VERSION)
+        intervals = _analysis.cache.get_or_calculate(key, _calculate)
+    else:
+        intervals = _calculate()
+    return BootstrapResult(
+        confidence=confidence, nresamples=nresamples, **intervals)
+
+
+def submit(meas, **kwargs):
+    """Run bootstrap_measurement in the worker pool.
+
+    Args:
+        meas (StretchedWireMeas): measurement. Its raw data and scan
+            positions are read when the job is submitted.
+        kwargs: bootstrap_measurement keyword arguments.
+
+    Returns:
+        concurrent.futures.Future: future of the BootstrapResult.
+
+    """
+    meas = _ScanData(
+        _np.array(meas.raw_data, dtype=float), meas.start, meas.end,
+        meas.step)
+    return pool.submit(bootstrap_measurement, meas, **kwargs)
@@ -0,0 +1,184 @@
+"""Bulk import and export of measurement and configuration files."""
+
+import os as _os
+import concurrent.futures as _futures
+
+
+def read_document(object_class, filename):
+    """Create a document object and read its values from file."""
+    obj = object_class()
+    obj.read_file(filename)
+    return obj
+
+
+def read_files(object_class, filenames, max_workers=None, progress=None):
+    """Read files in a thread pool.
+
+    Args:
+        object_class (type): document class.
+        filenames (list): file paths.
+        max_workers (int): number of worker threads.
+        progress (callable): called as progress(count, total) after each
+            file. Returning False cancels the remaining files.
+
+    Returns:
+        tuple: (documents, failures), where documents is a list of
+            (filename, document object) in the order of filenames and
+            failures is a dict mapping filename to the raised exception.
+
+    """
+    results = {}
+    failures = {}
+    total = len(filenames)
+
+    executor = _futures.ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {
+            executor.submit(read_document, object_class, filename): filename
+            for filename in filenames}
+        for count, future in enumerate(_futures.as_completed(futures), 1):
+            filename = futures[future]
+            try:
+                results[filename] = future.result()
+            except Exception as err:
+                failures[filename] = err
+
+            if progress is not None and progress(count, total) is False:
+                for pending in futures:
+                    pending.cancel()
+                break
+    finally:
+        executor.shutdown(wait=True)
+
+    documents = [
+        (filename, results[filename])
+        for filename in filenames if filename in results]
+    return documents, failures
+
+
+def import_files(database_document, filenames, max_workers=None,
+                 progress=None):
+    """Read files and save them in the database in a single transaction.
+
+    Args:
+        database_document (StretchedWireDocument): document object connected
+            to the database, used to save the records.
+        filenames (list): file paths.
+        max_workers (int): number of worker threads used to read the files.
+        progress (callable): called as progress(count, total) after each
+            file is read. Returning False cancels the import.
+
+    Returns:
+        tuple: (idns, failures), where idns is a dict mapping filename to the
+            database id and failures is a dict mapping filename to the
+            raised exception.
+
+    """
+    documents, failures = read_files(
+        database_document.__class__, filenames,
+        max_workers=max_workers, progress=progress)
+
+    # cancelled while reading the files
+    if len(documents) + len(failures) < len(filenames):
+        return {}, failures
+
+    results = database_document.db_save_many(
+        [document for _, document in documents])
+
+    idns = {}
+    for (filename, _), result in zip(documents, results):
+        if isinstance(result, Exception):
+            failures[filename] = result
+        else:
+            idns[filename] = result
+    return idns, failures
+
+
+def save_document(document, directory):
+    """Save document to a text file with the default filename.
+
+    The default filename is prefixed with the database id, as records
+    saved in the same second have the same default filename.
+    """
+    filename = document.default_filename
+    if getattr(document, 'idn', None) is not None:
+        filename = 'ID{0:d}_{1:s}'.format(document.idn, filename)
+    filename = _os.path.join(directory, filename)
+    if not filename.endswith('.txt') and not filename.endswith('.dat'):
+        filename = filename + '.txt'
+    document.save_file(filename)
+    return filename
+
+
+def export_files(database_document, idns, directory, batch_size=100,
+                 max_workers=None, progress=None):
+    """Read database records in batches and save them to files.
+
+    Each batch is read with a single query and written by a thread pool
+    before the next batch is read, so memory use is bounded by batch_size.
+
+    Args:
+        database_document (StretchedWireDocument): document object connected
+            to the database, used to read the records.
+        idns (list): record ids.
+        directory (str): output directory.
+        batch_size (int): number of records read per query.
+        max_workers (int): number of worker threads used to write the files.
+        progress (callable): called as progress(count, total) after each
+            record. Returning False cancels the export.
+
+    Returns:
+        tuple: (filenames, failures), where filenames is a dict mapping
+            record id to the saved file path and failures is a dict mapping
+            record id to the raised exception.
+
+    """
+    idns = list(idns)
+    total = len(idns)
+    filenames = {}
+    failures = {}
+    count = 0
+
+    executor = _futures.ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for start in range(0, total, batch_size):
+            batch = idns[start:start+batch_size]
+            try:
+                documents = list(database_document.db_read_many(
+                    batch, batch_size=len(batch)))
+            except Exception as err:
+                documents = []
+                for idn in batch:
+                    failures[idn] = err
+
+            found = set(document.idn for document in documents)
+            for idn in batch:
+                if idn not in found and idn not in failures:
+                    failures[idn] = KeyError(idn)
+
+            futures = {
+                executor.submit(save_document, document, directory):
+                document.idn for document in documents}
+            count += len(batch) - len(futures)
+
+            cancelled = False
+            for future in _futures.as_completed(futures):
+                idn = futures[future]
+                try:
+                    filenames[idn] = future.result()
+                except Exception as err:
+                    failures[idn] = err
+
+                count += 1
+                if progress is not None and progress(count, total) is False:
+                    for pending in futures:
+                        pending.cancel()
+                    cancelled = True
+                    break
+
+            if cancelled:
+                break
+    finally:
+        executor.shutdown(wait=True)
+
+    return filenames, failures
@@ -0,0 +1,306 @@
+"""Content-addressed cache of analysis results.
+
+Results are keyed by a digest of the input arrays, the analysis parameters
+and the analysis version, so a result is reused whenever the same data is
+analysed again and is never returned for different inputs, even if the
+arrays of a record are changed. The cache has an in-memory LRU tier and an
+optional on-disk tier with a size cap, which is only used for the results
+that are expensive to calculate.
+"""
+
+import os as _os
+import json as _json
+import glob as _glob
+import struct as _struct
+import hashlib as _hashlib
+import threading as _threading
+import collections as _collections
+import numpy as _np
+
+from .arraycodec import encode_array as _encode_array
+from .arraycodec import decode_array as _decode_array
+
+
+CACHE_EXTENSION = '.swc'
+CACHE_DIR = _os.path.join(
+    _os.path.dirname(_os.path.dirname(
+        _os.path.dirname(_os.path.abspath(__file__)))), 'cache')
+
+# index size
+_file_header = _struct.Struct('<I')
+
+
+def get_key(name, arrays, parameters=None, version=None):
+    """Return the cache key of an analysis result.
+
+    Args:
+        name (str): analysis function name.
+        arrays (list): input arrays, hashed with their dtype and shape.
+        parameters (dict): JSON serializable analysis parameters and
+            scalar inputs.
+        version (int): analysis code version.
+
+    Returns:
+        str: hexadecimal digest.
+
+    """
+    digest = _hashlib.blake2b(digest_size=20)
+    header = {'name': name, 'parameters': parameters, 'version': version}
+    digest.update(_json.dumps(
+        header, sort_keys=True, default=str).encode('utf-8'))
+    for array in arrays:
+        array = _np.ascontiguousarray(array)
+        digest.update(array.dtype.str.encode('ascii'))
+        digest.update(str(array.shape).encode('ascii'))
+        digest.update(array.data)
+    return digest.hexdigest()
+
+
+class AnalysisCache():
+    """Two-tier cache of analysis results.
+
+    The cached values are dicts of arrays. The cache keeps copies of the
+    stored arrays and returns copies, so the callers may change them.
+    """
+
+    def __init__(self, maxsize=32, directory=None,
+                 max_memory_size=256*1024*1024,
+                 max_disk_size=256*1024*1024):
+        """Create cache.
+
+        Args:
+            maxsize (int): maximum number of results kept in memory.
+            directory (str): on-disk tier directory. If None, only the
+                memory tier is used.
+            max_memory_size (int): maximum size of the arrays kept in
+                memory [bytes].
+            max_disk_size (int): maximum size of the on-disk tier [bytes].
+
+        """
+        self.maxsize = maxsize
+        self.directory = directory
+        self.max_memory_size = max_memory_size
+        self.max_disk_size = max_disk_size
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = _collections.OrderedDict()
+        self._memory_size = 0
+        self._disk_size = None
+        self._lock = _threading.RLock()
+
+    @property
+    def stats(self):
+        """Hit and miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits/lookups if lookups > 0 else 0.0,
+                'memory_entries': len(self._memory),
+                'memory_size': self._memory_size,
+                'disk_size': self._get_disk_size(),
+                }
+
+    def reset_stats(self):
+        """Reset the hit and miss counters."""
+        with self._lock:
+            self.hits = 0
+            self.disk_hits = 0
+            self.misses = 0
+
+    def get(self, key):
+        """Return the cached value, or None if the key is not cached."""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return _copy_value(value)
+
+            value = self._read_file(key)
+            if value is not None:
+                self._put_memory(key, value)
+                self.hits += 1
+                self.disk_hits += 1
+                return _copy_value(value)
+
+            self.misses += 1
+            return None
+
+    def put(self, key, value, disk=True):
+        """Store a copy of a dict of arrays in the cache.
+
+        Args:
+            key (str): cache key.
+            value (dict): dict of arrays.
+            disk (bool): also store the value in the on-disk tier.
+
+        """
+        value = _copy_value(value)
+        with self._lock:
+            self._put_memory(key, value)
+            if disk:
+                self._write_file(key, value)
+
+    def get_or_calculate(self, key, func, disk=True):
+        """Return the cached value or calculate and store it.
+
+        Args:
+            key (str): cache key.
+            func (callable): function returning a dict of arrays.
+            disk (bool): also store the calculated value in the on-disk
+                tier.
+
+        Returns:
+            dict: cached or calculated value.
+
+        """
+        value = self.get(key)
+        if value is None:
+            value = func()
+            self.put(key, value, disk=disk)
+        return value
+
+    def clear(self, disk=False):
+        """Remove the memory tier entries, and optionally the disk tier."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+            if disk:
+                for filename in self._list_files():
+                    _remove_file(filename)
+                self._disk_size = None
+
+    def _put_memory(self, key, value):
+        size = _get_value_size(value)
+        if size > self.max_memory_size:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= _get_value_size(old)
+        self._memory[key] = value
+        self._memory_size += size
+        while (len(self._memory) > self.maxsize or
+               self._memory_size > self.max_memory_size):
+            _, old = self._memory.popitem(last=False)
+            self._memory_size -= _get_value_size(old)
+
+    def _get_filename(self, key):
+        return _os.path.join(self.directory, key + CACHE_EXTENSION)
+
+    def _list_files(self):
+        if self.directory is None:
+            return []
+        return _glob.glob(
+            _os.path.join(self.directory, '*' + CACHE_EXTENSION))
+
+    def _get_disk_size(self):
+        # the directory is listed once, then the size is kept up to date
+        if self._disk_size is None:
+            self._disk_size = sum(
+                _get_file_size(filename) for filename in self._list_files())
+        return self._disk_size
+
+    def _read_file(self, key):
+        if self.directory is None:
+            return None
+
+        filename = self._get_filename(key)
+        try:
+            with open(filename, 'rb') as f:
+                buffer = f.read()
+            # keep recently used files when the disk tier is trimmed
+            _os.utime(filename)
+        except OSError:
+            return None
+
+        try:
+            size, = _file_header.unpack_from(buffer, 0)
+            offset = _file_header.size
+            index = _json.loads(
+                buffer[offset:offset+size].decode('utf-8'))
+            offset += size
+            value = {}
+            for name, length in index:
+                value[name] = _decode_array(buffer[offset:offset+length])
+                offset += length
+            return value
+        except Exception:
+            _remove_file(filename)
+            return None
+
+    def _write_file(self, key, value):
+        if self.directory is None or self.max_disk_size <= 0:
+            return
+
+        blobs = [(name, _encode_array(array)) for name, array in value.items()]
+        index = _json.dumps(
+            [(name, len(blob)) for name, blob in blobs]).encode('utf-8')
+        data = b''.join(
+            [_file_header.pack(len(index)), index] +
+            [blob for _, blob in blobs])
+        if len(data) > self.max_disk_size:
+            return
+
+        if not _os.path.isdir(self.directory):
+            _os.makedirs(self.directory)
+
+        filename = self._get_filename(key)
+        size = self._get_disk_size() - _get_file_size(filename)
+        tmp_filename = '{0:s}.{1:d}.tmp'.format(filename, _os.getpid())
+        with open(tmp_filename, 'wb') as f:
+            f.write(data)
+        _os.replace(tmp_filename, filename)
+        self._disk_size = size + len(data)
+        if self._disk_size > self.max_disk_size:
+            self._trim_disk()
+
+    def _trim_disk(self):
+        files = []
+        for filename in self._list_files():
+            try:
+                stat = _os.stat(filename)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, filename))
+
+        size = sum(f[1] for f in files)
+        for _, file_size, filename in sorted(files):
+            if size <= self.max_disk_size:
+                break
+            _remove_file(filename)
+            size -= file_size
+        self._disk_size = size
+
+
+def format_stats(stats):
+    """Return a line with the hit and miss counters of AnalysisCache.stats.
+    """
+    return 'Analysis cache: {0:d} hits ({1:d} on disk), {2:d} misses.'.format(
+        stats.get('hits', 0), stats.get('disk_hits', 0),
+        stats.get('misses', 0))
+
+
+def _copy_value(value):
+    return {name: _np.array(array) for name, array in value.items()}
+
+
+def _get_value_size(value):
+    return sum(array.nbytes for array in value.values())
+
+
+def _get_file_size(filename):
+    try:
+        return _os.path.getsize(filename)
+    except OSError:
+        return 0
+
+
+def _remove_file(filename):
+    try:
+        _os.remove(filename)
+    except OSError:
+        pass
@@ -0,0 +1,146 @@
+"""Disk-backed capture of long integrator runs.
+
+The integrator readings are appended to a raw little-endian float64 file
+that grows in chunks and is mapped in memory, so the run length is bounded
+by the disk space instead of the RAM. The data is exposed as a NumPy
+memmap and the file can be mapped again with open_capture.
+"""
+
+import os as _os
+import time as _time
+import numpy as _np
+
+
+CAPTURE_EXTENSION = '.swm'
+CAPTURE_DIR = _os.path.join(
+    _os.path.dirname(_os.path.dirname(
+        _os.path.dirname(_os.path.abspath(__file__)))), 'captures')
+
+_DTYPE = _np.dtype('<f8')
+
+
+def parse_integrator_data(reply, meas_unit):
+    """Convert the integrator reply to an array.
+
+    Args:
+        reply (str): comma separated readings.
+        meas_unit (str): 'V.s' or 'V'.
+
+    Returns:
+        numpy.ndarray: float64 readings.
+
+    Raises:
+        ValueError: if a reading is not a number, e.g. on over-range.
+
+    """
+    reply = reply.strip('\n').strip()
+    if len(reply) == 0:
+        return _np.empty(0, dtype=_DTYPE)
+
+    suffix = ' WB' if meas_unit == 'V.s' else ' V'
+    values = [value.strip(suffix) for value in reply.split(',')]
+    data = _np.array(values, dtype=_DTYPE)
+    if not _np.all(_np.isfinite(data)):
+        raise ValueError('Integrator tension over-range.')
+    return data
+
+
+class MemmapCapture():
+    """Growable memory-mapped array of integrator readings."""
+
+    def __init__(self, filename, chunk_size=2**20):
+        """Create capture file.
+
+        Args:
+            filename (str): capture file path.
+            chunk_size (int): minimum number of values added to the file
+                when it grows.
+
+        """
+        dirname = _os.path.dirname(filename)
+        if len(dirname) > 0 and not _os.path.isdir(dirname):
+            _os.makedirs(dirname)
+
+        self.filename = filename
+        self.chunk_size = chunk_size
+        self.size = 0
+        self._capacity = 0
+        self._memmap = None
+        self._file = open(filename, 'w+b')
+
+    @classmethod
+    def create(cls, directory=CAPTURE_DIR, chunk_size=2**20):
+        """Create a capture file with a unique name in directory."""
+        timestamp = _time.strftime('%Y-%m-%d_%H-%M-%S', _time.localtime())
+        filename = _os.path.join(directory, '{0:s}_{1:d}{2:s}'.format(
+            timestamp, _os.getpid(), CAPTURE_EXTENSION))
+        return cls(filename, chunk_size=chunk_size)
+
+    @property
+    def closed(self):
+        """Return True if the capture file is closed."""
+        return self._file is None
+
+    @property
+    def data(self):
+        """Memory-mapped view of the captured values."""
+        if self._memmap is None:
+            if self.closed:
+                return open_capture(self.filename)
+            return _np.empty(0, dtype=_DTYPE)
+        return self._memmap[:self.size]
+
+    def _grow(self, size):
+        capacity = max(size, self._capacity*2, self.chunk_size)
+        if self._memmap is not None:
+            self._memmap.flush()
+        self._file.truncate(capacity*_DTYPE.itemsize)
+        self._memmap = _np.memmap(
+            self._file, dtype=_DTYPE, mode='r+', shape=(capacity, ))
+        self._capacity = capacity
+
+    def append(self, values):
+        """Append values to the capture.
+
+        Args:
+            values (array_like): readings.
+
+        Returns:
+            int: number of captured values.
+
+        """
+        values = _np.ravel(_np.asarray(values, dtype=_DTYPE))
+        size = self.size + values.size
+        if size > self._capacity:
+            self._grow(size)
+        self._memmap[self.size:size] = values
+        self.size = size
+        return self.size
+
+    def flush(self):
+        """Write the mapped values to disk."""
+        if self._memmap is not None:
+            self._memmap.flush()
+
+    def close(self):
+        """Trim the file to the captured values and close it."""
+        if self._file is None:
+            return
+        self.flush()
+        self._memmap = None
+        self._file.truncate(self.size*_DTYPE.itemsize)
+        self._file.close()
+        self._file = None
+
+    def discard(self):
+        """Close and remove the capture file."""
+        self.close()
+        if _os.path.isfile(self.filename):
+            _os.remove(self.filename)
+
+
+def open_capture(filename):
+    """Map a closed capture file as a read-only array."""
+    if _os.path.getsize(filename) == 0:
+        return _np.empty(0, dtype=_DTYPE)
+    return _np.memmap(filename, dtype=_DTYPE, mode='r')
@@ -0,0 +1,196 @@
+"""Magnetic center and roll determination of quadrupoles.
+
+The field integral of a quadrupole with center (x0, y0), roll angle phi
+and integrated gradient G is linear in the transverse position:
+
+    By = G*((x - x0)*cos(2*phi) + (y - y0)*sin(2*phi))
+    Bx = G*((y - y0)*cos(2*phi) - (x - x0)*sin(2*phi))
+
+Scans along X measure By. Scans along Y measure -Bx, since the voltage
+induced in a wire moving along y is proportional to -Bx (v x B), and the
+sign is inverted before the fit. X scans are taken at two heights and Y
+scans at two horizontal positions around the current center estimate, a
+plane is fitted to each set and solved for the center and roll. The scan
+window shrinks around the new estimate after each set and the routine
+stops when the uncertainties are within the tolerances.
+"""
+
+import collections as _collections
+import numpy as _np
+
+
+CenterRollResult = _collections.namedtuple(
+    'CenterRollResult',
+    ['x0', 'y0', 'roll', 'gradient', 'x0_error', 'y0_error', 'roll_error',
+     'window', 'nsets', 'converged'])
+
+
+def _fit_plane(positions, fixed, values):
+    """Fit values = a + b*positions + c*fixed and return (p, covariance)."""
+    design = _np.column_stack(
+        [_np.ones_like(positions), positions, fixed])
+    params, _, rank, _ = _np.linalg.lstsq(design, values, rcond=None)
+    if rank < 3:
+        raise ValueError(
+            'The scans do not determine the field plane. Scan at two '
+            'different positions of the fixed axis.')
+    residuals = values - design @ params
+    dof = max(values.size - 3, 1)
+    variance = residuals @ residuals/dof
+    covariance = variance*_np.linalg.inv(design.T @ design)
+    return params, covariance
+
+
+def _solve(params):
+    """Return (x0, y0, roll, gradient) from the X and Y plane parameters.
+
+    params is a (..., 6) array with (a, b, c) of the X scans plane and
+    (a', b', c') of the Y scans plane, so many parameter sets are solved
+    at once.
+    """
+    a, b, c, ay, by, cy = _np.moveaxis(params, -1, 0)
+    roll = 0.5*_np.arctan2(c - cy, b + by)
+    gradient = 0.5*_np.hypot(b + by, c - cy)
+    cos2, sin2 = _np.cos(2*roll), _np.sin(2*roll)
+    x0 = -(a*cos2 - ay*sin2)/gradient
+    y0 = -(a*sin2 + ay*cos2)/gradient
+    return x0, y0, roll, gradient
+
+
+def fit_center_roll(x_scans, y_scans, y_scan_sign=-1):
+    """Determine the magnetic center and roll from X and Y scans.
+
+    Args:
+        x_scans (tuple): (x positions, y positions, By integrals) of the
+            points of all X scans.
+        y_scans (tuple): (y positions, x positions, integrals) of the
+            points of all Y scans.
+        y_scan_sign (int): sign of Bx in the Y scan integrals, -1 for the
+            integrals measured by a wire moving along y.
+
+    Returns:
+        tuple: (values, errors), where values and errors are the
+            (x0, y0, roll, gradient) arrays. The errors are propagated
+            from the plane fits covariance.
+
+    """
+    px, cx = _fit_plane(*[_np.ravel(v) for v in x_scans])
+    y_positions, x_positions, integrals = [_np.ravel(v) for v in y_scans]
+    py, cy = _fit_plane(y_positions, x_positions, y_scan_sign*integrals)
+    params = _np.concatenate([px, py])
+    covariance = _np.zeros((6, 6))
+    covariance[:3, :3] = cx
+    covariance[3:, 3:] = cy
+
+    values = _np.array(_solve(params))
+
+    # numerical jacobian, all parameter steps solved at once
+    steps = _np.maximum(_np.sqrt(_np.diag(covariance)), 1e-12)
+    shifted = params + _np.diag(steps)
+    jacobian = (_np.array(_solve(shifted)) - values[:, None])/steps
+    errors = _np.sqrt(_np.diag(jacobian @ covariance @ jacobian.T))
+    return values, errors
+
+
+class CenterRollRoutine():
+    """Iterative center and roll determination with a shrinking window."""
+
+    def __init__(self, scan, x0=0.0, y0=0.0, window=10.0, min_window=1.0,
+                 shrink=0.5, center_tolerance=0.01, roll_tolerance=1e-4,
+                 min_sets=2, max_sets=10, y_scan_sign=-1):
+        """Create routine.
+
+        Args:
+            scan (callable): called as scan(axis, start, end, fixed) to
+                measure along axis ('X' or 'Y') from start to end [mm] with
+                the other axis at fixed [mm]. Must return (positions [mm],
+                integrals), where integrals is a (n_scans, n_points) or
+                (n_points) array of the measured field integrals.
+            x0 (float): initial horizontal center [mm].
+            y0 (float): initial vertical center [mm].
+            window (float): initial scan half width [mm].
+            min_window (float): minimum scan half width [mm].
+            shrink (float): window factor applied after each scan set.
+            center_tolerance (float): required center uncertainty [mm].
+            roll_tolerance (float): required roll uncertainty [rad].
+            min_sets (int): minimum number of scan sets.
+            max_sets (int): maximum number of scan sets.
+            y_scan_sign (int): sign of Bx in the Y scan integrals, -1 for
+                the integrals measured by a wire moving along y.
+
+        """
+        self.scan = scan
+        self.x0 = x0
+        self.y0 = y0
+        self.window = window
+        self.min_window = min_window
+        self.shrink = shrink
+        self.center_tolerance = center_tolerance
+        self.roll_tolerance = roll_tolerance
+        self.min_sets = min_sets
+        self.max_sets = max_sets
+        self.y_scan_sign = y_scan_sign
+        self._points = {'X': [], 'Y': []}
+
+    def _measure(self, axis, center, fixed):
+        positions, integrals = self.scan(
+            axis, center - self.window, center + self.window, fixed)
+        integrals = _np.atleast_2d(integrals)
+        positions = _np.broadcast_to(positions, integrals.shape)
+        self._points[axis].append((
+            _np.ravel(positions), _np.full(integrals.size, fixed),
+            _np.ravel(integrals)))
+
+    def _get_points(self, axis, center):
+        # only the points inside the current window are fitted
+        positions, fixed, values = [
+            _np.concatenate(v) for v in zip(*self._points[axis])]
+        inside = _np.abs(positions - center) <= self.window
+        return positions[inside], fixed[inside], values[inside]
+
+    def is_converged(self, errors):
+        """Return True if the uncertainties are within the tolerances."""
+        return bool(
+            errors[0] <= self.center_tolerance and
+            errors[1] <= self.center_tolerance and
+            errors[2] <= self.roll_tolerance)
+
+    def run(self, progress=None):
+        """Run scan sets until convergence.
+
+        Args:
+            progress (callable): called with the CenterRollResult after
+                each scan set. Returning False stops the routine.
+
+        Returns:
+            CenterRollResult: last estimate.
+
+        """
+        result = None
+        for nsets in range(1, self.max_sets + 1):
+            offset = self.window/2
+            for y in (self.y0 - offset, self.y0 + offset):
+                self._measure('X', self.x0, y)
+            for x in (self.x0 - offset, self.x0 + offset):
+                self._measure('Y', self.y0, x)
+
+            values, errors = fit_center_roll(
+                self._get_points('X', self.x0),
+                self._get_points('Y', self.y0),
+                y_scan_sign=self.y_scan_sign)
+            converged = nsets >= self.min_sets and self.is_converged(errors)
+            values = [float(v) for v in values]
+            errors = [float(e) for e in errors]
+            result = CenterRollResult(
+                values[0], values[1], values[2], values[3],
+                errors[0], errors[1], errors[2], self.window, nsets,
+                converged)
+
+            self.x0, self.y0 = values[0], values[1]
+            if progress is not None and progress(result) is False:
+                break
+            if converged:
+                break
+            self.window = max(self.window*self.shrink, self.min_window)
+
+        return result
@@ -0,0 +1,215 @@
+"""Columnar export of database records to Parquet or Arrow IPC files.
+
+The records are read in batches of ids and each batch is written as one
+file per partition, so memory use is bounded by the batch size. The output
+directory uses the hive layout (<field>=<value>/part-<n>.<ext>), which can
+be read back as a single dataset, e.g. with pandas.read_parquet(directory)
+or pyarrow.dataset.dataset(directory, partitioning='hive').
+
+Scalar fields are written as typed columns and ndarray fields as list
+columns of the flattened values. pyarrow is only required by this module.
+"""
+
+import os as _os
+import numpy as _np
+
+
+PARQUET = 'parquet'
+ARROW = 'arrow'
+FORMATS = (PARQUET, ARROW)
+
+_NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow as _pa
+    except ImportError:
+        raise ImportError(
+            'Columnar export requires pyarrow. '
+            'Install it with "pip install pyarrow".')
+    return _pa
+
+
+def get_schema(document):
+    """Return the arrow schema of the document fields.
+
+    Args:
+        document (StretchedWireDocument): document object.
+
+    Returns:
+        pyarrow.Schema: one column per attribute.
+
+    """
+    pa = _import_pyarrow()
+    types = {
+        int: pa.int64(),
+        float: pa.float64(),
+        str: pa.string(),
+        _np.ndarray: pa.large_list(pa.float64()),
+        }
+    return pa.schema([
+        pa.field(attr, types.get(value['dtype'], pa.string()))
+        for attr, value in document.get_fields_dict().items()])
+
+
+def _list_array(pa, arrays):
+    """Build a list array from ndarrays without converting to lists.
+
+    The offsets are 64-bit, so a batch may hold more than 2**31 values.
+    """
+    offsets = _np.zeros(len(arrays) + 1, dtype=_np.int64)
+    values = []
+    mask = _np.zeros(len(arrays), dtype=bool)
+    for i, array in enumerate(arrays):
+        if array is None:
+            mask[i] = True
+            offsets[i+1] = offsets[i]
+            continue
+        array = _np.ravel(_np.asarray(array, dtype=float))
+        values.append(array)
+        offsets[i+1] = offsets[i] + array.size
+
+    if len(values) > 0:
+        values = _np.concatenate(values)
+    else:
+        values = _np.empty(0, dtype=float)
+
+    return pa.LargeListArray.from_arrays(
+        pa.array(offsets, type=pa.int64()),
+        pa.array(values, type=pa.float64()),
+        mask=pa.array(mask) if mask.any() else None)
+
+
+def _get_table(pa, document, schema, idns):
+    fields_dict = document.get_fields_dict()
+    get_array_attributes = getattr(document, 'get_array_attributes', None)
+    if get_array_attributes is not None:
+        array_attrs = get_array_attributes()
+    else:
+        array_attrs = []
+    # fields read from the main collection, including the ndarray fields
+    # of db_extra_dict, which are stored as text. The arrays collection
+    # fields of records that were not migrated are read from their text
+    # columns by db_read_arrays_many.
+    row_attrs = [attr for attr in fields_dict if attr not in array_attrs]
+
+    rows = document.db_get_fields(
+        idns, [fields_dict[attr]['field'] for attr in row_attrs])
+    rows = sorted(rows, key=lambda row: row[0])
+    ids = [row[0] for row in rows]
+
+    columns = {}
+    for i, attr in enumerate(row_attrs):
+        if fields_dict[attr]['dtype'] == _np.ndarray:
+            columns[attr] = _list_array(pa, [
+                document._db_decode_value(attr, row[i]) for row in rows])
+        else:
+            columns[attr] = pa.array(
+                [row[i] for row in rows], type=schema.field(attr).type)
+
+    if len(array_attrs) > 0:
+        arrays = document.db_read_arrays_many(ids, attrs=array_attrs)
+        for attr in array_attrs:
+            columns[attr] = _list_array(
+                pa, [arrays.get(idn, {}).get(attr) for idn in ids])
+
+    return pa.Table.from_arrays(
+        [columns[name] for name in schema.names], schema=schema)
+
+
+def _partition_value(value):
+    if value is None:
+        return _NULL_PARTITION
+    value = str(value)
+    for char in '/\\:=':
+        value = value.replace(char, '_')
+    return value
+
+
+def _write_table(pa, table, filename, file_format, compression):
+    if file_format == PARQUET:
+        import pyarrow.parquet as _pq
+        _pq.write_table(table, filename, compression=compression)
+    else:
+        import pyarrow.ipc as _ipc
+        options = _ipc.IpcWriteOptions(compression=compression)
+        with pa.OSFile(filename, 'wb') as sink:
+            with _ipc.new_file(sink, table.schema, options=options) as writer:
+                writer.write_table(table)
+
+
+def export_records(document, directory, idns=None, file_format=PARQUET,
+                   partition_by='date', batch_size=200, compression=None,
+                   progress=None):
+    """Export database records to columnar files.
+
+    Args:
+        document (StretchedWireDocument): document object connected to the
+            database.
+        directory (str): output directory.
+        idns (list): record ids, all records by default.
+        file_format (str): 'parquet' or 'arrow'.
+        partition_by (str): attribute used to split the output in
+            directories, or None to write all files in directory.
+        batch_size (int): number of records read and written at once.
+        compression (str): compression codec, 'snappy' (parquet) or None
+            (arrow) by default.
+        progress (callable): called as progress(count, total) after each
+            batch. Returning False cancels the remaining batches.
+
+    Returns:
+        list: written file paths.
+
+    """
+    pa = _import_pyarrow()
+    if file_format not in FORMATS:
+        raise ValueError(
+            'Invalid file format: {0!s}'.format(file_format))
+    if compression is None and file_format == PARQUET:
+        compression = 'snappy'
+
+    if idns is None:
+        id_field = document.db_dict['idn']['field']
+        idns = [row[0] for row in document.db_list(fields=[id_field])]
+    idns = sorted(idns)
+
+    schema = get_schema(document)
+    if partition_by is not None and partition_by not in schema.names:
+        raise ValueError(
+            'Invalid partition attribute: {0!s}'.format(partition_by))
+
+    if not _os.path.isdir(directory):
+        _os.makedirs(directory)
+
+    filenames = []
+    total = len(idns)
+    for number, start in enumerate(range(0, total, batch_size)):
+        table = _get_table(
+            pa, document, schema, idns[start:start+batch_size])
+
+        if partition_by is None:
+            partitions = [(directory, table)]
+        else:
+            values = table.column(partition_by).to_pylist()
+            table = table.drop([partition_by])
+            partitions = []
+            for value in sorted(set(values), key=str):
+                rows = [i for i, v in enumerate(values) if v == value]
+                path = _os.path.join(directory, '{0:s}={1:s}'.format(
+                    partition_by, _partition_value(value)))
+                partitions.append((path, table.take(pa.array(rows))))
+
+        for path, partition in partitions:
+            if not _os.path.isdir(path):
+                _os.makedirs(path)
+            filename = _os.path.join(
+                path, 'part-{0:05d}.{1:s}'.format(number, file_format))
+            _write_table(pa, partition, filename, file_format, compression)
+            filenames.append(filename)
+
+        count = min(start + batch_size, total)
+        if progress is not None and progress(count, total) is False:
+            break
+
+    return filenames
@@ -1,11 +1,15 @@
 """Stretched Wire configuration module."""
 
+import copy as _copy
+import json as _json
+import hashlib as _hashlib
+import threading as _threading
 import numpy as _np
 import collections as _collections
-from imautils.db.database import DatabaseAndFileDocument
+from .database import StretchedWireDocument, BinaryArrayDocument
 
 
-class StretchedWireConfig(DatabaseAndFileDocument):
+class StretchedWireConfig(StretchedWireDocument):
     """Stretched Wire configuration parameters class."""
 
     label = 'Stretched Wire Configuration'
@@ -57,6 +61,11 @@ class StretchedWireConfig(DatabaseAndFileDocument):
         ('limit_max_Y', {'field': 'limit_max_Y', 'dtype': float,
                          'not_null': False}),
     ])
+    db_extra_dict = _collections.OrderedDict([
+        ('config_hash', {'field': 'config_hash', 'dtype': str,
+                         'not_null': False}),
+    ])
+    db_indexes = [('config_hash', )]
 
     def __init__(self, database_name=None, mongo=False, server=None):
         """Initialize object.
@@ -68,6 +77,7 @@ class StretchedWireConfig(DatabaseAndFileDocument):
 
         """
         self.idn = None
+        self.config_hash = None
         self.date = None
         self.hour = None
         self.ppmac_ip = '10.0.28.39'
@@ -100,6 +110,26 @@ class StretchedWireConfig(DatabaseAndFileDocument):
         super().__init__(database_name=database_name,
                          mongo=mongo, server=server)
 
+    def get_config_hash(self):
+        """Return a digest of the configuration fields."""
+        values = [
+            [attr, getattr(self, attr)] for attr in self.db_dict
+            if attr not in ('idn', 'date', 'hour')]
+        data = _json.dumps(values, default=str).encode('utf-8')
+        return _hashlib.sha1(data).hexdigest()
+
+    def db_get_configuration_id(self):
+        """Return the id of the stored configuration with the same content.
+
+        The configuration is saved if no record has the same content hash.
+        """
+        self.config_hash = self.get_config_hash()
+        idn = self.db_get_last_id(
+            self.db_extra_dict['config_hash']['field'], self.config_hash)
+        if idn is None:
+            idn = self.db_save()
+        return idn
+
     def motor_calculus(self):
         _counts_per_mm = 50000
         self.m_ac = self.ac * 1000  # ms
@@ -117,7 +147,7 @@ class StretchedWireConfig(DatabaseAndFileDocument):
         self.time_limit = (2 * abs(self.analysis_interval/_spd)) + 2
 
 
-class PowerSupplyConfig(DatabaseAndFileDocument):
+class PowerSupplyConfig(BinaryArrayDocument):
     """Read, write and store Power Supply configuration data."""
 
     label = 'PowerSupply'
@@ -211,6 +241,12 @@ class PowerSupplyConfig(DatabaseAndFileDocument):
             'field': 'damped sinusoidal2 damping',
             'dtype': float, 'not_null': True}),
     ])
+    db_indexes = [('ps_name', 'idn'), ('date', 'hour')]
+
+    # power supply names, ids and records shared by all objects, keyed by
+    # (database_name, mongo, server) and cleared when the collection changes
+    _cache = {}
+    _cache_lock = _threading.Lock()
 
     def __init__(
             self, database_name=None, mongo=False, server=None):
@@ -244,15 +280,77 @@ class PowerSupplyConfig(DatabaseAndFileDocument):
         super().__init__(
             database_name=database_name, mongo=mongo, server=server)
 
-    def get_power_supply_id(self, ps_name):
-        """Get power supply database id number."""
-        docs = self.db_search_field(self.db_dict['ps_name']['field'], ps_name)
+    def _get_cache(self):
+        key = (self.database_name, self.mongo, self.server)
+        with self._cache_lock:
+            return self._cache.setdefault(
+                key, {'names': None, 'ids': {}, 'records': {}})
 
-        if len(docs) == 0:
-            return None
+    def clear_cache(self):
+        """Clear the cached power supply names and records."""
+        key = (self.database_name, self.mongo, self.server)
+        with self._cache_lock:
+            self._cache.pop(key, None)
 
-        return docs[-1][self.db_dict['idn']['field']]
+    def db_save(self):
+        """Save power supply and clear the cache."""
+        try:
+            return super().db_save()
+        finally:
+            self.clear_cache()
+
+    def db_update(self, idn):
+        """Update power supply and clear the cache."""
+        try:
+            return super().db_update(idn)
+        finally:
+            self.clear_cache()
+
+    def db_save_many(self, documents):
+        """Save power supplies and clear the cache."""
+        try:
+            return super().db_save_many(documents)
+        finally:
+            self.clear_cache()
+
+    def db_delete_many(self, idns, batch_size=500):
+        """Delete power supplies and clear the cache."""
+        try:
+            return super().db_delete_many(idns, batch_size=batch_size)
+        finally:
+            self.clear_cache()
+
+    def db_read(self, idn=None):
+        """Read power supply record, using the cached values if available."""
+        if idn is None:
+            return super().db_read(idn)
+
+        records = self._get_cache()['records']
+        record = records.get(idn)
+        if record is not None:
+            for attr, value in record.items():
+                setattr(self, attr, _copy.deepcopy(value))
+            return True
+
+        status = super().db_read(idn)
+        if status:
+            records[idn] = {
+                attr: _copy.deepcopy(getattr(self, attr, None))
+                for attr in self.get_fields_dict()}
+        return status
+
+    def get_power_supply_id(self, ps_name):
+        """Get power supply database id number."""
+        ids = self._get_cache()['ids']
+        if ps_name not in ids:
+            ids[ps_name] = self.db_get_last_id(
+                self.db_dict['ps_name']['field'], ps_name)
+        return ids[ps_name]
 
     def get_power_supply_list(self):
         """Get list of power supply names from database."""
-        return self.db_get_values(self.db_dict['ps_name']['field'])
+        cache = self._get_cache()
+        if cache['names'] is None:
+            cache['names'] = self.db_get_distinct_values(
+                self.db_dict['ps_name']['field'])
+        return list(cache['names'])
@@ -0,0 +1,1170 @@
+"""Database storage helpers."""
+
+import os as _os
+import sys as _sys
+import json as _json
+import time as _time
+import sqlite3 as _sqlite3
+import threading as _threading
+import traceback as _traceback
+import collections as _collections
+import numpy as _np
+from imautils.db.database import DatabaseAndFileDocument
+
+from .arraycodec import encode_array as _encode_array
+from .arraycodec import decode_array as _decode_array
+
+
+_SQL_TYPES = {int: 'INTEGER', float: 'REAL', str: 'TEXT'}
+
+
+class ConnectionPool():
+    """Shared database connections.
+
+    Connections are keyed by (database_name, mongo, server). Sqlite
+    connections are kept per thread, since they cannot be shared between
+    threads. A single MongoClient is kept
+    per server and process. All sqlite connections are registered, so that
+    close can close the connections opened by every thread.
+    """
+
+    def __init__(self):
+        """Create empty pool."""
+        self._lock = _threading.Lock()
+        self._local = _threading.local()
+        self._mongo_clients = {}
+        self._sqlite_connections = set()
+        self._generation = 0
+        self._pid = _os.getpid()
+
+    def get(self, database_name, mongo=False, server=None):
+        """Return a sqlite connection or a MongoDB database object."""
+        if mongo:
+            return self.get_mongo_client(server)[database_name]
+        return self.get_sqlite_connection(database_name)
+
+    def _get_thread_connections(self):
+        # the connections of all threads are dropped when the pool is closed
+        if getattr(self._local, 'generation', None) != self._generation:
+            self._local.generation = self._generation
+            self._local.connections = {}
+        return self._local.connections
+
+    def get_sqlite_connection(self, database_name):
+        """Return the sqlite connection of the current thread."""
+        connections = self._get_thread_connections()
+        con = connections.get(database_name)
+        if con is None:
+            # used by a single thread, but closed by any thread in close
+            con = _sqlite3.connect(database_name, check_same_thread=False)
+            connections[database_name] = con
+            with self._lock:
+                self._sqlite_connections.add(con)
+        return con
+
+    def get_mongo_client(self, server):
+        """Return the MongoClient of the server."""
+        with self._lock:
+            if self._pid != _os.getpid():
+                # clients must not be shared with forked processes
+                self._mongo_clients = {}
+                self._pid = _os.getpid()
+
+            client = self._mongo_clients.get(server)
+            if client is None:
+                import pymongo as _pymongo
+                client = _pymongo.MongoClient(server)
+                self._mongo_clients[server] = client
+            return client
+
+    def close_thread_connections(self):
+        """Close the sqlite connections of the current thread."""
+        connections = self._get_thread_connections()
+        with self._lock:
+            for con in connections.values():
+                self._sqlite_connections.discard(con)
+                con.close()
+        connections.clear()
+
+    def close(self):
+        """Close the connections of all threads and the MongoDB clients."""
+        with self._lock:
+            for con in self._sqlite_connections:
+                con.close()
+            self._sqlite_connections = set()
+            self._generation += 1
+            for client in self._mongo_clients.values():
+                client.close()
+            self._mongo_clients = {}
+
+
+pool = ConnectionPool()
+
+
+class StretchedWireDocument(DatabaseAndFileDocument):
+    """Database document with indexed queries.
+
+    db_indexes lists the indexes of the collection as tuples of attribute
+    names. They are created with the collection.
+
+    db_extra_dict lists database fields, in the db_dict format, that are
+    only stored in the database. They are not saved to files and are added
+    to existing collections when missing.
+
+    Records are created, saved, read and updated with the connections of
+    the shared pool.
+    """
+
+    db_indexes = []
+    db_extra_dict = _collections.OrderedDict()
+
+    @classmethod
+    def get_fields_dict(cls):
+        """Return the db_dict and db_extra_dict fields."""
+        fields_dict = _collections.OrderedDict(cls.db_dict)
+        fields_dict.update(cls.db_extra_dict)
+        return fields_dict
+
+    def _get_sqlite_connection(self):
+        return pool.get_sqlite_connection(self.database_name)
+
+    def _get_mongo_collection(self, collection_name):
+        return pool.get(
+            self.database_name, mongo=True,
+            server=self.server)[collection_name]
+
+    def db_create_collection(self):
+        """Create the collection and its indexes.
+
+        Returns:
+            bool: True if the collection was created or already exists.
+
+        """
+        try:
+            if not self.mongo:
+                # the journal mode is persistent, so that readers do not
+                # block the writer and vice versa in every connection
+                self._get_sqlite_connection().execute(
+                    'PRAGMA journal_mode=WAL')
+                self._db_create_table()
+            self.db_create_extra_fields()
+            self.db_create_indexes()
+            return True
+        except Exception:
+            _traceback.print_exc(file=_sys.stdout)
+            return False
+
+    def _db_create_table(self):
+        id_field = self.db_dict['idn']['field']
+        columns = [
+            '"{0:s}" INTEGER PRIMARY KEY AUTOINCREMENT'.format(id_field)]
+        for attr, value in self.get_fields_dict().items():
+            if attr == 'idn':
+                continue
+            column = '"{0:s}" {1:s}'.format(
+                value['field'], _SQL_TYPES.get(value['dtype'], 'TEXT'))
+            if value['not_null'] and attr in self.db_dict:
+                column += ' NOT NULL'
+            columns.append(column)
+
+        con = self._get_sqlite_connection()
+        with con:
+            con.execute('CREATE TABLE IF NOT EXISTS "{0:s}" ({1:s})'.format(
+                self.collection_name, ', '.join(columns)))
+
+    def db_create_extra_fields(self):
+        """Add the db_extra_dict columns missing in the sqlite table."""
+        if self.mongo or len(self.db_extra_dict) == 0:
+            return
+
+        con = self._get_sqlite_connection()
+        columns = [
+            row[1] for row in con.execute(
+                'PRAGMA table_info("{0:s}")'.format(self.collection_name))]
+        with con:
+            for value in self.db_extra_dict.values():
+                if value['field'] in columns:
+                    continue
+                con.execute(
+                    'ALTER TABLE "{0:s}" ADD COLUMN "{1:s}" {2:s}'.format(
+                        self.collection_name, value['field'],
+                        _SQL_TYPES.get(value['dtype'], 'TEXT')))
+
+    def db_save(self):
+        """Save document and return the database id.
+
+        Returns:
+            int: database id, or None if the document could not be saved.
+
+        """
+        try:
+            idn = self.db_save_many([self])[0]
+            if isinstance(idn, Exception):
+                raise idn
+            return idn
+        except Exception:
+            _traceback.print_exc(file=_sys.stdout)
+            return None
+
+    def db_update(self, idn):
+        """Update the database record.
+
+        Args:
+            idn (int): record id.
+
+        Returns:
+            bool: True if the record was updated.
+
+        """
+        try:
+            return self._db_update_record(idn)
+        except Exception:
+            _traceback.print_exc(file=_sys.stdout)
+            return False
+
+    def _db_update_record(self, idn, con=None):
+        fields_dict = self.get_fields_dict()
+        id_field = fields_dict['idn']['field']
+        attrs = [attr for attr in fields_dict if attr != 'idn']
+        fields = [fields_dict[attr]['field'] for attr in attrs]
+
+        if self.mongo:
+            values = {
+                field: self._db_encode_value(
+                    getattr(self, attr, None), mongo=True)
+                for attr, field in zip(attrs, fields)}
+            collection = self._get_mongo_collection(self.collection_name)
+            result = collection.update_one({id_field: idn}, {'$set': values})
+            return result.matched_count > 0
+
+        values = [
+            self._db_encode_value(getattr(self, attr, None)) for attr in attrs]
+        sql = 'UPDATE "{0:s}" SET {1:s} WHERE "{2:s}" = ?'.format(
+            self.collection_name,
+            ', '.join('"{0:s}" = ?'.format(field) for field in fields),
+            id_field)
+        if con is None:
+            con = self._get_sqlite_connection()
+            with con:
+                return con.execute(sql, values + [idn]).rowcount > 0
+        return con.execute(sql, values + [idn]).rowcount > 0
+
+    def db_read(self, idn=None):
+        """Read the database record.
+
+        Args:
+            idn (int): record id, the last record by default.
+
+        Returns:
+            bool: True if the record was read.
+
+        """
+        try:
+            if idn is None:
+                idn = self._db_get_max_id()
+                if idn is None:
+                    return False
+
+            fields_dict = self.get_fields_dict()
+            attrs = list(fields_dict)
+            rows = self.db_get_fields(
+                [idn], [fields_dict[attr]['field'] for attr in attrs])
+            if len(rows) == 0:
+                return False
+
+            for attr, value in zip(attrs, rows[0]):
+                setattr(self, attr, self._db_decode_value(attr, value))
+            return True
+        except Exception:
+            _traceback.print_exc(file=_sys.stdout)
+            return False
+
+    def _db_get_max_id(self):
+        rows = self.db_list(
+            fields=[self.db_dict['idn']['field']], limit=1, descending=True)
+        if len(rows) == 0:
+            return None
+        return rows[0][0]
+
+    def db_get_ids(self, field, value):
+        """Return the ids of the records with field equal to value."""
+        id_field = self.db_dict['idn']['field']
+        if self.mongo:
+            collection = self._get_mongo_collection(self.collection_name)
+            return [
+                doc[id_field] for doc in collection.find(
+                    {field: value}, projection={id_field: 1, '_id': 0},
+                    sort=[(id_field, 1)])]
+
+        con = self._get_sqlite_connection()
+        return [row[0] for row in con.execute(
+            'SELECT "{0:s}" FROM "{1:s}" WHERE "{2:s}" = ? '
+            'ORDER BY "{0:s}"'.format(
+                id_field, self.collection_name, field), (value, ))]
+
+    def db_create_indexes(self):
+        """Create the collection indexes if they do not exist."""
+        if len(self.db_indexes) == 0:
+            return
+
+        fields_dict = self.get_fields_dict()
+        if self.mongo:
+            collection = self._get_mongo_collection(self.collection_name)
+            for index in self.db_indexes:
+                collection.create_index(
+                    [(fields_dict[attr]['field'], 1) for attr in index])
+        else:
+            con = self._get_sqlite_connection()
+            with con:
+                for index in self.db_indexes:
+                    name = '{0:s}_{1:s}_idx'.format(
+                        self.collection_name, '_'.join(index))
+                    columns = ', '.join(
+                        '"{0:s}"'.format(fields_dict[attr]['field'])
+                        for attr in index)
+                    con.execute(
+                        'CREATE INDEX IF NOT EXISTS "{0:s}" '
+                        'ON "{1:s}" ({2:s})'.format(
+                            name, self.collection_name, columns))
+
+    def db_get_last_id(self, field, value):
+        """Return the id of the last record with field equal to value.
+
+        Only the id is read from the database.
+
+        Args:
+            field (str): field name.
+            value: field value.
+
+        Returns:
+            int: record id or None if not found.
+
+        """
+        id_field = self.db_dict['idn']['field']
+        if self.mongo:
+            collection = self._get_mongo_collection(self.collection_name)
+            doc = collection.find_one(
+                {field: value}, projection={id_field: 1, '_id': 0},
+                sort=[(id_field, -1)])
+            if doc is None:
+                return None
+            return doc[id_field]
+
+        con = self._get_sqlite_connection()
+        row = con.execute(
+            'SELECT "{0:s}" FROM "{1:s}" WHERE "{2:s}" = ? '
+            'ORDER BY "{0:s}" DESC LIMIT 1'.format(
+                id_field, self.collection_name, field),
+            (value, )).fetchone()
+
+        if row is None:
+            return None
+        return row[0]
+
+    def db_get_distinct_values(self, field):
+        """Return the distinct values of field in insertion order."""
+        id_field = self.db_dict['idn']['field']
+        if self.mongo:
+            collection = self._get_mongo_collection(self.collection_name)
+            pipeline = [
+                {'$group': {'_id': '$' + field,
+                            'first': {'$min': '$' + id_field}}},
+                {'$sort': {'first': 1}},
+                ]
+            return [doc['_id'] for doc in collection.aggregate(pipeline)]
+
+        con = self._get_sqlite_connection()
+        rows = con.execute(
+            'SELECT "{0:s}" FROM "{1:s}" GROUP BY "{0:s}" '
+            'ORDER BY MIN("{2:s}")'.format(
+                field, self.collection_name, id_field)).fetchall()
+        return [row[0] for row in rows]
+
+    @classmethod
+    def get_scalar_fields(cls):
+        """Return the names of the non ndarray fields."""
+        return [
+            value['field'] for value in cls.get_fields_dict().values()
+            if value['dtype'] is not _np.ndarray]
+
+    def db_count(self):
+        """Return the number of records in the collection."""
+        if self.mongo:
+            collection = self._get_mongo_collection(self.collection_name)
+            return collection.count_documents({})
+
+        con = self._get_sqlite_connection()
+        return con.execute(
+            'SELECT COUNT(*) FROM "{0:s}"'.format(
+                self.collection_name)).fetchone()[0]
+
+    def db_list(self, fields=None, min_id=None, max_id=None, limit=None,
+                descending=False):
+        """Return records projected to fields, ordered by id.
+
+        Only the requested columns are read, so listing records does not
+        load the ndarray fields.
+
+        Args:
+            fields (list): field names, the scalar fields by default.
+            min_id (int): minimum record id.
+            max_id (int): maximum record id.
+            limit (int): maximum number of records.
+            descending (bool): sort by decreasing id.
+
+        Returns:
+            list: record values as tuples in the order of fields.
+
+        """
+        if fields is None:
+            fields = self.get_scalar_fields()
+        id_field = self.db_dict['idn']['field']
+
+        if self.mongo:
+            collection = self._get_mongo_collection(self.collection_name)
+            query = {}
+            if min_id is not None:
+                query.setdefault(id_field, {})['$gte'] = min_id
+            if max_id is not None:
+                query.setdefault(id_field, {})['$lte'] = max_id
+            projection = {field: 1 for field in fields}
+            projection['_id'] = 0
+            cursor = collection.find(
+                query, projection=projection,
+                sort=[(id_field, -1 if descending else 1)])
+            if limit is not None:
+                cursor = cursor.limit(limit)
+            return [tuple(doc.get(field) for field in fields)
+                    for doc in cursor]
+
+        conditions = []
+        values = []
+        if min_id is not None:
+            conditions.append('"{0:s}" >= ?'.format(id_field))
+            values.append(min_id)
+        if max_id is not None:
+            conditions.append('"{0:s}" <= ?'.format(id_field))
+            values.append(max_id)
+
+        sql = 'SELECT {0:s} FROM "{1:s}"'.format(
+            ', '.join('"{0:s}"'.format(field) for field in fields),
+            self.collection_name)
+        if len(conditions) > 0:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY "{0:s}" {1:s}'.format(
+            id_field, 'DESC' if descending else 'ASC')
+        if limit is not None:
+            sql += ' LIMIT ?'
+            values.append(limit)
+
+        con = self._get_sqlite_connection()
+        return con.execute(sql, values).fetchall()
+
+    def db_delete_many(self, idns, batch_size=500):
+        """Delete records in a single transaction.
+
+        Args:
+            idns (list): record ids.
+            batch_size (int): number of ids per delete statement.
+
+        """
+        self._db_delete_ids(
+            self.collection_name, self.db_dict['idn']['field'],
+            list(idns), batch_size)
+
+    def _db_delete_ids(self, collection_name, id_field, idns, batch_size):
+        if len(idns) == 0:
+            return
+
+        if self.mongo:
+            collection = self._get_mongo_collection(collection_name)
+            collection.delete_many({id_field: {'$in': idns}})
+            return
+
+        con = self._get_sqlite_connection()
+        with con:
+            for start in range(0, len(idns), batch_size):
+                batch = idns[start:start+batch_size]
+                con.execute(
+                    'DELETE FROM "{0:s}" WHERE "{1:s}" IN ({2:s})'.format(
+                        collection_name, id_field,
+                        ', '.join('?' for _ in batch)), batch)
+
+    def db_save_many(self, documents):
+        """Save documents in a single transaction.
+
+        A document that fails to be saved does not roll back the others.
+
+        Args:
+            documents (list): document objects of this class.
+
+        Returns:
+            list: database id of each document, or the exception raised
+                while saving it.
+
+        """
+        id_field = self.db_dict['idn']['field']
+        fields_dict = self.get_fields_dict()
+        attrs = [attr for attr in fields_dict if attr != 'idn']
+        fields = [fields_dict[attr]['field'] for attr in attrs]
+
+        for document in documents:
+            self._set_timestamp(document)
+
+        if self.mongo:
+            return self._mongo_save_many(documents, id_field, attrs, fields)
+
+        sql = 'INSERT INTO "{0:s}" ({1:s}) VALUES ({2:s})'.format(
+            self.collection_name,
+            ', '.join('"{0:s}"'.format(field) for field in fields),
+            ', '.join('?' for _ in fields))
+
+        results = []
+        con = self._get_sqlite_connection()
+        with con:
+            if not con.in_transaction:
+                con.execute('BEGIN')
+            for document in documents:
+                try:
+                    results.append(
+                        self._db_insert_record(con, sql, document, attrs))
+                except Exception as err:
+                    results.append(err)
+        return results
+
+    def _db_insert_record(self, con, sql, document, attrs):
+        values = [
+            self._db_encode_value(getattr(document, attr, None))
+            for attr in attrs]
+        return con.execute(sql, values).lastrowid
+
+    def _mongo_save_many(self, documents, id_field, attrs, fields):
+        import pymongo as _pymongo
+        collection = self._get_mongo_collection(self.collection_name)
+        last = collection.find_one(
+            {}, projection={id_field: 1, '_id': 0}, sort=[(id_field, -1)])
+        idn = 0 if last is None else last[id_field]
+
+        results = []
+        docs = []
+        positions = []
+        for document in documents:
+            try:
+                doc = {
+                    field: self._db_encode_value(
+                        getattr(document, attr, None), mongo=True)
+                    for attr, field in zip(attrs, fields)}
+            except Exception as err:
+                results.append(err)
+                continue
+            idn += 1
+            doc[id_field] = idn
+            positions.append(len(results))
+            results.append(idn)
+            docs.append(doc)
+
+        if len(docs) > 0:
+            try:
+                collection.insert_many(docs, ordered=False)
+            except _pymongo.errors.BulkWriteError as err:
+                for error in err.details['writeErrors']:
+                    results[positions[error['index']]] = Exception(
+                        error['errmsg'])
+        return results
+
+    def db_update_fields_many(self, items):
+        """Update fields of many records in a single transaction.
+
+        Args:
+            items (list): list of (record id, dict of attribute values).
+
+        """
+        if self.mongo:
+            import pymongo as _pymongo
+            fields_dict = self.get_fields_dict()
+            id_field = self.db_dict['idn']['field']
+            requests = [
+                _pymongo.UpdateOne({id_field: idn}, {'$set': {
+                    fields_dict[attr]['field']: self._db_encode_value(
+                        value, mongo=True)
+                    for attr, value in values.items()}})
+                for idn, values in items if len(values) > 0]
+            if len(requests) > 0:
+                collection = self._get_mongo_collection(self.collection_name)
+                collection.bulk_write(requests)
+            return
+
+        con = self._get_sqlite_connection()
+        with con:
+            self._db_update_fields_many(con, items)
+
+    def _db_update_fields_many(self, con, items):
+        fields_dict = self.get_fields_dict()
+        id_field = self.db_dict['idn']['field']
+        for idn, values in items:
+            if len(values) == 0:
+                continue
+            attrs = list(values)
+            con.execute(
+                'UPDATE "{0:s}" SET {1:s} WHERE "{2:s}" = ?'.format(
+                    self.collection_name, ', '.join(
+                        '"{0:s}" = ?'.format(fields_dict[attr]['field'])
+                        for attr in attrs), id_field),
+                [self._db_encode_value(values[attr]) for attr in attrs] +
+                [idn])
+
+    def db_read_many(self, idns, batch_size=100):
+        """Read records in batches and yield document objects.
+
+        Each batch is read with a single query, so at most batch_size
+        records are held in memory.
+
+        Args:
+            idns (list): record ids.
+            batch_size (int): number of records read per query.
+
+        Yields:
+            document objects of this class, in the order of idns. Missing
+                ids are skipped.
+
+        """
+        idns = list(idns)
+        for start in range(0, len(idns), batch_size):
+            for document in self._db_read_batch(idns[start:start+batch_size]):
+                yield document
+
+    def db_get_fields(self, idns, fields):
+        """Return the field values of the records with a single query.
+
+        Args:
+            idns (list): record ids.
+            fields (list): field names.
+
+        Returns:
+            list: record values as tuples in the order of fields. The order
+                of the records is not defined and missing ids are skipped.
+
+        """
+        idns = list(idns)
+        if len(idns) == 0:
+            return []
+
+        id_field = self.db_dict['idn']['field']
+        if self.mongo:
+            collection = self._get_mongo_collection(self.collection_name)
+            projection = {field: 1 for field in fields}
+            projection['_id'] = 0
+            return [
+                tuple(doc.get(field) for field in fields)
+                for doc in collection.find(
+                    {id_field: {'$in': idns}}, projection=projection)]
+
+        con = self._get_sqlite_connection()
+        sql = 'SELECT {0:s} FROM "{1:s}" WHERE "{2:s}" IN ({3:s})'.format(
+            ', '.join('"{0:s}"'.format(field) for field in fields),
+            self.collection_name, id_field, ', '.join('?' for _ in idns))
+        return con.execute(sql, idns).fetchall()
+
+    def db_query_ids(self, equal=None, ranges=None):
+        """Return the ids of the records matching the filters, ordered by id.
+
+        Args:
+            equal (dict): field names and required values.
+            ranges (dict): field names and (minimum, maximum) values. None
+                leaves the interval open.
+
+        Returns:
+            list: record ids.
+
+        """
+        equal = {} if equal is None else equal
+        ranges = {} if ranges is None else ranges
+        id_field = self.db_dict['idn']['field']
+
+        if self.mongo:
+            query = dict(equal)
+            for field, (minimum, maximum) in ranges.items():
+                condition = {}
+                if minimum is not None:
+                    condition['$gte'] = minimum
+                if maximum is not None:
+                    condition['$lte'] = maximum
+                if len(condition) > 0:
+                    query[field] = condition
+            collection = self._get_mongo_collection(self.collection_name)
+            return [
+                doc[id_field] for doc in collection.find(
+                    query, projection={id_field: 1, '_id': 0},
+                    sort=[(id_field, 1)])]
+
+        conditions = []
+        values = []
+        for field, value in equal.items():
+            conditions.append('"{0:s}" = ?'.format(field))
+            values.append(value)
+        for field, (minimum, maximum) in ranges.items():
+            if minimum is not None:
+                conditions.append('"{0:s}" >= ?'.format(field))
+                values.append(minimum)
+            if maximum is not None:
+                conditions.append('"{0:s}" <= ?'.format(field))
+                values.append(maximum)
+
+        sql = 'SELECT "{0:s}" FROM "{1:s}"'.format(
+            id_field, self.collection_name)
+        if len(conditions) > 0:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY "{0:s}"'.format(id_field)
+
+        con = self._get_sqlite_connection()
+        return [row[0] for row in con.execute(sql, values)]
+
+    def _db_read_batch(self, idns):
+        fields_dict = self.get_fields_dict()
+        attrs = list(fields_dict)
+        rows = self.db_get_fields(
+            idns, [fields_dict[attr]['field'] for attr in attrs])
+
+        documents = {}
+        for row in rows:
+            document = self.__class__()
+            for attr, value in zip(attrs, row):
+                setattr(document, attr, self._db_decode_value(attr, value))
+            documents[document.idn] = document
+        return [documents[idn] for idn in idns if idn in documents]
+
+    @staticmethod
+    def _set_timestamp(document):
+        if getattr(document, 'date', None) is None:
+            document.date = _time.strftime('%Y-%m-%d', _time.localtime())
+        if getattr(document, 'hour', None) is None:
+            document.hour = _time.strftime('%H:%M:%S', _time.localtime())
+
+    @staticmethod
+    def _db_encode_value(value, mongo=False):
+        if isinstance(value, _np.ndarray):
+            if mongo:
+                return value.tolist()
+            return _json.dumps(value.tolist())
+        if isinstance(value, _np.generic):
+            return value.item()
+        return value
+
+    def _db_decode_value(self, attr, value):
+        if value is None:
+            return None
+        if attr in self.db_dict:
+            dtype = self.db_dict[attr]['dtype']
+        else:
+            dtype = self.db_extra_dict[attr]['dtype']
+        if dtype is _np.ndarray:
+            if isinstance(value, str):
+                value = _json.loads(value)
+            return _np.array(value)
+        return value
+
+
+class BinaryArrayDocument(StretchedWireDocument):
+    """Database document that stores ndarray fields as binary blobs.
+
+    The ndarray attributes are removed from the main collection record and
+    saved in the <collection_name>_arrays collection, one encoded blob per
+    (id, field) pair. Records saved before the binary storage was introduced
+    are still read from the main collection.
+    """
+
+    compress_arrays = False
+
+    @classmethod
+    def get_array_attributes(cls):
+        """Return the names of the ndarray attributes."""
+        return [
+            attr for attr, value in cls.db_dict.items()
+            if value['dtype'] is _np.ndarray]
+
+    @property
+    def array_collection_name(self):
+        """Collection name for the binary arrays."""
+        return '{0:s}_arrays'.format(self.collection_name)
+
+    def db_create_collection(self):
+        """Create the main and the binary arrays collections."""
+        if not super().db_create_collection():
+            return False
+
+        if self.mongo:
+            collection = self._get_mongo_collection(self.array_collection_name)
+            collection.create_index([('id', 1), ('field', 1)], unique=True)
+        else:
+            con = self._get_sqlite_connection()
+            with con:
+                con.execute(
+                    'CREATE TABLE IF NOT EXISTS "{0:s}" ('
+                    '"id" INTEGER NOT NULL, "field" TEXT NOT NULL, '
+                    '"data" BLOB, PRIMARY KEY ("id", "field"))'.format(
+                        self.array_collection_name))
+        return True
+
+    def _db_update_record(self, idn, con=None):
+        arrays = self._pop_arrays()
+        try:
+            if self.mongo:
+                status = super()._db_update_record(idn)
+                if status:
+                    self.db_save_arrays(idn, arrays)
+                return status
+
+            # the record and its arrays are updated in the same transaction
+            if con is None:
+                con = self._get_sqlite_connection()
+                with con:
+                    return self._db_update_with_arrays(con, idn, arrays)
+            return self._db_update_with_arrays(con, idn, arrays)
+        finally:
+            self._restore_arrays(arrays)
+
+    def _db_update_with_arrays(self, con, idn, arrays):
+        status = super()._db_update_record(idn, con=con)
+        if status:
+            self._db_write_arrays(con, [(idn, arrays)])
+        return status
+
+    def _db_insert_record(self, con, sql, document, attrs):
+        # a savepoint rolls back the record if its arrays fail to be saved,
+        # without rolling back the other documents of the transaction
+        arrays = document._pop_arrays()
+        con.execute('SAVEPOINT "insert_record"')
+        try:
+            idn = super()._db_insert_record(con, sql, document, attrs)
+            self._db_write_arrays(con, [(idn, arrays)])
+        except Exception:
+            con.execute('ROLLBACK TO "insert_record"')
+            raise
+        finally:
+            con.execute('RELEASE "insert_record"')
+            document._restore_arrays(arrays)
+        return idn
+
+    def _mongo_save_many(self, documents, id_field, attrs, fields):
+        arrays = [document._pop_arrays() for document in documents]
+        try:
+            results = super()._mongo_save_many(
+                documents, id_field, attrs, fields)
+        finally:
+            for document, document_arrays in zip(documents, arrays):
+                document._restore_arrays(document_arrays)
+
+        items = [
+            (idn, document_arrays)
+            for idn, document_arrays in zip(results, arrays)
+            if not isinstance(idn, Exception)]
+        try:
+            self.db_save_arrays_many(items)
+        except Exception as err:
+            # do not keep records without their arrays
+            self._db_delete_ids(
+                self.collection_name, id_field,
+                [item[0] for item in items], 500)
+            results = [
+                result if isinstance(result, Exception) else err
+                for result in results]
+        return results
+
+    def db_update_fields_many(self, items):
+        """Update fields and arrays of many records in a single transaction.
+
+        Args:
+            items (list): list of (record id, dict of attribute values).
+
+        """
+        array_attrs = self.get_array_attributes()
+        fields = [
+            (idn, {
+                attr: value for attr, value in values.items()
+                if attr not in array_attrs})
+            for idn, values in items]
+        arrays = [
+            (idn, {
+                attr: value for attr, value in values.items()
+                if attr in array_attrs})
+            for idn, values in items]
+
+        if self.mongo:
+            super().db_update_fields_many(fields)
+            self.db_save_arrays_many(arrays)
+            return
+
+        con = self._get_sqlite_connection()
+        with con:
+            self._db_update_fields_many(con, fields)
+            self._db_write_arrays(con, arrays)
+
+    def db_delete_many(self, idns, batch_size=500):
+        """Delete records and their binary arrays."""
+        idns = list(idns)
+        super().db_delete_many(idns, batch_size=batch_size)
+        self._db_delete_ids(self.array_collection_name, 'id', idns, batch_size)
+
+    def db_read(self, idn=None):
+        """Read the database record."""
+        status = super().db_read(idn)
+        idn = getattr(self, 'idn', None)
+        if status and idn is not None:
+            arrays = self.db_read_arrays(idn)
+            self._restore_arrays(arrays)
+        return status
+
+    def db_save_arrays(self, idn, arrays):
+        """Save the encoded arrays of the record idn.
+
+        Args:
+            idn (int): record id.
+            arrays (dict): ndarray attribute values.
+
+        """
+        self.db_save_arrays_many([(idn, arrays)])
+
+    def db_save_arrays_many(self, items):
+        """Save the encoded arrays of many records in a single transaction.
+
+        Args:
+            items (list): list of (record id, ndarray attribute values).
+
+        """
+        if self.mongo:
+            import pymongo as _pymongo
+            collection = self._get_mongo_collection(self.array_collection_name)
+            requests = [
+                _pymongo.ReplaceOne(
+                    {'id': row[0], 'field': row[1]},
+                    {'id': row[0], 'field': row[1], 'data': row[2]},
+                    upsert=True)
+                for row in self._array_rows(items)]
+            if len(requests) > 0:
+                collection.bulk_write(requests)
+        else:
+            con = self._get_sqlite_connection()
+            with con:
+                self._db_write_arrays(con, items)
+
+    def _db_write_arrays(self, con, items):
+        con.executemany(
+            'INSERT OR REPLACE INTO "{0:s}" '
+            '("id", "field", "data") VALUES (?, ?, ?)'.format(
+                self.array_collection_name), self._array_rows(items))
+
+    def _array_rows(self, items):
+        rows = []
+        for idn, arrays in items:
+            for attr, value in arrays.items():
+                field = self.db_dict[attr]['field']
+                if value is None:
+                    blob = None
+                else:
+                    blob = _encode_array(value, compress=self.compress_arrays)
+                rows.append((idn, field, blob))
+        return rows
+
+    def db_read_arrays(self, idn):
+        """Read the decoded arrays of the record idn.
+
+        Args:
+            idn (int): record id.
+
+        Returns:
+            dict: ndarray attribute values found in the arrays collection.
+
+        """
+        return self.db_read_arrays_many([idn]).get(idn, {})
+
+    def db_read_arrays_many(self, idns, attrs=None):
+        """Read the decoded arrays of many records with a single query.
+
+        Args:
+            idns (list): record ids.
+            attrs (list): ndarray attribute names, all by default.
+
+        Records saved before the binary storage was introduced, whose
+        arrays are not found in the arrays collection, are read from the
+        text columns of the main collection.
+
+        Returns:
+            dict: mapping of record id to the ndarray attribute values.
+
+        """
+        idns = list(idns)
+        if len(idns) == 0:
+            return {}
+
+        if attrs is None:
+            attrs = self.get_array_attributes()
+        fields = {self.db_dict[attr]['field']: attr for attr in attrs}
+
+        if self.mongo:
+            collection = self._get_mongo_collection(self.array_collection_name)
+            rows = [
+                (doc['id'], doc['field'], doc['data'])
+                for doc in collection.find({
+                    'id': {'$in': idns}, 'field': {'$in': list(fields)}})]
+        else:
+            con = self._get_sqlite_connection()
+            try:
+                rows = con.execute(
+                    'SELECT "id", "field", "data" FROM "{0:s}" '
+                    'WHERE "id" IN ({1:s}) AND "field" IN ({2:s})'.format(
+                        self.array_collection_name,
+                        ', '.join('?' for _ in idns),
+                        ', '.join('?' for _ in fields)),
+                    idns + list(fields)).fetchall()
+            except _sqlite3.OperationalError:
+                rows = []
+
+        arrays = {}
+        for idn, field, blob in rows:
+            if field not in fields:
+                continue
+            if blob is None:
+                value = None
+            else:
+                value = _decode_array(blob)
+            arrays.setdefault(idn, {})[fields[field]] = value
+
+        missing = [
+            idn for idn in idns
+            if any(attr not in arrays.get(idn, {}) for attr in attrs)]
+        if len(missing) > 0:
+            self._db_read_text_arrays_many(missing, attrs, arrays)
+        return arrays
+
+    def _db_read_text_arrays_many(self, idns, attrs, arrays):
+        # arrays of records that were not migrated to the arrays collection
+        id_field = self.db_dict['idn']['field']
+        rows = self.db_get_fields(
+            idns, [id_field] + [self.db_dict[attr]['field'] for attr in attrs])
+        for row in rows:
+            record_arrays = arrays.setdefault(row[0], {})
+            for attr, value in zip(attrs, row[1:]):
+                if attr in record_arrays:
+                    continue
+                value = self._db_decode_value(attr, value)
+                if value is not None:
+                    record_arrays[attr] = value
+
+    def db_migrate_arrays(self, batch_size=50):
+        """Move ndarray fields saved as text in the main collection to the
+        binary arrays collection.
+
+        Records are migrated in batches and the text columns are replaced by
+        empty arrays, so listing queries on the main collection no longer
+        read the array data. Arrays already saved in the binary arrays
+        collection are kept.
+
+        Args:
+            batch_size (int): number of records migrated per transaction.
+
+        Returns:
+            int: number of migrated records.
+
+        """
+        attrs = self.get_array_attributes()
+        if len(attrs) == 0:
+            return 0
+
+        id_field = self.db_dict['idn']['field']
+        fields = [self.db_dict[attr]['field'] for attr in attrs]
+        count = 0
+        while True:
+            rows = self._db_read_text_arrays(id_field, fields, batch_size)
+            if len(rows) == 0:
+                return count
+
+            keys = self._db_get_array_keys([row[0] for row in rows])
+            items = []
+            for row in rows:
+                arrays = {}
+                for attr, field, value in zip(attrs, fields, row[1:]):
+                    if (row[0], field) in keys:
+                        continue
+                    value = self._db_decode_value(attr, value)
+                    if value is not None and value.size > 0:
+                        arrays[attr] = value
+                items.append((row[0], arrays))
+
+            self.db_save_arrays_many(items)
+            self._db_clear_text_arrays(
+                id_field, fields, [row[0] for row in rows])
+            count += len(rows)
+
+    def _db_read_text_arrays(self, id_field, fields, limit):
+        if self.mongo:
+            collection = self._get_mongo_collection(self.collection_name)
+            query = {'$or': [
+                {field: {'$exists': True, '$ne': []}}
+                for field in fields]}
+            projection = {field: 1 for field in fields}
+            projection.update({id_field: 1, '_id': 0})
+            return [
+                tuple([doc[id_field]] + [doc.get(field) for field in fields])
+                for doc in collection.find(
+                    query, projection=projection).limit(limit)]
+
+        sql = 'SELECT "{0:s}", {1:s} FROM "{2:s}" WHERE {3:s} LIMIT ?'.format(
+            id_field,
+            ', '.join('"{0:s}"'.format(field) for field in fields),
+            self.collection_name,
+            ' OR '.join('LENGTH("{0:s}") > 2'.format(field)
+                        for field in fields))
+        con = self._get_sqlite_connection()
+        return con.execute(sql, (limit, )).fetchall()
+
+    def _db_clear_text_arrays(self, id_field, fields, idns):
+        if self.mongo:
+            collection = self._get_mongo_collection(self.collection_name)
+            collection.update_many(
+                {id_field: {'$in': idns}},
+                {'$set': {field: [] for field in fields}})
+            return
+
+        sql = 'UPDATE "{0:s}" SET {1:s} WHERE "{2:s}" = ?'.format(
+            self.collection_name,
+            ', '.join('"{0:s}" = ?'.format(field) for field in fields),
+            id_field)
+        empty = self._db_encode_value(_np.array([]))
+        con = self._get_sqlite_connection()
+        with con:
+            con.executemany(
+                sql, [[empty]*len(fields) + [idn] for idn in idns])
+
+    def _db_get_array_keys(self, idns):
+        if self.mongo:
+            collection = self._get_mongo_collection(self.array_collection_name)
+            return set(
+                (doc['id'], doc['field']) for doc in collection.find(
+                    {'id': {'$in': idns}},
+                    projection={'id': 1, 'field': 1, '_id': 0}))
+
+        con = self._get_sqlite_connection()
+        return set(con.execute(
+            'SELECT "id", "field" FROM "{0:s}" '
+            'WHERE "id" IN ({1:s})'.format(
+                self.array_collection_name,
+                ', '.join('?' for _ in idns)), idns).fetchall())
+
+    def _db_read_batch(self, idns):
+        documents = super()._db_read_batch(idns)
+        arrays = self.db_read_arrays_many(
+            [document.idn for document in documents])
+        for document in documents:
+            document._restore_arrays(arrays.get(document.idn, {}))
+        return documents
+
+    def _pop_arrays(self):
+        arrays = {}
+        for attr in self.get_array_attributes():
+            arrays[attr] = getattr(self, attr, None)
+            setattr(self, attr, _np.array([]))
+        return arrays
+
+    def _restore_arrays(self, arrays):
+        for attr, value in arrays.items():
+            setattr(self, attr, value)
@@ -0,0 +1,223 @@
+"""Multi-resolution min/max decimation of long series."""
+
+import numpy as _np
+
+
+class MinMaxPyramid():
+    """Multi-resolution min/max pyramid of a series.
+
+    Each level holds the minimum and maximum of blocks of factor**k
+    samples, so the view of any range can be drawn with a number of points
+    proportional to the plot width while keeping the peaks visible.
+    """
+
+    def __init__(self, x, y, factor=4, min_points=256):
+        """Create pyramid.
+
+        Args:
+            x (array_like): monotonic sample positions, or None to use
+                the sample indexes.
+            y (array_like): sample values.
+            factor (int): number of blocks merged at each level.
+            min_points (int): number of blocks of the coarsest level.
+
+        """
+        self.factor = factor
+        self.min_points = min_points
+        self.set_data(x, y)
+
+    def set_data(self, x, y):
+        """Replace the series and rebuild the pyramid."""
+        self.x = None
+        self.y = _np.empty(0, dtype=float)
+        self._levels = []
+        self.update(x, y)
+
+    def update(self, x, y):
+        """Update the pyramid with a series that extends the current one.
+
+        Only the blocks that include new samples are recalculated, so the
+        series can grow during the acquisition, e.g. as views of a
+        preallocated buffer.
+
+        Args:
+            x (array_like): monotonic sample positions, or None to use
+                the sample indexes.
+            y (array_like): sample values, starting with the current ones.
+
+        """
+        if x is not None:
+            x = _np.asarray(x, dtype=float)
+        y = _np.asarray(y, dtype=float)
+        changed = self.size
+        if y.size < changed:
+            self._levels = []
+            changed = 0
+        self.x = x
+        self.y = y
+        self._descending = x is not None and x.size > 1 and x[-1] < x[0]
+
+        nlevels = 0
+        mn, mx = y, y
+        while mn.size > self.min_points:
+            if nlevels == len(self._levels):
+                self._levels.append(_Level(self.factor**(nlevels + 1)))
+                changed = 0
+            level = self._levels[nlevels]
+
+            first = changed // self.factor
+            src_mn = mn[first*self.factor:]
+            src_mx = mx[first*self.factor:]
+            pad = -src_mn.size % self.factor
+            if pad > 0:
+                src_mn = _np.concatenate([src_mn, _np.repeat(src_mn[-1], pad)])
+                src_mx = _np.concatenate([src_mx, _np.repeat(src_mx[-1], pad)])
+            level.set_blocks(
+                first, src_mn.reshape(-1, self.factor).min(axis=1),
+                src_mx.reshape(-1, self.factor).max(axis=1))
+
+            mn, mx = level.mn, level.mx
+            changed = first
+            nlevels += 1
+        del self._levels[nlevels:]
+
+    @property
+    def levels(self):
+        """List of (block size, minima, maxima) from fine to coarse."""
+        return [(level.block, level.mn, level.mx) for level in self._levels]
+
+    @property
+    def size(self):
+        """Number of samples."""
+        return self.y.size
+
+    def positions(self, i0, i1, step=1):
+        """Return the positions of the samples i0*step to i1*step.
+
+        The sample indexes are returned if the series has no positions.
+        """
+        if self.x is None:
+            return _np.arange(i0, i1, dtype=float)*step
+        return self.x[::step][i0:i1]
+
+    def _segment(self, i0, i1, pixels, fine=True):
+        npts = i1 - i0
+        if npts <= 0:
+            return self.positions(0, 0), self.y[:0]
+
+        # samples per pixel
+        target = npts / pixels
+        level = None
+        if target > 2:
+            for block, mn, mx in self.levels:
+                if fine and block > target:
+                    break
+                level = (block, mn, mx)
+                if not fine and block >= target:
+                    break
+
+        if level is None:
+            return self.positions(i0, i1), self.y[i0:i1]
+
+        block, mn, mx = level
+        b0 = i0 // block
+        b1 = -(-i1 // block)
+        xs = self.positions(b0, b1, block)
+        nblocks = xs.size
+        xd = _np.repeat(xs, 2)
+        yd = _np.empty(2*nblocks, dtype=float)
+        yd[0::2] = mn[b0:b0+nblocks]
+        yd[1::2] = mx[b0:b0+nblocks]
+
+        # clip the blocks at the ends to the segment, so the segments do
+        # not overlap and the positions stay monotonic
+        if nblocks > 0 and b0*block < i0:
+            xd[:2] = self.positions(i0, i0 + 1)[0]
+            end = min(i1, (b0 + 1)*block)
+            yd[0], yd[1] = self.y[i0:end].min(), self.y[i0:end].max()
+        if nblocks > 0 and (b0 + nblocks)*block > i1:
+            start = max(i0, (b0 + nblocks - 1)*block)
+            yd[-2], yd[-1] = self.y[start:i1].min(), self.y[start:i1].max()
+        return xd, yd
+
+    def get_view(self, xmin, xmax, pixels):
+        """Return the decimated series for a viewport.
+
+        The visible range is returned with about one min/max pair per
+        pixel and the ranges outside the viewport at the coarse level, so
+        the plot bounds still cover the whole series.
+
+        Args:
+            xmin (float): viewport minimum position.
+            xmax (float): viewport maximum position.
+            pixels (int): viewport width [pixels].
+
+        Returns:
+            tuple: (x, y) arrays to plot.
+
+        """
+        pixels = max(1, int(pixels))
+        if self.size == 0:
+            return self.positions(0, 0), self.y
+
+        if self.x is None:
+            i0 = int(_np.clip(_np.ceil(xmin), 0, self.size))
+            i1 = int(_np.clip(_np.floor(xmax) + 1, 0, self.size))
+        elif self._descending:
+            i0 = _search_descending(self.x, xmax, inclusive=True)
+            i1 = _search_descending(self.x, xmin, inclusive=False)
+        else:
+            i0 = _np.searchsorted(self.x, xmin, side='left')
+            i1 = _np.searchsorted(self.x, xmax, side='right')
+        i0 = max(0, i0 - 1)
+        i1 = min(self.size, i1 + 1)
+        if i1 <= i0:
+            return self._segment(0, self.size, pixels, fine=False)
+
+        segments = [
+            self._segment(0, i0, pixels, fine=False),
+            self._segment(i0, i1, pixels),
+            self._segment(i1, self.size, pixels, fine=False),
+            ]
+        return (
+            _np.concatenate([s[0] for s in segments]),
+            _np.concatenate([s[1] for s in segments]))
+
+
+class _Level():
+
+    def __init__(self, block):
+        self.block = block
+        self.size = 0
+        self._mn = _np.empty(0, dtype=float)
+        self._mx = _np.empty(0, dtype=float)
+
+    @property
+    def mn(self):
+        return self._mn[:self.size]
+
+    @property
+    def mx(self):
+        return self._mx[:self.size]
+
+    def set_blocks(self, first, mn, mx):
+        size = first + mn.size
+        if size > self._mn.size:
+            capacity = max(size, 2*self._mn.size)
+            self._mn = _np.resize(self._mn, capacity)
+            self._mx = _np.resize(self._mx, capacity)
+        self._mn[first:size] = mn
+        self._mx[first:size] = mx
+        self.size = size
+
+
+def _search_descending(x, value, inclusive):
+    """Return the first index of a descending array below value."""
+    lo, hi = 0, len(x)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if x[mid] > value or (not inclusive and x[mid] == value):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
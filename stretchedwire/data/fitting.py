@@ -0,0 +1,88 @@
+"""Polynomial multipole fitting of field integrals."""
+
+import collections as _collections
+import numpy as _np
+
+
+MULTIPOLE_NAMES = ['dipole', 'gradient', 'sextupole', 'octupole', 'decapole']
+
+MultipoleFit = _collections.namedtuple(
+    'MultipoleFit',
+    ['coefficients', 'errors', 'residuals', 'rms', 'mean', 'mean_error'])
+
+
+def fit_polynomial(positions, data, order=2, weights=None):
+    """Fit a polynomial of the position to each row of data.
+
+    All rows are solved as one batched weighted least squares problem. The
+    positions are normalized before the fit to keep the normal equations
+    well conditioned.
+
+    Args:
+        positions (array_like): positions of the columns [m].
+        data (array_like): (n_rows, n_points) values.
+        order (int): polynomial order (1 for dipole and gradient, 2 to
+            include the sextupole term).
+        weights (array_like): (n_points) or (n_rows, n_points) weights,
+            e.g. the inverse variance of each point. Uniform by default.
+
+    Returns:
+        MultipoleFit: coefficients and their errors as (n_rows, order+1)
+            arrays in increasing power of the position, residuals as a
+            (n_rows, n_points) array, the rms residual of each row and the
+            mean coefficients over the rows with their standard errors.
+
+    """
+    x = _np.ravel(_np.asarray(positions, dtype=float))
+    y = _np.atleast_2d(_np.asarray(data, dtype=float))
+    nrows, npts = y.shape
+    nterms = order + 1
+    if x.size != npts:
+        raise ValueError('The positions and data sizes do not match.')
+    if npts < nterms:
+        raise ValueError(
+            'At least {0:d} points are needed for an order {1:d} '
+            'fit.'.format(nterms, order))
+
+    if weights is None:
+        w = _np.ones((nrows, npts))
+    else:
+        w = _np.broadcast_to(_np.asarray(weights, dtype=float), y.shape)
+
+    scale = _np.max(_np.abs(x))
+    if scale == 0:
+        scale = 1.0
+    design = _np.vander(x/scale, nterms, increasing=True)
+
+    # batched normal equations, (n_rows, n_terms, n_terms)
+    normal = _np.einsum('rn,ni,nj->rij', w, design, design)
+    rhs = _np.einsum('rn,ni,rn->ri', w, design, y)
+    inverse = _np.linalg.inv(normal)
+    coeffs = _np.einsum('rij,rj->ri', inverse, rhs)
+
+    residuals = y - coeffs @ design.T
+    dof = max(npts - nterms, 1)
+    variance = _np.sum(w*residuals**2, axis=1)/dof
+    errors = _np.sqrt(
+        variance[:, None]*_np.diagonal(inverse, axis1=1, axis2=2))
+
+    # back to the position units
+    factors = scale**-_np.arange(nterms)
+    coeffs = coeffs*factors
+    errors = errors*factors
+    rms = _np.sqrt(_np.mean(residuals**2, axis=1))
+
+    mean = coeffs.mean(axis=0)
+    if nrows > 1:
+        mean_error = coeffs.std(axis=0, ddof=1)/_np.sqrt(nrows)
+    else:
+        mean_error = errors[0]
+
+    return MultipoleFit(coeffs, errors, residuals, rms, mean, mean_error)
+
+
+def get_multipole_names(order):
+    """Return the names of the fitted terms."""
+    names = MULTIPOLE_NAMES[:order + 1]
+    names += ['n={0:d}'.format(n) for n in range(len(names), order + 1)]
+    return names
@@ -0,0 +1,186 @@
+"""Append-only journal of acquired raw data.
+
+The journal keeps the raw data of the current measurement on disk until it
+is saved in the database, so that it can be recovered after a crash. The
+journals are written in a per-user data directory, which can be changed
+with the STRETCHEDWIRE_JOURNAL_DIR environment variable.
+
+File layout: a fixed-size file header followed by the JSON metadata, then
+one block per scan, made of a fixed-size block header and the scan values
+as little-endian float64. Each block is flushed to disk with fsync. A block
+truncated by a crash fails the size or checksum check and is ignored when
+the journal is read.
+"""
+
+import os as _os
+import sys as _sys
+import json as _json
+import time as _time
+import glob as _glob
+import zlib as _zlib
+import struct as _struct
+import numpy as _np
+
+
+JOURNAL_EXTENSION = '.swj'
+
+
+def _get_journal_dir():
+    # per-user data directory, so that the journals are not written in
+    # the package tree, which may be read-only or under version control
+    directory = _os.environ.get('STRETCHEDWIRE_JOURNAL_DIR')
+    if directory:
+        return directory
+    if _sys.platform.startswith('win'):
+        base = _os.environ.get('LOCALAPPDATA') or _os.path.expanduser('~')
+    elif _sys.platform == 'darwin':
+        base = _os.path.join(
+            _os.path.expanduser('~'), 'Library', 'Application Support')
+    else:
+        base = _os.environ.get('XDG_DATA_HOME') or _os.path.join(
+            _os.path.expanduser('~'), '.local', 'share')
+    return _os.path.join(base, 'stretchedwire', 'journal')
+
+
+JOURNAL_DIR = _get_journal_dir()
+
+# magic, version, creation time, metadata size
+_file_header = _struct.Struct('<4sHdI')
+_FILE_MAGIC = b'SWJ1'
+_VERSION = 1
+
+# magic, scan index, number of values, time, payload crc32
+_block_header = _struct.Struct('<4sIIdI')
+_BLOCK_MAGIC = b'SCAN'
+
+
+class ScanJournal():
+    """Append-only raw data journal of one measurement."""
+
+    def __init__(self, filename, metadata=None):
+        """Create journal file.
+
+        Args:
+            filename (str): journal file path.
+            metadata (dict): JSON serializable measurement information.
+
+        """
+        if metadata is None:
+            metadata = {}
+
+        self.filename = filename
+        self.nr_scans = 0
+
+        dirname = _os.path.dirname(filename)
+        if len(dirname) > 0 and not _os.path.isdir(dirname):
+            _os.makedirs(dirname)
+
+        meta = _json.dumps(metadata).encode('utf-8')
+        header = _file_header.pack(
+            _FILE_MAGIC, _VERSION, _time.time(), len(meta))
+
+        flags = _os.O_WRONLY | _os.O_CREAT | _os.O_EXCL | _os.O_APPEND
+        flags |= getattr(_os, 'O_BINARY', 0)
+        self._fd = _os.open(filename, flags)
+        _os.write(self._fd, header + meta)
+        _os.fsync(self._fd)
+
+    @classmethod
+    def create(cls, metadata=None, directory=JOURNAL_DIR):
+        """Create a journal file with a unique name in directory."""
+        timestamp = _time.strftime('%Y-%m-%d_%H-%M-%S', _time.localtime())
+        filename = _os.path.join(directory, '{0:s}_{1:d}{2:s}'.format(
+            timestamp, _os.getpid(), JOURNAL_EXTENSION))
+        return cls(filename, metadata=metadata)
+
+    @property
+    def closed(self):
+        """Return True if the journal file is closed."""
+        return self._fd is None
+
+    def append(self, data):
+        """Append the scan values and flush them to disk.
+
+        Args:
+            data (array_like): scan values.
+
+        Returns:
+            int: scan index.
+
+        """
+        payload = _np.ascontiguousarray(data, dtype='<f8').tobytes()
+        header = _block_header.pack(
+            _BLOCK_MAGIC, self.nr_scans, len(payload) // 8, _time.time(),
+            _zlib.crc32(payload))
+        _os.write(self._fd, header + payload)
+        _os.fsync(self._fd)
+        self.nr_scans += 1
+        return self.nr_scans - 1
+
+    def close(self):
+        """Close the journal file."""
+        if self._fd is not None:
+            _os.close(self._fd)
+            self._fd = None
+
+    def discard(self):
+        """Close and remove the journal file."""
+        self.close()
+        remove_journal(self.filename)
+
+
+def read_journal(filename):
+    """Read a journal file.
+
+    Args:
+        filename (str): journal file path.
+
+    Returns:
+        tuple: (metadata, scans), where metadata is the dict saved when the
+            journal was created and scans is a list of float64 arrays with
+            the complete scans.
+
+    """
+    with open(filename, 'rb') as f:
+        buffer = f.read()
+
+    # crashed while the journal was being created
+    if len(buffer) < _file_header.size:
+        return {}, []
+
+    magic, version, _, meta_size = _file_header.unpack_from(buffer, 0)
+    if magic != _FILE_MAGIC or version != _VERSION:
+        raise ValueError('Invalid journal file: {0:s}'.format(filename))
+
+    offset = _file_header.size
+    if offset + meta_size > len(buffer):
+        return {}, []
+    metadata = _json.loads(buffer[offset:offset+meta_size].decode('utf-8'))
+    offset += meta_size
+
+    scans = []
+    while offset + _block_header.size <= len(buffer):
+        magic, _, size, _, crc = _block_header.unpack_from(buffer, offset)
+        start = offset + _block_header.size
+        end = start + 8*size
+        if magic != _BLOCK_MAGIC or end > len(buffer):
+            break
+        payload = buffer[start:end]
+        if _zlib.crc32(payload) != crc:
+            break
+        scans.append(_np.frombuffer(payload, dtype='<f8'))
+        offset = end
+
+    return metadata, scans
+
+
+def list_journals(directory=JOURNAL_DIR):
+    """Return the journal files found in directory."""
+    return sorted(_glob.glob(
+        _os.path.join(directory, '*' + JOURNAL_EXTENSION)))
+
+
+def remove_journal(filename):
+    """Remove a journal file."""
+    if _os.path.isfile(filename):
+        _os.remove(filename)
@@ -2,10 +2,13 @@
 
 import numpy as _np
 import collections as _collections
-from imautils.db.database import DatabaseAndFileDocument
+from .database import BinaryArrayDocument
+from . import analysis as _analysis
+from . import fitting as _fitting
+from . import bootstrap as _bootstrap
 
 
-class StretchedWireMeas(DatabaseAndFileDocument):
+class StretchedWireMeas(BinaryArrayDocument):
     """Stretched Wire measurements class."""
 
     mongo = False
@@ -42,6 +45,32 @@ class StretchedWireMeas(DatabaseAndFileDocument):
         ('second_integral', {'field': 'second integral', 'dtype': _np.ndarray,
                              'not_null': True}),
     ])
+    db_extra_dict = _collections.OrderedDict([
+        ('configuration_id', {'field': 'configuration_id', 'dtype': int,
+                              'not_null': False}),
+        ('n_scans', {'field': 'n scans', 'dtype': int, 'not_null': False}),
+        ('multipoles', {'field': 'multipoles', 'dtype': _np.ndarray,
+                        'not_null': False}),
+        ('multipoles_error', {'field': 'multipoles error',
+                              'dtype': _np.ndarray, 'not_null': False}),
+        ('fit_rms', {'field': 'fit rms', 'dtype': float,
+                     'not_null': False}),
+        ('confidence_level', {'field': 'confidence level', 'dtype': float,
+                              'not_null': False}),
+        ('integral_lower', {'field': 'integral lower', 'dtype': _np.ndarray,
+                            'not_null': False}),
+        ('integral_upper', {'field': 'integral upper', 'dtype': _np.ndarray,
+                            'not_null': False}),
+        ('multipoles_lower', {'field': 'multipoles lower',
+                              'dtype': _np.ndarray, 'not_null': False}),
+        ('multipoles_upper', {'field': 'multipoles upper',
+                              'dtype': _np.ndarray, 'not_null': False}),
+    ])
+    db_indexes = [
+        ('configuration_id', 'idn'),
+        ('magnet_name', 'axis1', 'type', 'date'),
+        ('date', 'hour'),
+        ]
 
     def __init__(
             self, database_name=None, mongo=False, server=None):
@@ -66,11 +95,106 @@ class StretchedWireMeas(DatabaseAndFileDocument):
         self.raw_data = None
         self.first_integral = _np.ndarray([])
         self.second_integral = _np.ndarray([])
+        self.configuration_id = None
+        self.n_scans = None
+        self.multipoles = None
+        self.multipoles_error = None
+        self.fit_rms = None
+        self.confidence_level = None
+        self.integral_lower = None
+        self.integral_upper = None
+        self.multipoles_lower = None
+        self.multipoles_upper = None
         super().__init__(database_name=database_name,
                          mongo=mongo, server=server)
 
-    def first_integral_calculus(self):
-        pass
+    def get_configuration_measurement_ids(self, configuration_id):
+        """Return the ids of measurements taken with the configuration."""
+        return self.db_get_ids(
+            self.db_extra_dict['configuration_id']['field'], configuration_id)
+
+    def first_integral_calculus(self, parameters=None):
+        """Calculate the first field integral from the raw data."""
+        self.first_integral = _analysis.calculate_integrals(
+            'First Integral', self.raw_data, self.start, self.end,
+            self.step, parameters=parameters)['first_integral']
+
+    def second_integral_calculus(self, parameters=None):
+        """Calculate the second field integral from the raw data."""
+        self.second_integral = _analysis.calculate_integrals(
+            'Second Integral', self.raw_data, self.start, self.end,
+            self.step, parameters=parameters)['second_integral']
+
+    def integrals_calculus(self, parameters=None):
+        """Calculate the field integral of the measurement type."""
+        if self.type == 'Second Integral':
+            self.second_integral_calculus(parameters=parameters)
+        else:
+            self.first_integral_calculus(parameters=parameters)
+
+    def fit_multipoles(self, order=2, weights=None, parameters=None):
+        """Fit a polynomial of the position to the integral of each scan.
+
+        The mean coefficients over the scans [T.m/m^n for first integrals],
+        their standard errors and the mean rms residual are stored in the
+        multipoles, multipoles_error and fit_rms attributes.
+
+        Args:
+            order (int): polynomial order.
+            weights (array_like): weight of each scan point.
+            parameters (dict): analysis parameters.
+
+        Returns:
+            MultipoleFit: fit of each scan.
+
+        """
+        scans = _analysis.field_integral_scans(
+            self.raw_data, self.start, self.end, self.step,
+            parameters=parameters)
+        positions = _analysis.get_positions(
+            self.start, self.end, scans.shape[1])*0.001
+        fit = _fitting.fit_polynomial(
+            positions, scans, order=order, weights=weights)
+        self.multipoles = fit.mean
+        self.multipoles_error = fit.mean_error
+        self.fit_rms = float(_np.mean(fit.rms))
+        return fit
+
+    def set_confidence_intervals(self, result):
+        """Store the intervals of a bootstrap.BootstrapResult.
+
+        The intervals are cleared if result is None.
+        """
+        if result is None:
+            self.confidence_level = None
+            self.integral_lower = None
+            self.integral_upper = None
+            self.multipoles_lower = None
+            self.multipoles_upper = None
+            return
+
+        self.confidence_level = float(result.confidence)
+        self.integral_lower = result.integral_lower
+        self.integral_upper = result.integral_upper
+        self.multipoles_lower = result.multipoles_lower
+        self.multipoles_upper = result.multipoles_upper
 
-    def second_integral_calculus(self):
-        pass
+    def bootstrap(self, nresamples=2000, confidence=0.95, order=2,
+                  parameters=None):
+        """Calculate and store bootstrap confidence intervals.
+
+        Args:
+            nresamples (int): number of resamples of the scans.
+            confidence (float): confidence level of the intervals.
+            order (int): polynomial order of the multipole fit.
+            parameters (dict): analysis parameters.
+
+        Returns:
+            BootstrapResult: intervals of the integral and multipoles.
+
+        """
+        result = _bootstrap.bootstrap_measurement(
+            self, nresamples=nresamples, confidence=confidence,
+            order=order, parameters=parameters)
+        self.set_confidence_intervals(result)
+        return result
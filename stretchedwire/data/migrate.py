@@ -0,0 +1,108 @@
+"""Migration of databases created by previous versions.
+
+The ndarray fields saved as text in the main collections are moved to the
+binary arrays collections. A sqlite database is backed up before it is
+changed, and the migration must be confirmed unless --yes is given.
+
+Usage:
+    python -m stretchedwire.data.migrate database.db [--yes]
+"""
+
+import os as _os
+import sys as _sys
+import time as _time
+import sqlite3 as _sqlite3
+import argparse as _argparse
+
+from .configuration import (
+    StretchedWireConfig as _Config,
+    PowerSupplyConfig as _PowerSupplyConfig,
+    )
+from .measurement import StretchedWireMeas as _Meas
+
+
+def backup_database(database_name):
+    """Copy a sqlite database to a timestamped backup file.
+
+    Args:
+        database_name (str): database file path.
+
+    Returns:
+        str: backup file path.
+
+    """
+    filename = '{0:s}.{1:s}.bak'.format(
+        database_name, _time.strftime('%Y%m%d_%H%M%S', _time.localtime()))
+    src = _sqlite3.connect(database_name)
+    try:
+        dst = _sqlite3.connect(filename)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+    finally:
+        src.close()
+    return filename
+
+
+def migrate(database_name, mongo=False, server=None):
+    """Migrate the database collections.
+
+    Args:
+        database_name (str): database file path (sqlite) or name (mongo).
+        mongo (bool): use MongoDB.
+        server (str): MongoDB server.
+
+    Returns:
+        dict: number of migrated records of each collection.
+
+    """
+    counts = {}
+    for cls in [_Config, _Meas, _PowerSupplyConfig]:
+        document = cls(database_name=database_name, mongo=mongo, server=server)
+        if not document.db_create_collection():
+            raise Exception('Failed to create database.')
+        if hasattr(document, 'db_migrate_arrays'):
+            counts[document.collection_name] = document.db_migrate_arrays()
+    return counts
+
+
+def main(argv=None):
+    """Run the database migration from the command line."""
+    parser = _argparse.ArgumentParser(
+        description='Migrate a database created by a previous version.')
+    parser.add_argument(
+        'database', help='database file path (sqlite) or name (mongo).')
+    parser.add_argument('--mongo', action='store_true', help='use MongoDB.')
+    parser.add_argument('--server', default=None, help='MongoDB server.')
+    parser.add_argument(
+        '--yes', action='store_true', help='do not ask for confirmation.')
+    args = parser.parse_args(argv)
+
+    if not args.mongo and not _os.path.isfile(args.database):
+        print('Database file not found: {0:s}'.format(args.database))
+        return 1
+
+    if args.mongo:
+        print('MongoDB databases are not backed up, use mongodump first.')
+
+    if not args.yes:
+        answer = input(
+            'The database {0:s} will be changed. Continue? [y/N] '.format(
+                args.database))
+        if answer.strip().lower() not in ('y', 'yes'):
+            return 1
+
+    if not args.mongo:
+        print('Database backup: {0:s}'.format(
+            backup_database(args.database)))
+
+    counts = migrate(args.database, mongo=args.mongo, server=args.server)
+    for collection_name, count in counts.items():
+        print('Migrated {0:d} records of {1:s}.'.format(
+            count, collection_name))
+    return 0
+
+
+if __name__ == '__main__':
+    _sys.exit(main())
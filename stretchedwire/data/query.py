@@ -0,0 +1,137 @@
+"""Historical queries over the measurements collection."""
+
+import collections as _collections
+import numpy as _np
+
+from .analysis import get_positions as _get_positions
+
+
+MeasurementStack = _collections.namedtuple(
+    'MeasurementStack', ['ids', 'positions', 'data'])
+
+
+def find_measurements(meas, magnet_name=None, axis1=None, meas_type=None,
+                      start_date=None, end_date=None, configuration_id=None):
+    """Return the ids of the measurements matching the filters.
+
+    Args:
+        meas (StretchedWireMeas): measurement object connected to the
+            database.
+        magnet_name (str): magnet name.
+        axis1 (str): measurement axis ('X' or 'Y').
+        meas_type (str): measurement type.
+        start_date (str): first date (YYYY-MM-DD), inclusive.
+        end_date (str): last date (YYYY-MM-DD), inclusive.
+        configuration_id (int): configuration record id.
+
+    Returns:
+        list: measurement ids ordered by id.
+
+    """
+    fields_dict = meas.get_fields_dict()
+    equal = {}
+    for attr, value in [('magnet_name', magnet_name), ('axis1', axis1),
+                        ('type', meas_type),
+                        ('configuration_id', configuration_id)]:
+        if value is not None:
+            equal[fields_dict[attr]['field']] = value
+
+    ranges = {}
+    if start_date is not None or end_date is not None:
+        ranges[fields_dict['date']['field']] = (start_date, end_date)
+
+    return meas.db_query_ids(equal=equal, ranges=ranges)
+
+
+def stack_measurements(meas, idns, attr='first_integral', grid=None,
+                       batch_size=100):
+    """Read an array field of many measurements into a single 2D array.
+
+    Records are read in batches and copied into a preallocated array, so
+    only one batch of records is held in memory besides the result.
+
+    Args:
+        meas (StretchedWireMeas): measurement object connected to the
+            database.
+        idns (list): measurement ids.
+        attr (str): ndarray attribute name.
+        grid (array_like): common positions [mm]. Each measurement is
+            linearly interpolated from its own scan positions to the grid.
+            If None, all arrays must have the same length.
+        batch_size (int): number of records read per query.
+
+    Returns:
+        MeasurementStack: ids of the stacked measurements, the positions
+            (the grid or None) and the (n_measurements, n_points) array.
+
+    """
+    idns = list(idns)
+    fields_dict = meas.get_fields_dict()
+    id_field = fields_dict['idn']['field']
+    range_fields = [
+        id_field, fields_dict['start']['field'], fields_dict['end']['field']]
+
+    if grid is not None:
+        grid = _np.asarray(grid, dtype=float)
+
+    data = None
+    stacked = []
+    for start in range(0, len(idns), batch_size):
+        batch = idns[start:start+batch_size]
+        arrays = meas.db_read_arrays_many(batch, attrs=[attr])
+        ranges = {row[0]: row[1:] for row in meas.db_get_fields(
+            batch, range_fields)}
+
+        for idn in batch:
+            values = arrays.get(idn, {}).get(attr)
+            if values is None or values.size == 0:
+                continue
+            values = _np.ravel(values)
+
+            if grid is not None:
+                scan_start, scan_end = ranges[idn]
+                if scan_start is None or scan_end is None:
+                    continue
+                positions = _get_positions(scan_start, scan_end, values.size)
+                order = _np.argsort(positions)
+                values = _np.interp(grid, positions[order], values[order])
+
+            if data is None:
+                data = _np.empty((len(idns), values.size), dtype=float)
+            elif values.size != data.shape[1]:
+                raise ValueError(
+                    'Measurement {0!s} has {1:d} points, expected {2:d}. '
+                    'Use a common grid to stack arrays of different '
+                    'lengths.'.format(idn, values.size, data.shape[1]))
+
+            data[len(stacked)] = values
+            stacked.append(idn)
+
+    if data is None:
+        npts = 0 if grid is None else grid.size
+        data = _np.empty((0, npts), dtype=float)
+    else:
+        data = data[:len(stacked)]
+
+    return MeasurementStack(stacked, grid, data)
+
+
+def query_stack(meas, attr='first_integral', grid=None, batch_size=100,
+                **filters):
+    """Find measurements and stack an array field.
+
+    Args:
+        meas (StretchedWireMeas): measurement object connected to the
+            database.
+        attr (str): ndarray attribute name.
+        grid (array_like): common positions [mm].
+        batch_size (int): number of records read per query.
+        filters: find_measurements keyword arguments.
+
+    Returns:
+        MeasurementStack: stacked measurements.
+
+    """
+    idns = find_measurements(meas, **filters)
+    return stack_measurements(
+        meas, idns, attr=attr, grid=grid, batch_size=batch_size)
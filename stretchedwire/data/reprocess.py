@@ -0,0 +1,257 @@
+"""Batch reprocessing of the stored measurement raw data.
+
+The measurements are read in chunks of ids. The field integrals, the
+multipole fit and the bootstrap confidence intervals are recalculated from
+the raw data in a process pool, and the results of each chunk are written
+back in a single transaction. The last processed id is saved in a state
+file after each chunk, so an interrupted run can be restarted with the
+same parameters. The bootstrap intervals, which take most of the time, are
+cached on disk, keyed by the raw data and the parameters, and reused by the
+next runs. The hits and misses of the analysis cache of all processes are
+reported at the end of the run.
+
+Usage:
+    python -m stretchedwire.data.reprocess database.db
+        [--parameters params.json] [--order 2] [--resamples 2000]
+        [--state state.json]
+"""
+
+import os as _os
+import sys as _sys
+import json as _json
+import argparse as _argparse
+import concurrent.futures as _futures
+
+from . import cache as _cache
+from . import analysis as _analysis
+from . import bootstrap as _bootstrap
+from .measurement import StretchedWireMeas as _Meas
+
+
+_STATS = ['hits', 'disk_hits', 'misses']
+
+_RESULT_ATTRS = [
+    'multipoles', 'multipoles_error', 'fit_rms', 'confidence_level',
+    'integral_lower', 'integral_upper', 'multipoles_lower',
+    'multipoles_upper']
+
+
+def _calculate(args):
+    (idn, meas_type, raw_data, start, end, step, parameters, order,
+     nresamples) = args
+    stats = _analysis.cache.stats
+    try:
+        meas = _Meas()
+        meas.type = meas_type
+        meas.raw_data = raw_data
+        meas.start = start
+        meas.end = end
+        meas.step = step
+
+        result = _analysis.calculate_integrals(
+            meas_type, raw_data, start, end, step, parameters=parameters)
+        fit = meas.fit_multipoles(order=order, parameters=parameters)
+        if nresamples > 0 and fit.coefficients.shape[0] > 1:
+            meas.set_confidence_intervals(_bootstrap.bootstrap_measurement(
+                meas, nresamples=nresamples, order=order,
+                parameters=parameters))
+        else:
+            meas.set_confidence_intervals(None)
+
+        result.update((attr, getattr(meas, attr)) for attr in _RESULT_ATTRS)
+    except Exception as err:
+        result = err
+    return idn, result, _get_stats_delta(stats, _analysis.cache.stats)
+
+
+def _get_stats_delta(before, after):
+    return {name: after[name] - before[name] for name in _STATS}
+
+
+def read_state(filename, parameters, order=2,
+               nresamples=_bootstrap.DEFAULT_RESAMPLES):
+    """Return the last processed id saved in the state file.
+
+    Args:
+        filename (str): state file path.
+        parameters (dict): analysis parameters of the current run.
+        order (int): polynomial order of the multipole fit.
+        nresamples (int): number of bootstrap resamples.
+
+    Returns:
+        int: last processed id, or None if there is no state file or it was
+            saved with different parameters.
+
+    """
+    if filename is None or not _os.path.isfile(filename):
+        return None
+
+    with open(filename, 'r') as f:
+        state = _json.load(f)
+
+    if (state.get('parameters') != parameters or
+            state.get('order') != order or
+            state.get('nresamples') != nresamples or
+            state.get('version') != _analysis.ANALYSIS_VERSION):
+        return None
+    return state.get('last_id')
+
+
+def write_state(filename, parameters, last_id, order=2,
+                nresamples=_bootstrap.DEFAULT_RESAMPLES):
+    """Save the last processed id in the state file."""
+    if filename is None:
+        return
+
+    state = {
+        'version': _analysis.ANALYSIS_VERSION,
+        'parameters': parameters,
+        'order': order,
+        'nresamples': nresamples,
+        'last_id': last_id,
+        }
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'w') as f:
+        _json.dump(state, f)
+    _os.replace(tmp_filename, filename)
+
+
+def reprocess(database_name, mongo=False, server=None, idns=None,
+              parameters=None, order=2,
+              nresamples=_bootstrap.DEFAULT_RESAMPLES, chunk_size=50,
+              processes=None, state_file=None, progress=None, stats=None):
+    """Recalculate the field integrals and multipoles of the measurements.
+
+    Args:
+        database_name (str): database file path (sqlite) or name (mongo).
+        mongo (bool): flag indicating mongoDB (True) or sqlite (False).
+        server (str): MongoDB server.
+        idns (list): measurement ids, all measurements by default.
+        parameters (dict): analysis parameters.
+        order (int): polynomial order of the multipole fit.
+        nresamples (int): number of bootstrap resamples. The confidence
+            intervals are cleared if it is 0 or the measurement has a
+            single scan.
+        chunk_size (int): number of measurements read and saved at once.
+        processes (int): number of worker processes, the number of CPUs
+            by default.
+        state_file (str): file used to save the progress. If it was saved
+            with the same parameters, order and resamples, ids up to the
+            last processed one are skipped.
+        progress (callable): called with (number processed, total) after
+            each chunk.
+        stats (dict): updated with the hits, disk_hits and misses counts
+            of the analysis cache of the worker processes.
+
+    Returns:
+        dict: mapping of measurement id to the exception raised when its
+            results could not be calculated, including the measurements
+            without raw data.
+
+    """
+    parameters = _analysis.get_parameters(parameters)
+    meas = _Meas(database_name=database_name, mongo=mongo, server=server)
+    fields_dict = meas.get_fields_dict()
+    fields = [
+        fields_dict[attr]['field']
+        for attr in ['idn', 'type', 'start', 'end', 'step']]
+
+    if idns is None:
+        idns = [row[0] for row in meas.db_list(fields=fields[:1])]
+    idns = sorted(idns)
+
+    last_id = read_state(
+        state_file, parameters, order=order, nresamples=nresamples)
+    if last_id is not None:
+        idns = [idn for idn in idns if idn > last_id]
+
+    failures = {}
+    total = len(idns)
+    with _futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        for start in range(0, total, chunk_size):
+            chunk = idns[start:start+chunk_size]
+            rows = meas.db_get_fields(chunk, fields)
+            arrays = meas.db_read_arrays_many(chunk, attrs=['raw_data'])
+
+            tasks = []
+            for idn, meas_type, scan_start, scan_end, step in rows:
+                raw_data = arrays.get(idn, {}).get('raw_data')
+                if raw_data is None or raw_data.size == 0:
+                    failures[idn] = ValueError('No raw data.')
+                    continue
+                tasks.append((
+                    idn, meas_type, raw_data, scan_start, scan_end, step,
+                    parameters, order, nresamples))
+
+            items = []
+            for idn, result, delta in executor.map(_calculate, tasks):
+                if stats is not None:
+                    for name, count in delta.items():
+                        stats[name] = stats.get(name, 0) + count
+                if isinstance(result, Exception):
+                    failures[idn] = result
+                else:
+                    items.append((idn, result))
+
+            if len(items) > 0:
+                meas.db_update_fields_many(items)
+            write_state(
+                state_file, parameters, chunk[-1], order=order,
+                nresamples=nresamples)
+
+            if progress is not None:
+                progress(min(start + chunk_size, total), total)
+
+    return failures
+
+
+def _print_progress(count, total):
+    print('Processed {0:d}/{1:d} measurements.'.format(count, total))
+
+
+def main(argv=None):
+    """Run the batch reprocessing from the command line."""
+    parser = _argparse.ArgumentParser(
+        description='Recalculate the field integrals of the stored '
+        'measurements from the raw data.')
+    parser.add_argument(
+        'database', help='database file path (sqlite) or name (mongo).')
+    parser.add_argument('--mongo', action='store_true', help='use MongoDB.')
+    parser.add_argument('--server', default=None, help='MongoDB server.')
+    parser.add_argument(
+        '--parameters', default=None,
+        help='JSON file with the analysis parameters.')
+    parser.add_argument(
+        '--order', type=int, default=2,
+        help='polynomial order of the multipole fit.')
+    parser.add_argument(
+        '--resamples', type=int, default=_bootstrap.DEFAULT_RESAMPLES,
+        help='number of bootstrap resamples, 0 clears the intervals.')
+    parser.add_argument(
+        '--state', default=None,
+        help='state file used to restart an interrupted run.')
+    parser.add_argument('--chunk-size', type=int, default=50)
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    parameters = None
+    if args.parameters is not None:
+        with open(args.parameters, 'r') as f:
+            parameters = _json.load(f)
+
+    stats = {}
+    failures = reprocess(
+        args.database, mongo=args.mongo, server=args.server,
+        parameters=parameters, order=args.order,
+        nresamples=args.resamples, chunk_size=args.chunk_size,
+        processes=args.processes, state_file=args.state,
+        progress=_print_progress, stats=stats)
+    print(_cache.format_stats(stats))
+
+    for idn, err in sorted(failures.items()):
+        print('Failed to process measurement {0!s}: {1!s}'.format(idn, err))
+    return 1 if len(failures) > 0 else 0
+
+
+if __name__ == '__main__':
+    _sys.exit(main())
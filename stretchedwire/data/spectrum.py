@@ -0,0 +1,201 @@
+"""Spectral analysis of timer-triggered integrator captures."""
+
+import functools as _functools
+import collections as _collections
+import numpy as _np
+
+
+DEFAULT_MAINS_FREQUENCY = 60.0  # [Hz]
+
+Peak = _collections.namedtuple(
+    'Peak', ['frequency', 'power', 'ratio', 'source', 'harmonic'])
+
+
+@_functools.lru_cache(maxsize=16)
+def _get_plan(segment_size, rate, window):
+    """Return the window, frequencies and one-sided PSD scale factors.
+
+    Repeated runs with the same segment size and rate reuse them.
+    """
+    if window == 'hann':
+        win = _np.hanning(segment_size + 1)[:-1]
+    elif window == 'boxcar':
+        win = _np.ones(segment_size)
+    else:
+        raise ValueError('Invalid window: {0!s}'.format(window))
+    win.setflags(write=False)
+
+    freqs = _np.fft.rfftfreq(segment_size, 1/rate)
+    scale = _np.full(freqs.size, 2/(rate*_np.sum(win**2)))
+    scale[0] /= 2
+    if segment_size % 2 == 0:
+        scale[-1] /= 2
+    freqs.setflags(write=False)
+    scale.setflags(write=False)
+    return win, freqs, scale
+
+
+def welch_psd(data, rate, segment_size=None, overlap=0.5, window='hann',
+              detrend=True, batch_size=256):
+    """Estimate the power spectral density with Welch's method.
+
+    The data is split in overlapping segments, read as a strided view, and
+    the windowed periodograms of a batch of segments are calculated with a
+    single FFT call and averaged.
+
+    Args:
+        data (array_like): readings sampled at a constant rate.
+        rate (float): sampling rate [Hz].
+        segment_size (int): number of samples per segment, the largest
+            power of two up to a quarter of the data by default.
+        overlap (float): fraction of overlap between segments.
+        window (str): 'hann' or 'boxcar'.
+        detrend (bool): remove the mean of each segment.
+        batch_size (int): number of segments transformed at once.
+
+    Returns:
+        tuple: (frequencies [Hz], psd [unit**2/Hz], number of segments).
+
+    """
+    data = _np.ravel(data)
+    if segment_size is None:
+        segment_size = 2**max(int(_np.log2(max(data.size // 4, 1))), 4)
+    segment_size = min(int(segment_size), data.size)
+    if segment_size < 2:
+        raise ValueError('Not enough data for a spectrum.')
+
+    step = max(1, int(round(segment_size*(1 - overlap))))
+    win, freqs, scale = _get_plan(segment_size, float(rate), window)
+
+    segments = _np.lib.stride_tricks.sliding_window_view(
+        data, segment_size)[::step]
+    nsegments = segments.shape[0]
+
+    psd = _np.zeros(freqs.size)
+    for start in range(0, nsegments, batch_size):
+        batch = _np.asarray(segments[start:start+batch_size], dtype=float)
+        if detrend:
+            batch = batch - batch.mean(axis=1, keepdims=True)
+        spectra = _np.fft.rfft(batch*win, axis=1)
+        psd += _np.sum(spectra.real**2 + spectra.imag**2, axis=0)
+
+    psd *= scale/nsegments
+    return freqs, psd, nsegments
+
+
+def find_peaks(freqs, psd, threshold=10.0, background_size=31,
+               max_peaks=20):
+    """Find the lines of a spectrum.
+
+    A line is a local maximum whose power is at least threshold times the
+    median of the surrounding bins.
+
+    Args:
+        freqs (numpy.ndarray): frequencies [Hz].
+        psd (numpy.ndarray): power spectral density.
+        threshold (float): minimum ratio of the line to the background.
+        background_size (int): number of bins of the background median.
+        max_peaks (int): maximum number of lines, the strongest first.
+
+    Returns:
+        tuple: (indexes, ratios) of the lines, sorted by decreasing power.
+
+    """
+    psd = _np.asarray(psd, dtype=float)
+    if psd.size < 3:
+        return _np.empty(0, dtype=int), _np.empty(0)
+
+    half = background_size // 2
+    padded = _np.pad(psd, half, mode='edge')
+    background = _np.median(
+        _np.lib.stride_tricks.sliding_window_view(padded, 2*half + 1),
+        axis=1)
+
+    local_max = _np.zeros(psd.size, dtype=bool)
+    local_max[1:-1] = (psd[1:-1] > psd[:-2]) & (psd[1:-1] >= psd[2:])
+    ratios = _np.divide(
+        psd, background, out=_np.zeros_like(psd), where=background > 0)
+    # the DC bin is not a line
+    local_max[0] = False
+
+    indexes = _np.nonzero(local_max & (ratios >= threshold))[0]
+    indexes = indexes[_np.argsort(psd[indexes])[::-1]][:max_peaks]
+    return indexes, ratios[indexes]
+
+
+def classify_peaks(freqs, psd, indexes, ratios,
+                   mains_frequency=DEFAULT_MAINS_FREQUENCY,
+                   wire_frequency=None, tolerance=None):
+    """Identify mains and wire resonance lines.
+
+    Args:
+        freqs (numpy.ndarray): frequencies [Hz].
+        psd (numpy.ndarray): power spectral density.
+        indexes (numpy.ndarray): line indexes.
+        ratios (numpy.ndarray): line to background ratios.
+        mains_frequency (float): mains frequency [Hz].
+        wire_frequency (float): wire fundamental resonance [Hz]. If None,
+            the lowest line that is not a mains harmonic is used.
+        tolerance (float): frequency tolerance [Hz], two frequency bins by
+            default.
+
+    Returns:
+        list: Peak tuples with source 'mains', 'wire' or 'other' and the
+            harmonic number.
+
+    """
+    if tolerance is None:
+        tolerance = 2*(freqs[1] - freqs[0]) if freqs.size > 1 else 0
+
+    def _harmonic(frequency, fundamental):
+        if fundamental is None or fundamental <= 0:
+            return 0
+        harmonic = int(round(frequency/fundamental))
+        if harmonic > 0 and abs(frequency - harmonic*fundamental) <= (
+                tolerance*harmonic):
+            return harmonic
+        return 0
+
+    lines = [(freqs[i], psd[i], r) for i, r in zip(indexes, ratios)]
+    other = [
+        f for f, _, _ in lines if _harmonic(f, mains_frequency) == 0]
+    if wire_frequency is None and len(other) > 0:
+        wire_frequency = min(other)
+
+    peaks = []
+    for frequency, power, ratio in lines:
+        harmonic = _harmonic(frequency, mains_frequency)
+        if harmonic > 0:
+            source = 'mains'
+        else:
+            harmonic = _harmonic(frequency, wire_frequency)
+            source = 'wire' if harmonic > 0 else 'other'
+        peaks.append(Peak(frequency, power, ratio, source, harmonic))
+    return peaks
+
+
+def noise_spectrum(data, rate, segment_size=None, overlap=0.5,
+                   threshold=10.0, mains_frequency=DEFAULT_MAINS_FREQUENCY,
+                   wire_frequency=None):
+    """Calculate the PSD of a capture and identify its lines.
+
+    Args:
+        data (array_like): readings sampled at a constant rate.
+        rate (float): sampling rate [Hz].
+        segment_size (int): number of samples per segment.
+        overlap (float): fraction of overlap between segments.
+        threshold (float): minimum ratio of a line to the background.
+        mains_frequency (float): mains frequency [Hz].
+        wire_frequency (float): wire fundamental resonance [Hz].
+
+    Returns:
+        tuple: (frequencies, psd, list of Peak).
+
+    """
+    freqs, psd, _ = welch_psd(
+        data, rate, segment_size=segment_size, overlap=overlap)
+    indexes, ratios = find_peaks(freqs, psd, threshold=threshold)
+    peaks = classify_peaks(
+        freqs, psd, indexes, ratios, mains_frequency=mains_frequency,
+        wire_frequency=wire_frequency)
+    return freqs, psd, peaks
@@ -0,0 +1,90 @@
+"""Running statistics of the scans of a measurement."""
+
+import numpy as _np
+
+
+class RunningStatistics():
+    """Per-position running mean and variance of scans.
+
+    The statistics are updated with Welford's algorithm as each scan is
+    added, so only the count, the mean and the sum of squared deviations of
+    each position are kept, whatever the number of scans.
+    """
+
+    def __init__(self, npts):
+        """Create statistics.
+
+        Args:
+            npts (int): number of points of each scan.
+
+        """
+        self.npts = npts
+        self.reset()
+
+    def reset(self):
+        """Discard all scans."""
+        self.count = 0
+        self._mean = _np.zeros(self.npts)
+        self._m2 = _np.zeros(self.npts)
+
+    def update(self, scans):
+        """Add scans.
+
+        Args:
+            scans (array_like): (n_points) scan or (n_scans, n_points)
+                scans.
+
+        """
+        scans = _np.atleast_2d(_np.asarray(scans, dtype=float))
+        if scans.shape[1] != self.npts:
+            raise ValueError(
+                'Invalid scan size: {0:d} points, expected {1:d}.'.format(
+                    scans.shape[1], self.npts))
+
+        for scan in scans:
+            self.count += 1
+            delta = scan - self._mean
+            self._mean += delta/self.count
+            self._m2 += delta*(scan - self._mean)
+
+    @property
+    def mean(self):
+        """Mean of each position."""
+        return self._mean.copy()
+
+    @property
+    def variance(self):
+        """Sample variance of each position."""
+        if self.count < 2:
+            return _np.full(self.npts, _np.nan)
+        return self._m2/(self.count - 1)
+
+    @property
+    def std(self):
+        """Sample standard deviation of each position."""
+        return _np.sqrt(self.variance)
+
+    @property
+    def standard_error(self):
+        """Standard error of the mean of each position."""
+        return self.std/_np.sqrt(max(self.count, 1))
+
+    @property
+    def max_standard_error(self):
+        """Largest standard error of the mean over the positions."""
+        if self.count < 2:
+            return _np.inf
+        return float(_np.max(self.standard_error))
+
+    def is_converged(self, target, min_count=3):
+        """Return True if every standard error is within target.
+
+        Args:
+            target (float): standard error target.
+            min_count (int): minimum number of scans, so that the variance
+                estimate is not based on too few scans.
+
+        """
+        if target is None or target <= 0 or self.count < max(min_count, 2):
+            return False
+        return self.max_standard_error <= target
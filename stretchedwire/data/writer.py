@@ -0,0 +1,110 @@
+"""Background database writer."""
+
+import sys as _sys
+import copy as _copy
+import queue as _queue
+import threading as _threading
+import traceback as _traceback
+
+from .database import pool as _pool
+
+
+class DatabaseWriter():
+    """Serialize database writes in a background thread.
+
+    Writes are queued in a bounded queue and executed in order by a single
+    worker thread. Submitting blocks while the queue is full.
+    """
+
+    def __init__(self, maxsize=16):
+        """Create writer.
+
+        Args:
+            maxsize (int): maximum number of pending writes.
+
+        """
+        self._queue = _queue.Queue(maxsize=maxsize)
+        self._thread = None
+        self._lock = _threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = _threading.Thread(
+                    target=self._run, name='DatabaseWriter', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    _pool.close_thread_connections()
+                    return
+                func, callback, error_callback = item
+                try:
+                    result = func()
+                except Exception as err:
+                    if error_callback is not None:
+                        error_callback(err)
+                    else:
+                        _traceback.print_exc(file=_sys.stdout)
+                else:
+                    if callback is not None:
+                        callback(result)
+            except Exception:
+                _traceback.print_exc(file=_sys.stdout)
+            finally:
+                self._queue.task_done()
+
+    def submit(self, func, callback=None, error_callback=None):
+        """Queue a write function.
+
+        Args:
+            func (callable): function executed in the writer thread.
+            callback (callable): called with the function return value.
+            error_callback (callable): called with the raised exception.
+
+        Callbacks are called from the writer thread.
+
+        """
+        self._start()
+        self._queue.put((func, callback, error_callback))
+
+    def save(self, document, callback=None, error_callback=None):
+        """Queue a deep copy of the document to be saved in the database.
+
+        The arrays of the copy are not shared with the document, so the
+        document can be changed while the copy is saved.
+
+        Args:
+            document (DatabaseAndFileDocument): document object.
+            callback (callable): called with the database id.
+            error_callback (callable): called with the raised exception.
+
+        """
+        document = _copy.deepcopy(document)
+
+        def _save():
+            idn = document.db_save()
+            if idn is None:
+                raise Exception('Failed to save database.')
+            return idn
+
+        self.submit(_save, callback=callback, error_callback=error_callback)
+
+    def flush(self):
+        """Wait until all queued writes are done."""
+        self._queue.join()
+
+    def stop(self):
+        """Execute the queued writes and stop the writer thread."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join()
+
+
+writer = DatabaseWriter()
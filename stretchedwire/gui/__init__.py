@@ -6,6 +6,7 @@ from . import motorswidget
 from . import integratorwidget
 from . import measurementswidget
 from . import resultswidget
+from . import databasetabwidget
 from . import databasewidget
 from . import mainwindow
 from . import utils
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""Database tables with paginated models."""
+
+import sys as _sys
+import collections as _collections
+import traceback as _traceback
+from qtpy.QtWidgets import (
+    QTabWidget as _QTabWidget,
+    QTableView as _QTableView,
+    QAbstractItemView as _QAbstractItemView,
+    QMessageBox as _QMessageBox,
+    )
+from qtpy.QtCore import (
+    Qt as _Qt,
+    QModelIndex as _QModelIndex,
+    QAbstractTableModel as _QAbstractTableModel,
+    )
+
+from stretchedwire.gui import utils as _utils
+
+
+class DatabaseTableModel(_QAbstractTableModel):
+    """Table model that reads database records in pages.
+
+    Only the record ids are loaded when the model is reset. The scalar
+    fields are read by id range when a page becomes visible, and the last
+    pages read are kept in a LRU cache.
+    """
+
+    def __init__(self, document, page_size=_utils.TABLE_PAGE_SIZE,
+                 cache_pages=_utils.TABLE_CACHE_PAGES, parent=None):
+        """Create model.
+
+        Args:
+            document (StretchedWireDocument): document object connected to
+                the database.
+            page_size (int): number of rows read per query.
+            cache_pages (int): maximum number of pages kept in memory.
+            parent (QObject): parent object.
+
+        """
+        super().__init__(parent)
+        self.document = document
+        self.page_size = page_size
+        self.cache_pages = cache_pages
+        self.fields = document.get_scalar_fields()
+        self._id_column = self.fields.index(document.db_dict['idn']['field'])
+        self._ids = []
+        self._pages = _collections.OrderedDict()
+
+    @property
+    def table_name(self):
+        """Database table name."""
+        return self.document.collection_name
+
+    def reload(self):
+        """Read the record ids and clear the page cache."""
+        self.beginResetModel()
+        try:
+            id_field = self.fields[self._id_column]
+            self._ids = [
+                row[0] for row in self.document.db_list(fields=[id_field])]
+            self._pages.clear()
+        finally:
+            self.endResetModel()
+
+    def clear(self):
+        """Remove all rows from the model."""
+        self.beginResetModel()
+        self._ids = []
+        self._pages.clear()
+        self.endResetModel()
+
+    def get_id(self, row):
+        """Return the record id of the row."""
+        return self._ids[row]
+
+    def rowCount(self, parent=_QModelIndex()):
+        """Return the number of records."""
+        if parent.isValid():
+            return 0
+        return len(self._ids)
+
+    def columnCount(self, parent=_QModelIndex()):
+        """Return the number of scalar fields."""
+        if parent.isValid():
+            return 0
+        return len(self.fields)
+
+    def headerData(self, section, orientation, role=_Qt.DisplayRole):
+        """Return the field names as column headers."""
+        if role != _Qt.DisplayRole:
+            return None
+        if orientation == _Qt.Horizontal:
+            return self.fields[section]
+        return str(section + 1)
+
+    def data(self, index, role=_Qt.DisplayRole):
+        """Return the field value of the record."""
+        if not index.isValid() or role != _Qt.DisplayRole:
+            return None
+
+        page = self._get_page(index.row() // self.page_size)
+        value = page[index.row() % self.page_size][index.column()]
+        if value is None:
+            return ''
+
+        value = str(value)
+        if len(value) > _utils.TABLE_MAX_STR_SIZE:
+            value = value[:_utils.TABLE_MAX_STR_SIZE] + '...'
+        return value
+
+    def _get_page(self, number):
+        if number in self._pages:
+            self._pages.move_to_end(number)
+            return self._pages[number]
+
+        ids = self._ids[number*self.page_size:(number + 1)*self.page_size]
+        rows = self.document.db_list(
+            fields=self.fields, min_id=ids[0], max_id=ids[-1])
+        rows = {row[self._id_column]: row for row in rows}
+        empty = (None, )*len(self.fields)
+        page = [rows.get(idn, empty) for idn in ids]
+
+        self._pages[number] = page
+        while len(self._pages) > self.cache_pages:
+            self._pages.popitem(last=False)
+        return page
+
+
+class DatabaseTabWidget(_QTabWidget):
+    """Tab widget with one paginated table per database collection."""
+
+    def __init__(self, object_classes, database_name=None, mongo=False,
+                 server=None, parent=None):
+        """Create tab widget.
+
+        Args:
+            object_classes (list): document classes of the tables.
+            database_name (str): database file path (sqlite) or name (mongo).
+            mongo (bool): flag indicating mongoDB (True) or sqlite (False).
+            server (str): MongoDB server.
+            parent (QWidget): parent widget.
+
+        """
+        super().__init__(parent)
+        self.object_classes = list(object_classes)
+        self.database_name = database_name
+        self.mongo = mongo
+        self.server = server
+        self.tables = _collections.OrderedDict()
+
+    def delete_widgets(self):
+        """Delete table widgets."""
+        for table in self.tables.values():
+            table.setModel(None)
+            table.deleteLater()
+        self.tables.clear()
+
+    def load_database(self):
+        """Create the table widgets and read the record ids."""
+        self.delete_widgets()
+        self.clear()
+        for object_class in self.object_classes:
+            document = object_class(
+                database_name=self.database_name,
+                mongo=self.mongo, server=self.server)
+            model = DatabaseTableModel(document, parent=self)
+            table = _QTableView()
+            table.setSelectionBehavior(_QAbstractItemView.SelectRows)
+            table.setAlternatingRowColors(True)
+            table.verticalHeader().setDefaultSectionSize(20)
+            table.setModel(model)
+            model.reload()
+            self.tables[model.table_name] = table
+            self.addTab(table, model.table_name)
+
+    def update_database_tables(self):
+        """Reload the record ids of all tables."""
+        if len(self.tables) == 0:
+            self.load_database()
+            return
+
+        for table in self.tables.values():
+            model = table.model()
+            document = model.document
+            if (document.database_name != self.database_name or
+                    document.mongo != self.mongo or
+                    document.server != self.server):
+                self.load_database()
+                return
+            model.reload()
+
+    def get_current_table_name(self):
+        """Return the name of the current table."""
+        index = self.currentIndex()
+        if index == -1:
+            return None
+        return list(self.tables)[index]
+
+    def get_table_selected_ids(self, table_name):
+        """Return the ids of the selected rows."""
+        table = self.tables.get(table_name)
+        if table is None:
+            return []
+
+        model = table.model()
+        rows = sorted(
+            index.row() for index in table.selectionModel().selectedRows())
+        return [model.get_id(row) for row in rows]
+
+    def delete_database_documents(self):
+        """Delete the selected records of the current table."""
+        try:
+            table_name = self.get_current_table_name()
+            if table_name is None:
+                return
+
+            idns = self.get_table_selected_ids(table_name)
+            if len(idns) == 0:
+                return
+
+            msg = 'Delete {0:d} selected database record(s)?'.format(
+                len(idns))
+            reply = _QMessageBox.question(
+                self, 'Delete', msg, _QMessageBox.Yes | _QMessageBox.No,
+                _QMessageBox.No)
+            if reply != _QMessageBox.Yes:
+                return
+
+            model = self.tables[table_name].model()
+            model.document.db_delete_many(idns)
+            model.reload()
+        except Exception:
+            _traceback.print_exc(file=_sys.stdout)
+            msg = 'Failed to delete database records.'
+            _QMessageBox.critical(self, 'Failure', msg, _QMessageBox.Ok)
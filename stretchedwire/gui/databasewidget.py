@@ -3,19 +3,26 @@
 
 import os as _os
 import sys as _sys
+import threading as _threading
 import traceback as _traceback
 from qtpy.QtWidgets import (
     QWidget as _QWidget,
     QApplication as _QApplication,
     QMessageBox as _QMessageBox,
     QFileDialog as _QFileDialog,
+    QProgressDialog as _QProgressDialog,
     )
+from qtpy.QtCore import Signal as _Signal
 import qtpy.uic as _uic
 
-from imautils.gui import databasewidgets as _databasewidgets
 from stretchedwire.gui.utils import get_ui_file as _get_ui_file
+from stretchedwire.gui.databasetabwidget import (
+    DatabaseTabWidget as _DatabaseTabWidget)
 
 import stretchedwire.data as _data
+from stretchedwire.data import bulk as _bulk
+from stretchedwire.data import columnar as _columnar
+from stretchedwire.data.writer import DatabaseWriter as _DatabaseWriter
 
 
 _PowerSupplyConfig = _data.configuration.PowerSupplyConfig
@@ -30,6 +37,10 @@ class DatabaseWidget(_QWidget):
     _config_table_name = _Config.collection_name
     _meas_table_name = _Meas.collection_name
 
+    export_progress = _Signal([int, int])
+    export_finished = _Signal([object])
+    export_error = _Signal([object])
+
     def __init__(self, parent=None):
         """Set up the ui."""
         super().__init__(parent)
@@ -44,11 +55,17 @@ class DatabaseWidget(_QWidget):
             self._meas_table_name: _Meas,
             }
 
-        self.twg_database = _databasewidgets.DatabaseTabWidget(
+        self.twg_database = _DatabaseTabWidget(
+            self._table_object_dict.values(),
             database_name=self.database_name,
             mongo=self.mongo, server=self.server)
         self.ui.lyt_database.addWidget(self.twg_database)
 
+        # the files are saved in a background thread, one export at a time
+        self.export_writer = _DatabaseWriter(maxsize=1)
+        self.export_cancel = None
+        self.export_dialog = None
+
         # connect signals and slots
         self.connect_signal_slots()
 
@@ -72,6 +89,17 @@ class DatabaseWidget(_QWidget):
         """Return the default directory."""
         return _QApplication.instance().directory
 
+    def closeEvent(self, event):
+        """Cancel the running export and close widget."""
+        try:
+            if self.export_cancel is not None:
+                self.export_cancel.set()
+            self.export_writer.stop()
+            event.accept()
+        except Exception:
+            _traceback.print_exc(file=_sys.stdout)
+            event.accept()
+
     def clear(self):
         """Clear."""
         try:
@@ -86,8 +114,12 @@ class DatabaseWidget(_QWidget):
         self.ui.tbt_clear.clicked.connect(self.clear)
         self.ui.pbt_save.clicked.connect(self.save_files)
         self.ui.pbt_read.clicked.connect(self.read_files)
+        self.ui.pbt_export.clicked.connect(self.export_columnar)
         self.ui.pbt_delete.clicked.connect(
             self.twg_database.delete_database_documents)
+        self.export_progress.connect(self.update_export_progress)
+        self.export_finished.connect(self.export_files_finished)
+        self.export_error.connect(self.export_files_failed)
 
     def save_files(self):
         """Save database record to file."""
@@ -103,18 +135,16 @@ class DatabaseWidget(_QWidget):
             if nr_idns == 0:
                 return
 
-            objs = []
-            fns = []
+            if nr_idns > 1:
+                self.save_files_to_directory(object_class, idns)
+                return
+
             try:
-                for i in range(nr_idns):
-                    idn = idns[i]
-                    obj = object_class(
-                        database_name=self.database_name,
-                        mongo=self.mongo, server=self.server)
-                    obj.db_read(idn)
-                    default_filename = obj.default_filename
-                    objs.append(obj)
-                    fns.append(default_filename)
+                obj = object_class(
+                    database_name=self.database_name,
+                    mongo=self.mongo, server=self.server)
+                obj.db_read(idns[0])
+                default_filename = obj.default_filename
 
             except Exception:
                 _traceback.print_exc(file=_sys.stdout)
@@ -122,41 +152,22 @@ class DatabaseWidget(_QWidget):
                 _QMessageBox.critical(self, 'Failure', msg, _QMessageBox.Ok)
                 return
 
-            if nr_idns == 1:
-                filename = _QFileDialog.getSaveFileName(
-                    self, caption='Save file',
-                    directory=_os.path.join(self.directory, fns[0]),
-                    filter="Text files (*.txt *.dat)")
-
-                if isinstance(filename, tuple):
-                    filename = filename[0]
-
-                if len(filename) == 0:
-                    return
+            filename = _QFileDialog.getSaveFileName(
+                self, caption='Save file',
+                directory=_os.path.join(self.directory, default_filename),
+                filter="Text files (*.txt *.dat)")
 
-                fns[0] = filename
-            else:
-                directory = _QFileDialog.getExistingDirectory(
-                    self, caption='Save files', directory=self.directory)
-
-                if isinstance(directory, tuple):
-                    directory = directory[0]
+            if isinstance(filename, tuple):
+                filename = filename[0]
 
-                if len(directory) == 0:
-                    return
-
-                for i in range(len(fns)):
-                    fns[i] = _os.path.join(directory, fns[i])
+            if len(filename) == 0:
+                return
 
             try:
-                for i in range(nr_idns):
-                    obj = objs[i]
-                    idn = idns[i]
-                    filename = fns[i]
-                    if (not filename.endswith('.txt') and
-                       not filename.endswith('.dat')):
-                        filename = filename + '.txt'
-                    obj.save_file(filename)
+                if (not filename.endswith('.txt') and
+                   not filename.endswith('.dat')):
+                    filename = filename + '.txt'
+                obj.save_file(filename)
             except Exception:
                 _traceback.print_exc(file=_sys.stdout)
                 msg = 'Failed to save files.'
@@ -164,6 +175,146 @@ class DatabaseWidget(_QWidget):
         except Exception:
             _traceback.print_exc(file=_sys.stdout)
 
+    def save_files_to_directory(self, object_class, idns):
+        """Save database records to files in a directory.
+
+        The files are saved in a background thread, which reports its
+        progress with signals, so the interface stays responsive.
+        """
+        if self.export_cancel is not None:
+            _QMessageBox.warning(self, 'Warning',
+                                 'Files are already being saved.',
+                                 _QMessageBox.Ok)
+            return
+
+        directory = _QFileDialog.getExistingDirectory(
+            self, caption='Save files', directory=self.directory)
+
+        if isinstance(directory, tuple):
+            directory = directory[0]
+
+        if len(directory) == 0:
+            return
+
+        try:
+            obj = object_class(
+                database_name=self.database_name,
+                mongo=self.mongo, server=self.server)
+
+            cancel = _threading.Event()
+            prg_dialog = _QProgressDialog(
+                'Saving files...', 'Cancel', 0, len(idns), self)
+            prg_dialog.setWindowTitle('Information')
+            prg_dialog.canceled.connect(cancel.set)
+            prg_dialog.show()
+
+            def _progress(count, total):
+                self.export_progress.emit(count, total)
+                return not cancel.is_set()
+
+            def _export():
+                _, failures = _bulk.export_files(
+                    obj, idns, directory, progress=_progress)
+                return failures
+
+            self.export_cancel = cancel
+            self.export_dialog = prg_dialog
+            self.ui.pbt_save.setEnabled(False)
+            self.export_writer.submit(
+                _export, callback=self.export_finished.emit,
+                error_callback=self.export_error.emit)
+        except Exception:
+            self._end_export()
+            _traceback.print_exc(file=_sys.stdout)
+            msg = 'Failed to save files.'
+            _QMessageBox.critical(self, 'Failure', msg, _QMessageBox.Ok)
+
+    def update_export_progress(self, count, total):
+        """Show the number of saved files."""
+        if self.export_dialog is not None:
+            self.export_dialog.setValue(count)
+
+    def export_files_finished(self, failures):
+        """Report the records that could not be saved to files."""
+        self._end_export()
+        if len(failures) > 0:
+            for idn, err in failures.items():
+                print('Failed to save ID {0!s}: {1!s}'.format(idn, err))
+            msg = 'Failed to save files.\nIDs: ' + str(sorted(failures))
+            _QMessageBox.critical(self, 'Failure', msg, _QMessageBox.Ok)
+
+    def export_files_failed(self, error):
+        """Warn that the files could not be saved."""
+        self._end_export()
+        print('Failed to save files: {0!s}'.format(error))
+        msg = 'Failed to save files.'
+        _QMessageBox.critical(self, 'Failure', msg, _QMessageBox.Ok)
+
+    def _end_export(self):
+        if self.export_dialog is not None:
+            self.export_dialog.close()
+        self.export_dialog = None
+        self.export_cancel = None
+        self.ui.pbt_save.setEnabled(True)
+
+    def export_columnar(self):
+        """Export the selected records, or all records, to columnar files."""
+        table_name = self.twg_database.get_current_table_name()
+        if table_name is None:
+            return
+
+        object_class = self._table_object_dict[table_name]
+        idns = self.twg_database.get_table_selected_ids(table_name)
+        if len(idns) == 0:
+            idns = None
+
+        filters = {
+            'Parquet dataset (*.parquet)': _columnar.PARQUET,
+            'Arrow IPC dataset (*.arrow)': _columnar.ARROW,
+            }
+        directory = _QFileDialog.getSaveFileName(
+            self, caption='Export directory',
+            directory=_os.path.join(self.directory, table_name),
+            filter=';;'.join(filters))
+
+        if isinstance(directory, tuple):
+            directory, selected_filter = directory
+        else:
+            selected_filter = ''
+
+        if len(directory) == 0:
+            return
+
+        file_format = filters.get(selected_filter, _columnar.PARQUET)
+        extension = '.' + file_format
+        if directory.endswith(extension):
+            directory = directory[:-len(extension)]
+
+        try:
+            obj = object_class(
+                database_name=self.database_name,
+                mongo=self.mongo, server=self.server)
+
+            total = obj.db_count() if idns is None else len(idns)
+            prg_dialog = _QProgressDialog(
+                'Exporting records...', 'Cancel', 0, total, self)
+            prg_dialog.setWindowTitle('Information')
+            prg_dialog.show()
+
+            def _progress(count, total):
+                prg_dialog.setValue(count)
+                _QApplication.processEvents()
+                return not prg_dialog.wasCanceled()
+
+            _columnar.export_records(
+                obj, directory, idns=idns, file_format=file_format,
+                progress=_progress)
+            prg_dialog.close()
+        except Exception:
+            _traceback.print_exc(file=_sys.stdout)
+            msg = 'Failed to export records.'
+            _QMessageBox.critical(self, 'Failure', msg, _QMessageBox.Ok)
+
     def read_files(self):
         """Read file and save in database."""
         table_name = self.twg_database.get_current_table_name()
@@ -183,17 +334,38 @@ class DatabaseWidget(_QWidget):
             return
 
         try:
-            idns = []
-            for filename in fns:
-                obj = object_class(
-                    database_name=self.database_name,
-                    mongo=self.mongo, server=self.server)
-                obj.read_file(filename)
-                idn = obj.db_save()
-                idns.append(idn)
-            msg = 'Added to database table.\nIDs: ' + str(idns)
+            prg_dialog = _QProgressDialog(
+                'Reading files...', 'Cancel', 0, len(fns), self)
+            prg_dialog.setWindowTitle('Information')
+            prg_dialog.show()
+
+            def _progress(count, total):
+                prg_dialog.setValue(count)
+                _QApplication.processEvents()
+                return not prg_dialog.wasCanceled()
+
+            obj = object_class(
+                database_name=self.database_name,
+                mongo=self.mongo, server=self.server)
+            idns, failures = _bulk.import_files(
+                obj, fns, progress=_progress)
+            prg_dialog.close()
+
+            idns = [idns[filename] for filename in fns if filename in idns]
             self.update_database_tables()
-            _QMessageBox.information(self, 'Information', msg, _QMessageBox.Ok)
+            if len(failures) == 0:
+                msg = 'Added to database table.\nIDs: ' + str(idns)
+                _QMessageBox.information(
+                    self, 'Information', msg, _QMessageBox.Ok)
+            else:
+                for filename, err in failures.items():
+                    print('Failed to import {0:s}: {1!s}'.format(
+                        filename, err))
+                msg = (
+                    'Added to database table.\nIDs: ' + str(idns) +
+                    '\n\nFailed to read or save files:\n' +
+                    '\n'.join(_os.path.basename(f) for f in failures))
+                _QMessageBox.warning(self, 'Warning', msg, _QMessageBox.Ok)
         except Exception:
             _traceback.print_exc(file=_sys.stdout)
             msg = 'Failed to read files and save values in database.'
@@ -7,16 +7,24 @@ from qtpy.QtWidgets import (
     QMessageBox as _QMessageBox,
     QFileDialog as _QFileDialog,
     )
+import os as _os
 import sys as _sys
 import time as _time
 import numpy as _np
 import traceback as _traceback
+import pyqtgraph as _pg
 import qtpy.uic as _uic
 
 from stretchedwire.gui.utils import get_ui_file as _get_ui_file
+from stretchedwire.gui.utils import (
+    UPDATE_PLOT_INTERVAL as _UPDATE_PLOT_INTERVAL)
+from stretchedwire.gui.plotdata import DecimatedCurve as _DecimatedCurve
 from stretchedwire.devices import fdi as _mint
 from stretchedwire.data import config as _config
 from stretchedwire.data import meas as _meas
+from stretchedwire.data import archive as _archive
+from stretchedwire.data import capture as _capture
+from stretchedwire.data import spectrum as _spectrum
 
 
 class IntegratorWidget(_QWidget):
@@ -33,6 +41,11 @@ class IntegratorWidget(_QWidget):
         self.mint = _mint
         self.config = _config
         self.meas = _meas
+        self.capture = None
+        self.raw_curve = None
+        self.timer_data = None
+        self.timer_rate = None
+        self.spectrum_widget = None
 
         # connect signals and slots
         self.connect_signal_slots()
@@ -45,12 +58,12 @@ class IntegratorWidget(_QWidget):
         self.ui.pbt_status_update.clicked.connect(self.status_update)
         self.ui.pbt_shut_down.clicked.connect(self.shut_down)
         self.ui.tbt_save_file.clicked.connect(self.save_file)
+        self.ui.pbt_spectrum.clicked.connect(self.plot_spectrum)
 
     def config_integrator(self):
         """Configures the FDI2056."""
         try:
-            self.ui.gv_rawcurves_tim.plotItem.curves.clear()
-            self.ui.gv_rawcurves_tim.clear()
+            self.clear_raw_curve()
             self.update_config()
             self.mint.main_settings(self.config.gain, self.config.trig_source)
             if self.config.meas_unit == 'V.s':
@@ -74,13 +87,14 @@ class IntegratorWidget(_QWidget):
         _rate = float(self.ui.le_timer_rate.text())
         _pts = round(_total_time / (1/_rate))
         _time_limit = 50 * _total_time
+        self.timer_data = None
+        self.timer_rate = _rate
 
         self.mint.config_trig_timer(_rate, _pts)
         self.mint.start_measurement()
         self.stop = False
 
-        self.ui.gv_rawcurves_tim.plotItem.curves.clear()
-        self.ui.gv_rawcurves_tim.clear()
+        self.clear_raw_curve()
         self.ui.gv_rawcurves_tim.plotItem.setLabel(
             'left', "Amplitude", units=self.config.meas_unit)
         self.ui.gv_rawcurves_tim.plotItem.setLabel(
@@ -88,38 +102,51 @@ class IntegratorWidget(_QWidget):
         self.ui.gv_rawcurves_tim.plotItem.showGrid(
             x=True, y=True, alpha=0.2)
 
-        # start collecting data
-        _time0 = _time.time()
-        _count = self.mint.get_data_count()
-        while ((_count != _pts-1) and (self.stop is False)):
-            _count = self.mint.get_data_count()
-            if (_time.time() - _time0) > _time_limit:
-                _QMessageBox.warning(self, 'Warning', 'Timeout while '
-                                     'waiting for integrator data.',
-                                     _QMessageBox.Ok)
-                return
-            _QApplication.processEvents()
+        if self.ui.chb_long_capture.isChecked():
+            self.measure_long_capture(_rate, _pts, _time_limit)
+            return
 
-        if self.stop is False:
-            _results = self.mint.get_data()
-            print(_results)
-            _results = _results.strip('\n').split(',')
-            for i in range(len(_results)):
-                try:
-                    if self.config.meas_unit == 'V.s':
-                        _results[i] = float(_results[i].strip(' WB'))
-                    else:
-                        _results[i] = float(_results[i].strip(' V'))
-                except Exception:
-                    _traceback.print_exc(file=_sys.stdout)
-                    if 'NAN' in _results[i]:
-                        _QMessageBox.warning(self, 'Warning',
-                                             'Integrator tension over-range.\n'
-                                             'Please configure a lower gain.',
-                                             _QMessageBox.Ok)
+        # read the data as it is acquired and plot it at a limited rate
+        _total = _pts - 1
+        _buffer = _np.empty(_total, dtype=_np.float64)
+        _size = 0
+        _time0 = _time.time()
+        _plot_time = _time0
+        self.raw_curve = _DecimatedCurve(
+            self.ui.gv_rawcurves_tim.plotItem, None, [],
+            pen=(255, 0, 0), symbol=None)
+        try:
+            while _size < _total and self.stop is False:
+                _now = _time.time()
+                if _now - _time0 > _time_limit:
+                    _QMessageBox.warning(self, 'Warning', 'Timeout while '
+                                         'waiting for integrator data.',
+                                         _QMessageBox.Ok)
                     return
 
-            self.meas.raw_data = _np.array(_results, dtype=_np.float64)
+                _count = self.mint.get_data_count()
+                if _count >= _total - _size or (
+                        _count > 0 and
+                        _now - _plot_time >= _UPDATE_PLOT_INTERVAL):
+                    _data = _capture.parse_integrator_data(
+                        self.mint.get_data(), self.config.meas_unit)
+                    _data = _data[:_total - _size]
+                    _buffer[_size:_size + _data.size] = _data
+                    _size += _data.size
+                    self.raw_curve.update_data(None, _buffer[:_size])
+                    _plot_time = _now
+                _QApplication.processEvents()
+        except ValueError:
+            _traceback.print_exc(file=_sys.stdout)
+            _QMessageBox.warning(self, 'Warning',
+                                 'Integrator tension over-range.\n'
+                                 'Please configure a lower gain.',
+                                 _QMessageBox.Ok)
+            return
+
+        if self.stop is False:
+            self.meas.raw_data = _buffer
+            self.timer_data = self.meas.raw_data
             try:
                 _tmp = self.meas.raw_data.reshape(
                     self.config.n_scans,
@@ -128,15 +155,123 @@ class IntegratorWidget(_QWidget):
                 _traceback.print_exc(file=_sys.stdout)
                 return
 
-            px = _np.linspace(0, len(self.meas.raw_data)-1,
-                              len(self.meas.raw_data))
-            self.ui.gv_rawcurves_tim.plotItem.plot(
-                px, self.meas.raw_data, pen=(255, 0, 0), symbol=None)
+    def measure_long_capture(self, rate, npts, time_limit):
+        """Drain the integrator buffer to a memory-mapped file on disk.
+
+        Args:
+            rate (float): timer trigger rate [Hz].
+            npts (int): number of trigger points.
+            time_limit (float): timeout [s].
 
-#            fft = _np.fft.fft(self.meas.raw_data)
-#            freq = _np.fft.fftfreq(self.meas.raw_data.size, 0.0005)
-#            plt.plot(freq, fft.real)
-#            plt.show()
+        """
+        # the previous capture file can only be removed when it is no
+        # longer mapped, so the measurement, raw curve and timer data that
+        # map it are released first
+        try:
+            if self.capture is not None:
+                _raw_data = self.meas.raw_data
+                if (isinstance(_raw_data, _np.memmap) and
+                        _raw_data.filename == _os.path.abspath(
+                            self.capture.filename)):
+                    self.meas.raw_data = None
+                self.timer_data = None
+                self.capture.discard()
+        except Exception:
+            _traceback.print_exc(file=_sys.stdout)
+        self.capture = _capture.MemmapCapture.create()
+        self.raw_curve = _DecimatedCurve(
+            self.ui.gv_rawcurves_tim.plotItem, None, [],
+            pen=(255, 0, 0), symbol=None)
+
+        # read about one second of data per request
+        _drain_size = max(1, int(rate))
+        _total = npts - 1
+        _time0 = _time.time()
+        _plot_time = _time0
+        try:
+            while self.capture.size < _total and self.stop is False:
+                _count = self.mint.get_data_count()
+                if _count >= min(_drain_size, _total - self.capture.size):
+                    _data = _capture.parse_integrator_data(
+                        self.mint.get_data(), self.config.meas_unit)
+                    self.capture.append(_data)
+                elif (_time.time() - _time0) > time_limit:
+                    _QMessageBox.warning(self, 'Warning', 'Timeout while '
+                                         'waiting for integrator data.',
+                                         _QMessageBox.Ok)
+                    break
+
+                _now = _time.time()
+                if _now - _plot_time >= _UPDATE_PLOT_INTERVAL:
+                    self.raw_curve.update_data(None, self.capture.data)
+                    _plot_time = _now
+                _QApplication.processEvents()
+        except ValueError:
+            _traceback.print_exc(file=_sys.stdout)
+            _QMessageBox.warning(self, 'Warning',
+                                 'Integrator tension over-range.\n'
+                                 'Please configure a lower gain.',
+                                 _QMessageBox.Ok)
+        finally:
+            self.capture.close()
+
+        # the measurement keeps the read-only memory map, so the data is
+        # only read from the disk when it is analysed or saved
+        self.timer_data = self.capture.data
+        self.meas.raw_data = self.timer_data
+        print('Captured {0:d} points in {1:s}'.format(
+            self.capture.size, self.capture.filename))
+
+        self.raw_curve.update_data(None, self.timer_data)
+
+    def plot_spectrum(self):
+        """Plot the noise spectrum of the last timer measurement."""
+        try:
+            if self.timer_rate is None or self.timer_data is None:
+                _QMessageBox.information(self, 'Information',
+                                         'No timer measurement found.',
+                                         _QMessageBox.Ok)
+                return
+
+            freqs, psd, peaks = _spectrum.noise_spectrum(
+                self.timer_data, self.timer_rate)
+
+            if self.spectrum_widget is None:
+                self.spectrum_widget = _pg.PlotWidget()
+                self.spectrum_widget.setWindowTitle('Noise Spectrum')
+                self.spectrum_widget.setBackground('w')
+            plot_item = self.spectrum_widget.plotItem
+            plot_item.clear()
+            plot_item.setLogMode(x=False, y=True)
+            plot_item.setLabel(
+                'left', "PSD", units=self.config.meas_unit + '^2/Hz')
+            plot_item.setLabel('bottom', "Frequency", units='Hz')
+            plot_item.showGrid(x=True, y=True, alpha=0.2)
+            plot_item.plot(freqs[1:], psd[1:], pen=(0, 0, 255))
+
+            colors = {'mains': (255, 0, 0), 'wire': (0, 160, 0)}
+            for peak in peaks:
+                plot_item.plot(
+                    [peak.frequency], [peak.power], pen=None, symbol='o',
+                    symbolBrush=colors.get(peak.source, (128, 128, 128)))
+                print('{0:10.3f} Hz  {1:8.1f}x  {2:s} {3:d}'.format(
+                    peak.frequency, peak.ratio, peak.source,
+                    peak.harmonic))
+            self.spectrum_widget.show()
+            self.spectrum_widget.raise_()
+        except Exception:
+            _traceback.print_exc(file=_sys.stdout)
+            _QMessageBox.warning(self, 'Warning',
+                                 'Could not calculate the spectrum.',
+                                 _QMessageBox.Ok)
+
+    def clear_raw_curve(self):
+        """Remove the raw data curve and clear the plot."""
+        if self.raw_curve is not None:
+            self.raw_curve.remove()
+            self.raw_curve = None
+        self.ui.gv_rawcurves_tim.plotItem.curves.clear()
+        self.ui.gv_rawcurves_tim.clear()
 
     def stop(self):
         self.stop = True
@@ -145,7 +280,9 @@ class IntegratorWidget(_QWidget):
         filename = _QFileDialog.getSaveFileName(
             self, caption='Open measurement file',
             directory='Integrator_Measurement',
-            filter="Text files (*.txt *.dat)")
+            filter="Text files (*.txt *.dat);;"
+                   "Measurement archive (*{0:s})".format(
+                       _archive.ARCHIVE_EXTENSION))
 
         if isinstance(filename, tuple):
             filename = filename[0]
@@ -153,7 +290,7 @@ class IntegratorWidget(_QWidget):
         if len(filename) == 0:
             return
 
-        self.meas.save_file(filename)
+        _archive.save_measurement(self.meas, filename)
 
     def status_update(self):
         """Updates integrator status on UI."""
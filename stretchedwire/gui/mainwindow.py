@@ -29,6 +29,8 @@ from stretchedwire.gui.powersupplywidget \
  import PowerSupplyWidget as _PowerSupplyWidget
 
 from stretchedwire.gui import utils as _utils
+from stretchedwire.data import database as _database
+from stretchedwire.data.writer import writer as _writer
 
 
 class MainWindow(_QMainWindow):
@@ -118,6 +120,8 @@ class MainWindow(_QMainWindow):
         try:
             for tab in self.tab_widgets:
                 tab.close()
+            _writer.stop()
+            _database.pool.close()
             event.accept()
         except Exception:
             _traceback.print_exc(file=_sys.stdout)
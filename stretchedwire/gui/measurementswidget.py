@@ -3,10 +3,11 @@
 
 import os as _os
 import sys as _sys
+import copy as _copy
+import functools as _functools
 import time as _time
 import numpy as _np
 import traceback as _traceback
-from scipy import stats
 from qtpy.QtWidgets import (
     QWidget as _QWidget,
     QFileDialog as _QFileDialog,
@@ -15,20 +16,38 @@ from qtpy.QtWidgets import (
     )
 from qtpy.QtCore import (
     QTimer as _QTimer,
+    Signal as _Signal,
     )
 import qtpy.uic as _uic
 # import matplotlib.pyplot as plt
 
 from stretchedwire.gui.utils import get_ui_file as _get_ui_file
+from stretchedwire.gui.utils import (
+    UPDATE_PLOT_INTERVAL as _UPDATE_PLOT_INTERVAL)
+from stretchedwire.gui.plotdata import DecimatedCurve as _DecimatedCurve
 from stretchedwire.devices import ppmac as _mdriver
 from stretchedwire.devices import fdi as _mint
 from stretchedwire.data import config as _config
 from stretchedwire.data import meas as _meas
+from stretchedwire.data import archive as _archive
+from stretchedwire.data.writer import writer as _writer
+from stretchedwire.data import journal as _journal
+from stretchedwire.data import capture as _capture
+from stretchedwire.data import fitting as _fitting
+from stretchedwire.data import analysis as _analysis
+from stretchedwire.data import centering as _centering
+from stretchedwire.data import statistics as _statistics
+from stretchedwire.data import bootstrap as _bootstrap
+from stretchedwire.data.measurement import StretchedWireMeas as _Meas
 
 
 class MeasurementsWidget(_QWidget):
     """Measurements Widget class."""
 
+    database_saved = _Signal([object])
+    database_error = _Signal([object])
+    bootstrap_finished = _Signal([object, object])
+
     def __init__(self, parent=None):
         """Set up the ui."""
         super().__init__(parent)
@@ -47,11 +66,33 @@ class MeasurementsWidget(_QWidget):
         self.stop = True
         self.update_timer = 500
         self.position_timer = _QTimer()
+        self.journal = None
+        self.raw_curve = None
+        self.scan_stats = None
+        self.bootstrap_future = None
         self.list_config_files()
 
         # connect signals and slots
         self.connect_signal_slots()
 
+        # offer to recover unsaved measurements after the event loop starts
+        _QTimer.singleShot(0, self.recover_journals)
+
+    @property
+    def database_name(self):
+        """Database name."""
+        return _QApplication.instance().database_name
+
+    @property
+    def mongo(self):
+        """MongoDB database."""
+        return _QApplication.instance().mongo
+
+    @property
+    def server(self):
+        """Server for MongoDB database."""
+        return _QApplication.instance().server
+
     def closeEvent(self, event):
         """Close widget."""
         try:
@@ -70,7 +111,11 @@ class MeasurementsWidget(_QWidget):
         self.ui.tbt_save_file.clicked.connect(self.save_measurement)
         self.ui.tbt_save_to_database.clicked.connect(self.save_to_database)
         self.ui.pbt_refresh_status.clicked.connect(self.refresh_connection)
+        self.ui.pbt_center_roll.clicked.connect(self.run_center_roll)
         self.position_timer.timeout.connect(self.update_position)
+        self.database_saved.connect(self.database_save_finished)
+        self.database_error.connect(self.database_save_failed)
+        self.bootstrap_finished.connect(self.bootstrap_done)
 
     def start_meas(self):
         """Starts a new measurement."""
@@ -125,6 +170,9 @@ class MeasurementsWidget(_QWidget):
 
         self.mdriver.cfg_trigger_signal(self.config.start, self.config.step)
 
+        if self.raw_curve is not None:
+            self.raw_curve.remove()
+            self.raw_curve = None
         self.ui.gv_rawcurves.plotItem.curves.clear()
         self.ui.gv_rawcurves.clear()
         self.ui.gv_rawcurves.plotItem.setLabel(
@@ -134,64 +182,272 @@ class MeasurementsWidget(_QWidget):
         self.ui.gv_rawcurves.plotItem.showGrid(
             x=True, y=True, alpha=0.2)
 
+        self.open_journal()
+
         self.mint.config_trig_external(self.config.n_pts)
         self.mint.start_measurement()
         self.mdriver.run_motion_prog(self.config.type, self.config.axis1)
         self.position_timer.start(self.update_timer)
 
         # start collecting data
+        _scan_npts = self.config.n_pts-1
+        _npts = _scan_npts*self.config.n_scans
+        _buffer = _np.empty(_npts, dtype=_np.float64)
+        _ndata = 0
+        px = _np.linspace(self.config.start, self.config.end,
+                          self.config.n_pts)
+        px = px[1:]
+        if self.config.n_scans > 1:
+            # the scans are plotted one after the other
+            px = None
+            self.ui.gv_rawcurves.plotItem.setLabel('bottom', "Sample")
+        self.raw_curve = _DecimatedCurve(
+            self.ui.gv_rawcurves.plotItem, None if px is None else px[:0],
+            _buffer[:0], pen=(0, 0, 0), symbol=None)
+
+        # running statistics of the field integral of the finished scans
+        self.bootstrap_future = None
+        self.scan_stats = _statistics.RunningStatistics(_scan_npts)
+        _target_error = self.get_target_error()
+        _nscans = 0
+        self.ui.la_scan_status.setText('')
+
         _time0 = _time.time()
-        _count = self.mint.get_data_count()
-        while ((_count != self.config.n_pts-1) and (self.stop is False)):
+        _time_limit = self.config.time_limit*self.config.n_scans
+        _plot_time = _time0
+        while ((_ndata < _npts) and (self.stop is False)):
             _count = self.mint.get_data_count()
-            if (_time.time() - _time0) > self.config.time_limit:
+            if _count > 0:
+                try:
+                    _data = _capture.parse_integrator_data(
+                        self.mint.get_data(), self.config.meas_unit)
+                except ValueError:
+                    _traceback.print_exc(file=_sys.stdout)
+                    _QMessageBox.warning(self, 'Warning',
+                                         'Integrator tension over-range.\n'
+                                         'Please configure a lower gain.',
+                                         _QMessageBox.Ok)
+                    return
+                _data = _data[:_npts - _ndata]
+                _buffer[_ndata:_ndata + _data.size] = _data
+                _ndata += _data.size
+
+            # journal each scan as soon as it is complete
+            while (_nscans + 1)*_scan_npts <= _ndata:
+                _scan = _buffer[_nscans*_scan_npts:(_nscans + 1)*_scan_npts]
+                _nscans += 1
+                if self.journal is not None:
+                    try:
+                        self.journal.append(_scan)
+                    except Exception:
+                        _traceback.print_exc(file=_sys.stdout)
+
+                if self.scan_stats is not None:
+                    try:
+                        self.scan_stats.update(
+                            _analysis.field_integral_scans(
+                                _scan, self.config.start, self.config.end,
+                                self.config.step))
+                        self.ui.la_scan_status.setText(
+                            'Scan {0:d}/{1:d}: max std. error {2:.3g} '
+                            'T.m'.format(
+                                _nscans, self.config.n_scans,
+                                self.scan_stats.max_standard_error))
+                    except Exception:
+                        _traceback.print_exc(file=_sys.stdout)
+                        self.scan_stats = None
+
+            if (self.scan_stats is not None and
+                    _nscans < self.config.n_scans and
+                    self.scan_stats.is_converged(_target_error)):
+                self.ui.la_scan_status.setText(
+                    'Target std. error reached after {0:d} scans.'.format(
+                        _nscans))
+                _npts = _nscans*_scan_npts
+                self.finish_motion_prog()
+                break
+
+            _now = _time.time()
+            if (_now - _time0) > _time_limit:
                 _QMessageBox.warning(self, 'Warning', 'Timeout while '
                                      'waiting for integrator data.',
                                      _QMessageBox.Ok)
                 return
+            if _now - _plot_time >= _UPDATE_PLOT_INTERVAL:
+                self.raw_curve.update_data(
+                    None if px is None else px[:_ndata], _buffer[:_ndata])
+                _plot_time = _now
             _QApplication.processEvents()
 
         if self.stop is False:
-            _results = self.mint.get_data()
-            _results = _results.strip('\n').split(',')
-            for i in range(len(_results)):
-                try:
-                    if self.config.meas_unit == 'V.s':
-                        _results[i] = float(_results[i].strip(' WB'))
-                    else:
-                        _results[i] = float(_results[i].strip(' V'))
-                except Exception:
-                    _traceback.print_exc(file=_sys.stdout)
-                    if 'NAN' in _results[i]:
-                        _QMessageBox.warning(self, 'Warning',
-                                             'Integrator tension over-range.\n'
-                                             'Please configure a lower gain.',
-                                             _QMessageBox.Ok)
-                    return
+            self.meas.raw_data = _buffer[:_npts]
+            self.meas.n_scans = _npts//_scan_npts
+            self.raw_curve.update_data(px, self.meas.raw_data)
 
-            self.meas.raw_data = _np.array(_results, dtype=_np.float64)
             try:
-                _tmp = self.meas.raw_data.reshape(
-                    self.config.n_scans,
-                    self.config.n_pts-1).transpose()
+                _fit = self.meas.fit_multipoles()
+                _names = _fitting.get_multipole_names(
+                    _fit.mean.size - 1)
+                for _name, _value, _error in zip(
+                        _names, self.meas.multipoles,
+                        self.meas.multipoles_error):
+                    print('{0:s}: {1:.6g} +/- {2:.2g}'.format(
+                        _name, _value, _error))
+                print('rms residual: {0:.3g}'.format(self.meas.fit_rms))
             except Exception:
                 _traceback.print_exc(file=_sys.stdout)
+
+            if self.meas.n_scans > 1:
+                self.start_bootstrap()
+
+    def start_bootstrap(self):
+        """Calculate the confidence intervals in the worker pool."""
+        try:
+            _raw_data = self.meas.raw_data
+            _future = _bootstrap.submit(self.meas)
+            self.bootstrap_future = _future
+            _future.add_done_callback(
+                lambda f: self.bootstrap_finished.emit(_raw_data, f))
+        except Exception:
+            _traceback.print_exc(file=_sys.stdout)
+
+    def bootstrap_done(self, raw_data, future):
+        """Store the confidence intervals in the measurement."""
+        try:
+            result = future.result()
+        except Exception:
+            _traceback.print_exc(file=_sys.stdout)
+            return
+
+        # the measurement may have been replaced while the job was running
+        if self.meas.raw_data is not raw_data:
+            return
+
+        self.meas.set_confidence_intervals(result)
+        _names = _fitting.get_multipole_names(
+            result.multipoles_lower.size - 1)
+        print('{0:.0f}% confidence intervals ({1:d} resamples):'.format(
+            100*result.confidence, result.nresamples))
+        for _name, _lower, _upper in zip(
+                _names, result.multipoles_lower, result.multipoles_upper):
+            print('{0:s}: [{1:.6g}, {2:.6g}]'.format(_name, _lower, _upper))
+
+    def get_target_error(self):
+        """Return the standard error target [T.m], or None if not set."""
+        _text = self.ui.le_target_error.text().strip()
+        if len(_text) == 0:
+            return None
+        try:
+            return float(_text)
+        except ValueError:
+            _QMessageBox.warning(self, 'Warning',
+                                 'Invalid standard error target.',
+                                 _QMessageBox.Ok)
+            return None
+
+    def measure_scan(self, axis, start, end, fixed):
+        """Measure along axis with the other axis at a fixed position.
+
+        Args:
+            axis (str): scan axis ('X' or 'Y').
+            start (float): scan start position [mm].
+            end (float): scan end position [mm].
+            fixed (float): position of the other axis [mm].
+
+        Returns:
+            tuple: (positions [mm], field integral of each scan).
+
+        """
+        getattr(self.ui, 'rb_axis1_' + axis).setChecked(True)
+        getattr(self.ui, 'le_start_' + axis).setText(str(start))
+        getattr(self.ui, 'le_end_' + axis).setText(str(end))
+
+        if axis == 'X':
+            _other, _motor = 'Y', 2
+        else:
+            _other, _motor = 'X', 1
+        self.mdriver.axis_move(_other, fixed)
+        _time.sleep(0.5)
+        while self.mdriver.in_position(_motor) == 0:
+            _QApplication.processEvents()
+
+        _previous = self.meas.raw_data
+        self.start_meas()
+        if self.stop or self.meas.raw_data is _previous:
+            raise RuntimeError('{0:s} scan failed.'.format(axis))
+
+        _scans = _analysis.field_integral_scans(
+            self.meas.raw_data, self.meas.start, self.meas.end,
+            self.meas.step)
+        _positions = _analysis.get_positions(
+            self.meas.start, self.meas.end, _scans.shape[1])
+        return _positions, _scans
+
+    def run_center_roll(self):
+        """Find the magnetic center and roll angle of a quadrupole.
+
+        The routine starts at the middle of the X and Y scan ranges with
+        half of the X range as window.
+        """
+        try:
+            _x_start = float(self.ui.le_start_X.text())
+            _x_end = float(self.ui.le_end_X.text())
+            _y_start = float(self.ui.le_start_Y.text())
+            _y_end = float(self.ui.le_end_Y.text())
+            routine = _centering.CenterRollRoutine(
+                self.measure_scan, x0=(_x_start + _x_end)/2,
+                y0=(_y_start + _y_end)/2, window=abs(_x_end - _x_start)/2)
+
+            def _progress(result):
+                print('Set {0:d}: x0 = {1:.4f} +/- {2:.4f} mm, '
+                      'y0 = {3:.4f} +/- {4:.4f} mm, '
+                      'roll = {5:.4f} +/- {6:.4f} mrad'.format(
+                          result.nsets, result.x0, result.x0_error,
+                          result.y0, result.y0_error, result.roll*1e3,
+                          result.roll_error*1e3))
+                return self.stop is False
+
+            self.stop = False
+            result = routine.run(progress=_progress)
+            if result is None:
                 return
 
-            px = _np.linspace(self.config.start, self.config.end,
-                              self.config.n_pts)
-            px = px[1:]
-            self.ui.gv_rawcurves.plotItem.plot(
-                px, self.meas.raw_data, pen=(0, 0, 0), width=3, symbol=None)
-
-            px = px * 0.001
-            data = self.meas.raw_data / (self.config.step*0.001)
-            print(self.meas.raw_data)
-            print(stats.linregress(px, data))
-#            fft = _np.fft.fft(self.meas.raw_data)
-#            freq = _np.fft.fftfreq(self.meas.raw_data.size, 0.0005)
-#            plt.plot(freq, fft.real)
-#            plt.show()
+            msg = ('Center offset: X = {0:.4f} +/- {1:.4f} mm, '
+                   'Y = {2:.4f} +/- {3:.4f} mm\n'
+                   'Roll angle: {4:.4f} +/- {5:.4f} mrad\n'
+                   'Scan sets: {6:d}{7:s}').format(
+                       result.x0, result.x0_error, result.y0,
+                       result.y0_error, result.roll*1e3,
+                       result.roll_error*1e3, result.nsets,
+                       '' if result.converged else ' (not converged)')
+            _QMessageBox.information(
+                self, 'Center and Roll', msg, _QMessageBox.Ok)
+        except Exception:
+            _traceback.print_exc(file=_sys.stdout)
+            _QMessageBox.warning(self, 'Warning',
+                                 'Center and roll routine failed.',
+                                 _QMessageBox.Ok)
+
+    def finish_motion_prog(self):
+        """Stops the motion program when the current scan motion ends.
+
+        The program is stopped with the motors in position and the motors
+        are not killed, so they keep holding their position.
+        """
+        if self.config.axis1 == 'X':
+            _motor = 1
+        else:
+            _motor = 2
+        _time0 = _time.time()
+        while (self.mdriver.in_position(_motor) == 0 and
+               self.stop is False):
+            if (_time.time() - _time0) > self.config.time_limit:
+                _QMessageBox.warning(self, 'Warning', 'Timeout while '
+                                     'waiting for the end of the scan.',
+                                     _QMessageBox.Ok)
+                break
+            _QApplication.processEvents()
+        self.mdriver.abort_motion_prog()
 
     def stop_meas(self):
         """Aborts measurement."""
@@ -288,7 +544,9 @@ class MeasurementsWidget(_QWidget):
         filename = _QFileDialog.getSaveFileName(
             self, caption='Open measurement file',
             directory=self.meas.magnet_name,
-            filter="Text files (*.txt *.dat)")
+            filter="Text files (*.txt *.dat);;"
+                   "Measurement archive (*{0:s})".format(
+                       _archive.ARCHIVE_EXTENSION))
 
         if isinstance(filename, tuple):
             filename = filename[0]
@@ -296,12 +554,138 @@ class MeasurementsWidget(_QWidget):
         if len(filename) == 0:
             return
 
-        self.meas.save_file(filename)
+        _archive.save_measurement(self.meas, filename)
 
     def save_to_database(self):
+        """Queue the current measurement to be saved in the database."""
         self.update_meas()
-        if not self.meas.db_save():
-            raise Exception("Failed to save database.")
+        self.meas.db_update_database(
+            database_name=self.database_name,
+            mongo=self.mongo, server=self.server)
+        self.config.db_update_database(
+            database_name=self.database_name,
+            mongo=self.mongo, server=self.server)
+        if self.journal is not None:
+            self.save_meas_to_database(
+                self.meas, self.config, self.journal.discard,
+                bootstrap_future=self.bootstrap_future)
+        else:
+            self.save_meas_to_database(
+                self.meas, self.config,
+                bootstrap_future=self.bootstrap_future)
+
+    def save_meas_to_database(self, meas, config=None, discard_journal=None,
+                              bootstrap_future=None):
+        """Queue the measurement to be saved and then discard its journal.
+
+        The measurement references the id of the stored configuration with
+        the same content, which is saved first if needed. If the bootstrap
+        of the measurement is running, the save waits for its confidence
+        intervals.
+        """
+        # the arrays are changed in place by the next measurement
+        meas = _copy.deepcopy(meas)
+        if config is not None:
+            config = _copy.deepcopy(config)
+
+        def _save():
+            if bootstrap_future is not None:
+                try:
+                    meas.set_confidence_intervals(bootstrap_future.result())
+                except Exception:
+                    _traceback.print_exc(file=_sys.stdout)
+            if config is not None:
+                meas.configuration_id = config.db_get_configuration_id()
+            idn = meas.db_save()
+            if idn is None:
+                raise Exception('Failed to save database.')
+            return idn
+
+        def _saved(idn):
+            if discard_journal is not None:
+                discard_journal()
+            self.database_saved.emit(idn)
+
+        _writer.submit(
+            _save, callback=_saved, error_callback=self.database_error.emit)
+
+    def open_journal(self):
+        """Create the raw data journal of a new measurement.
+
+        The journal of the previous measurement is discarded, as its data
+        is replaced in memory by the new measurement.
+        """
+        try:
+            if self.journal is not None:
+                self.journal.discard()
+            self.update_meas()
+            metadata = {
+                attr: getattr(self.meas, attr)
+                for attr, value in self.meas.db_dict.items()
+                if value['dtype'] in (str, int, float)}
+            metadata['n_scans'] = self.config.n_scans
+            metadata['n_pts'] = self.config.n_pts
+            self.journal = _journal.ScanJournal.create(metadata)
+        except Exception:
+            self.journal = None
+            _traceback.print_exc(file=_sys.stdout)
+
+    def recover_journals(self):
+        """Offer to save the measurements found in raw data journals."""
+        try:
+            filenames = _journal.list_journals()
+            if len(filenames) == 0:
+                return
+
+            _ans = _QMessageBox.question(
+                self, 'Recover measurements',
+                'Found {0:d} measurement(s) not saved in the database.\n'
+                'Do you want to recover them into the database?\n'
+                '(Discard removes the journal files.)'.format(
+                    len(filenames)),
+                _QMessageBox.Yes | _QMessageBox.No | _QMessageBox.Discard)
+
+            if _ans == _QMessageBox.Discard:
+                for filename in filenames:
+                    _journal.remove_journal(filename)
+                return
+
+            if _ans != _QMessageBox.Yes:
+                return
+
+            for filename in filenames:
+                metadata, scans = _journal.read_journal(filename)
+                if len(scans) == 0:
+                    _journal.remove_journal(filename)
+                    continue
+
+                meas = _Meas(
+                    database_name=self.database_name,
+                    mongo=self.mongo, server=self.server)
+                for attr, value in metadata.items():
+                    if attr in meas.db_dict and attr != 'idn':
+                        setattr(meas, attr, value)
+                meas.raw_data = _np.concatenate(scans)
+                meas.n_scans = len(scans)
+                self.save_meas_to_database(
+                    meas, discard_journal=_functools.partial(
+                        _journal.remove_journal, filename))
+        except Exception:
+            _traceback.print_exc(file=_sys.stdout)
+            _QMessageBox.warning(self, 'Warning',
+                                 'Failed to recover measurements.',
+                                 _QMessageBox.Ok)
+
+    def database_save_finished(self, idn):
+        """Show the database id of the saved measurement."""
+        print('Measurement saved in database. ID: {0!s}'.format(idn))
+
+    def database_save_failed(self, error):
+        """Warn that the measurement could not be saved."""
+        print('Failed to save measurement in database: {0!s}'.format(error))
+        _QMessageBox.warning(self, 'Warning',
+                             'Failed to save measurement in database.',
+                             _QMessageBox.Ok)
 
     def update_meas(self):
         self.meas.operator = self.config.operator
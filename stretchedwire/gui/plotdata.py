@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""Decimated plot data for long series."""
+
+import numpy as _np
+import pyqtgraph as _pg
+
+from stretchedwire.data.decimation import MinMaxPyramid
+
+
+class DecimatedCurve():
+    """Plot curve that draws the min/max decimated view of the viewport.
+
+    The curve data is refined when the view range or the plot size
+    changes, so the redraw time does not depend on the series length.
+    """
+
+    def __init__(self, plot_item, x, y, **kwargs):
+        """Create curve.
+
+        Args:
+            plot_item (PlotItem): pyqtgraph plot item.
+            x (array_like): monotonic sample positions, or None.
+            y (array_like): sample values.
+            kwargs: PlotDataItem keyword arguments (pen, symbol...).
+
+        """
+        self.plot_item = plot_item
+        self.pyramid = MinMaxPyramid(x, y)
+        self.item = plot_item.plot(**kwargs)
+        self._view_box = plot_item.getViewBox()
+        self._view_box.sigXRangeChanged.connect(self.update_view)
+        self._view_box.sigResized.connect(self.update_view)
+
+        # start with the whole series so that auto range sees its bounds
+        if self.pyramid.size > 0:
+            x = self.pyramid.positions(0, self.pyramid.size)
+            self._set_view(x.min(), x.max(), self._get_width())
+
+    def _get_width(self):
+        width = int(self._view_box.width())
+        # the view box has no size before the widget is shown
+        return width if width > 1 else 1000
+
+    def _set_view(self, xmin, xmax, pixels):
+        x, y = self.pyramid.get_view(xmin, xmax, pixels)
+        self.item.setData(x, y)
+
+    def set_data(self, x, y):
+        """Replace the series."""
+        self.pyramid.set_data(x, y)
+        self.update_view()
+
+    def update_data(self, x, y):
+        """Update the curve with a series that extends the current one."""
+        self.pyramid.update(x, y)
+        self.update_view()
+
+    def update_view(self, *args):
+        """Draw the decimated view of the current viewport."""
+        if self._view_box is None:
+            return
+        xmin, xmax = self._view_box.viewRange()[0]
+        self._set_view(xmin, xmax, self._get_width())
+
+    def remove(self):
+        """Disconnect from the view box and remove the curve."""
+        if self._view_box is None:
+            return
+        for signal in (self._view_box.sigXRangeChanged,
+                       self._view_box.sigResized):
+            try:
+                signal.disconnect(self.update_view)
+            except (TypeError, RuntimeError):
+                pass
+        self.plot_item.removeItem(self.item)
+        self._view_box = None
+
+
+class CurveOverlay():
+    """Pool of curves plotting the rows of a 2D array.
+
+    The curve items are kept and updated with setData when the overlay is
+    plotted again, and are drawn with clipping and peak downsampling, so
+    many curves can be compared interactively.
+    """
+
+    def __init__(self, plot_item):
+        """Create overlay.
+
+        Args:
+            plot_item (PlotItem): pyqtgraph plot item.
+
+        """
+        self.plot_item = plot_item
+        self.items = []
+
+    def _get_item(self, index):
+        while len(self.items) <= index:
+            item = _pg.PlotDataItem()
+            item.setClipToView(True)
+            item.setDownsampling(auto=True, method='peak')
+            self.items.append(item)
+
+        item = self.items[index]
+        if item not in self.plot_item.items:
+            self.plot_item.addItem(item)
+        return item
+
+    def set_curves(self, x, data, reference=None, pens=None):
+        """Plot the rows of data.
+
+        Args:
+            x (array_like): positions of the columns.
+            data (array_like): (n_curves, n_points) array.
+            reference (int): row subtracted from all rows, or None.
+            pens (list): pen of each row. By default a single curve is red
+                and many curves get distinct colors.
+
+        """
+        data = _np.atleast_2d(_np.asarray(data, dtype=float))
+        if reference is not None:
+            data = data - data[reference]
+
+        ncurves = data.shape[0]
+        if pens is None:
+            if ncurves == 1:
+                pens = [(255, 0, 0)]
+            else:
+                pens = [
+                    _pg.intColor(i, hues=max(ncurves, 9))
+                    for i in range(ncurves)]
+
+        for i in range(ncurves):
+            item = self._get_item(i)
+            item.setPen(pens[i])
+            item.setData(x, data[i])
+            item.setVisible(True)
+
+        for item in self.items[ncurves:]:
+            item.setData([], [])
+            item.setVisible(False)
+
+    def clear(self):
+        """Hide all curves."""
+        for item in self.items:
+            item.setData([], [])
+            item.setVisible(False)
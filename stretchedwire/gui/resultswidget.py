@@ -1,15 +1,26 @@
 # -*- coding: utf-8 -*-
 """Results Widget."""
 
+import sys as _sys
 import numpy as _np
+import traceback as _traceback
 from qtpy.QtWidgets import (
     QWidget as _QWidget,
+    QApplication as _QApplication,
     QMessageBox as _QMessageBox,
+    QFileDialog as _QFileDialog,
+    QInputDialog as _QInputDialog,
     )
 import qtpy.uic as _uic
 
 from stretchedwire.gui.utils import get_ui_file as _get_ui_file
-from stretchedwire.data import measurement as _meas
+from stretchedwire.gui.plotdata import CurveOverlay as _CurveOverlay
+from stretchedwire.data import meas as _meas
+from stretchedwire.data import archive as _archive
+from stretchedwire.data import analysis as _analysis
+from stretchedwire.data import cache as _cache
+from stretchedwire.data import query as _query
+from stretchedwire.data.measurement import StretchedWireMeas as _Meas
 
 
 class ResultsWidget(_QWidget):
@@ -24,56 +35,211 @@ class ResultsWidget(_QWidget):
         self.ui = _uic.loadUi(uifile, self)
 
         self.meas = _meas
+        self.first_overlay = _CurveOverlay(
+            self.ui.gv_first_integral.plotItem)
+        self.second_overlay = _CurveOverlay(
+            self.ui.gv_second_integral.plotItem)
+        self._overlay_data = {}
+
         # connect signals and slots
         self.connect_signal_slots()
 
     def connect_signal_slots(self):
         """Create signal and slot connections."""
         self.ui.pbt_save_results.clicked.connect(self.save_results)
+        self.ui.pbt_load_results.clicked.connect(self.load_results)
         self.ui.pbt_plot_results.clicked.connect(self.plot_results)
+        self.ui.pbt_plot_scans.clicked.connect(self.plot_scans)
+        self.ui.pbt_plot_records.clicked.connect(self.plot_records)
+        self.ui.chb_difference.stateChanged.connect(self.update_difference)
 
     def save_results(self):
-        """Saves measurements to file."""
-        self.meas.save_file('measurements.dat')
+        """Saves measurements to file or measurement archive."""
+        filename = _QFileDialog.getSaveFileName(
+            self, caption='Save measurement results',
+            directory='measurements.dat',
+            filter="Text files (*.txt *.dat);;"
+                   "Measurement archive (*{0:s})".format(
+                       _archive.ARCHIVE_EXTENSION))
+
+        if isinstance(filename, tuple):
+            filename = filename[0]
+
+        if len(filename) == 0:
+            return
+
+        _archive.save_measurement(self.meas, filename)
+
+    def load_results(self):
+        """Loads a measurement from a file or measurement archive."""
+        filename = _QFileDialog.getOpenFileName(
+            self, caption='Load measurement results',
+            filter="Text files (*.txt *.dat);;"
+                   "Measurement archive ({0:s})".format(
+                       _archive.METADATA_FILENAME))
+
+        if isinstance(filename, tuple):
+            filename = filename[0]
+
+        if len(filename) == 0:
+            return
+
+        try:
+            index = -1
+            path = _archive.get_archive_path(filename)
+            if path is not None:
+                count = len(_archive.MeasurementArchive(path))
+                if count == 0:
+                    _QMessageBox.information(self, 'Information',
+                                             'The archive is empty.',
+                                             _QMessageBox.Ok)
+                    return
+                if count > 1:
+                    index, ok = _QInputDialog.getInt(
+                        self, 'Load measurement results',
+                        'Archive index:', count - 1, 0, count - 1)
+                    if not ok:
+                        return
+
+            _archive.load_measurement(self.meas, filename, index=index)
+            self.plot_results()
+        except Exception:
+            _traceback.print_exc(file=_sys.stdout)
+            _QMessageBox.warning(self, 'Warning',
+                                 'Could not load the measurement.',
+                                 _QMessageBox.Ok)
+
+    def _get_plot(self, attr):
+        if attr == 'second_integral':
+            return self.ui.gv_second_integral, self.second_overlay
+        return self.ui.gv_first_integral, self.first_overlay
+
+    def _get_positions(self, npts):
+        """Return the positions [mm] of the integral points, if known."""
+        if None in (self.meas.start, self.meas.end):
+            return None
+        return _analysis.get_positions(self.meas.start, self.meas.end, npts)
+
+    def _get_values(self, attr):
+        """Return the integral values, empty if they were not calculated."""
+        # the default integrals are 0-d arrays with an undefined value
+        values = getattr(self.meas, attr, None)
+        if values is None or _np.ndim(values) == 0:
+            return _np.empty(0)
+        return _np.ravel(values)
+
+    def _get_attr(self):
+        if self.meas.type == 'Second Integral':
+            return 'second_integral'
+        return 'first_integral'
+
+    def _setup_plot(self, attr, positions):
+        plot_widget, overlay = self._get_plot(attr)
+        if attr == 'second_integral':
+            plot_widget.plotItem.setLabel(
+                'left', "Second Integral", units="T.m")
+        else:
+            plot_widget.plotItem.setLabel(
+                'left', "First Integral", units="T.m^2")
+        if positions is None:
+            plot_widget.plotItem.setLabel('bottom', "Points")
+        else:
+            plot_widget.plotItem.setLabel('bottom', "Position", units='mm')
+        plot_widget.plotItem.showGrid(x=True, y=True, alpha=0.2)
+        return overlay
+
+    def plot_overlay(self, attr, data, positions=None):
+        """Plot the rows of a stacked array in the integral plot.
+
+        Args:
+            attr (str): 'first_integral' or 'second_integral'.
+            data (numpy.ndarray): (n_curves, n_points) array.
+            positions (numpy.ndarray): positions [mm], or None to plot
+                against the point index.
+
+        """
+        overlay = self._setup_plot(attr, positions)
+        data = _np.atleast_2d(data)
+        self._overlay_data[attr] = (data, positions)
+        if positions is None:
+            positions = _np.arange(data.shape[1])
+        reference = None
+        if self.ui.chb_difference.isChecked() and data.shape[0] > 1:
+            reference = 0
+        overlay.set_curves(positions, data, reference=reference)
+
+    def update_difference(self):
+        """Plot the last overlays again with or without the reference."""
+        try:
+            for attr, (data, positions) in self._overlay_data.items():
+                self.plot_overlay(attr, data, positions)
+        except Exception:
+            _traceback.print_exc(file=_sys.stdout)
 
     def plot_results(self):
         """Plots first and second integrals."""
+        for attr, label in [('first_integral', 'first integral'),
+                            ('second_integral', 'second integral')]:
+            try:
+                values = self._get_values(attr)
+                if values.size == 0:
+                    continue
+                self.plot_overlay(
+                    attr, values, self._get_positions(values.size))
+            except Exception:
+                _traceback.print_exc(file=_sys.stdout)
+                _QMessageBox.warning(self, 'Warning',
+                                     'Could not plot {0:s} field.\n'
+                                     'Please, check your data.'.format(label),
+                                     _QMessageBox.Ok)
+
+    def plot_scans(self):
+        """Overlay the field integral of each scan of the measurement."""
         try:
-            self.ui.gv_first_integral.plotItem.curves.clear()
-            self.ui.gv_first_integral.clear()
-            self.ui.gv_first_integral.plotItem.setLabel(
-                'left', "First Integral", units="T.m^2")
-            self.ui.gv_first_integral.plotItem.setLabel(
-                'bottom', "Points")
-            self.ui.gv_first_integral.plotItem.showGrid(
-                x=True, y=True, alpha=0.2)
-
-            px = _np.linspace(0, len(self.meas.first_integral)-1,
-                              len(self.meas.first_integral))
-            self.ui.gv_first_integral.plotItem.plot(
-                px, self.meas.first_integral, pen=(255, 0, 0), symbol=None)
+            attr = self._get_attr()
+            # the scans are calculated once for the same raw data and
+            # reused by the fit and the bootstrap of the measurement
+            scans = _analysis.field_integral_scans(
+                self.meas.raw_data, self.meas.start, self.meas.end,
+                self.meas.step)
+            self.plot_overlay(
+                attr, scans, self._get_positions(scans.shape[1]))
+            print(_cache.format_stats(_analysis.cache.stats))
         except Exception:
+            _traceback.print_exc(file=_sys.stdout)
             _QMessageBox.warning(self, 'Warning',
-                                 'Could not plot first integral field.\n'
+                                 'Could not plot the measurement scans.\n'
                                  'Please, check your data.',
                                  _QMessageBox.Ok)
 
+    def plot_records(self):
+        """Overlay the stored measurements of the same magnet and axis."""
         try:
-            self.ui.gv_second_integral.plotItem.curves.clear()
-            self.ui.gv_second_integral.clear()
-            self.ui.gv_second_integral.plotItem.setLabel(
-                'left', "Second Integral", units="T.m")
-            self.ui.gv_second_integral.plotItem.setLabel(
-                'bottom', "Points")
-            self.ui.gv_second_integral.plotItem.showGrid(
-                x=True, y=True, alpha=0.2)
-
-            px = _np.linspace(0, len(self.meas.second_integral)-1,
-                              len(self.meas.second_integral))
-            self.ui.gv_second_integral.plotItem.plot(
-                px, self.meas.second_integral, pen=(255, 0, 0), symbol=None)
+            attr = self._get_attr()
+            values = self._get_values(attr)
+            grid = None
+            if values.size > 0:
+                grid = self._get_positions(values.size)
+
+            app = _QApplication.instance()
+            meas = _Meas(
+                database_name=app.database_name,
+                mongo=app.mongo, server=app.server)
+            stack = _query.query_stack(
+                meas, attr=attr, grid=grid,
+                magnet_name=self.meas.magnet_name, axis1=self.meas.axis1,
+                meas_type=self.meas.type)
+
+            if len(stack.ids) == 0:
+                _QMessageBox.information(self, 'Information',
+                                         'No stored measurements found.',
+                                         _QMessageBox.Ok)
+                return
+
+            print('Plotted measurements IDs: {0!s}'.format(stack.ids))
+            self.plot_overlay(attr, stack.data, stack.positions)
         except Exception:
+            _traceback.print_exc(file=_sys.stdout)
             _QMessageBox.warning(self, 'Warning',
-                                 'Could not plot second integral field.\n'
-                                 'Please, check your data.',
+                                 'Could not plot the stored measurements.',
                                  _QMessageBox.Ok)
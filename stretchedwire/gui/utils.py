@@ -21,8 +21,8 @@ MONGO = False
 SERVER = 'localhost'
 UPDATE_POSITIONS_INTERVAL = 0.5  # [s]
 UPDATE_PLOT_INTERVAL = 0.1  # [s]
-TABLE_NUMBER_ROWS = 1000
-TABLE_MAX_NUMBER_ROWS = 100
+TABLE_PAGE_SIZE = 200
+TABLE_CACHE_PAGES = 10
 TABLE_MAX_STR_SIZE = 100
 
 
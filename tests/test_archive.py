@@ -0,0 +1,79 @@
+"""Tests of the measurement archive."""
+
+import os
+import numpy as np
+import pytest
+
+from stretchedwire.data import archive
+from stretchedwire.data.measurement import StretchedWireMeas
+
+
+def _meas():
+    meas = StretchedWireMeas()
+    meas.magnet_name = 'Q20'
+    meas.start = -10.0
+    meas.end = 10.0
+    meas.step = 1.0
+    meas.raw_data = np.arange(5*19, dtype=float)
+    meas.n_scans = 5
+    meas.configuration_id = 3
+    meas.multipoles = np.array([1.0, 2.0, 3.0])
+    meas.integral_lower = np.linspace(0, 1, 19)
+    return meas
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_round_trip(tmp_path, compress):
+    path = str(tmp_path / ('a' + archive.ARCHIVE_EXTENSION))
+    archive.MeasurementArchive(
+        path, mode='a', compress=compress, chunk_size=64).append(_meas())
+
+    loaded = archive.load_measurement(
+        StretchedWireMeas(), os.path.join(path, archive.METADATA_FILENAME))
+    expected = _meas()
+    assert loaded.magnet_name == 'Q20'
+    assert loaded.n_scans == 5
+    assert loaded.configuration_id == 3
+    for attr in ['raw_data', 'multipoles', 'integral_lower']:
+        np.testing.assert_array_equal(
+            getattr(loaded, attr), getattr(expected, attr))
+
+
+def test_chunked_array_slices(tmp_path):
+    data = np.arange(1000, dtype=float).reshape(100, 10)
+    info = archive.write_chunks(str(tmp_path / 'x'), data, chunk_size=240)
+    array = archive.ChunkedArray(
+        str(tmp_path / 'x'), info['shape'], info['dtype'],
+        info['chunk_rows'], info['offsets'])
+
+    assert info['chunk_rows'] == 3
+    assert len(info['offsets']) == 35
+    assert array.shape == data.shape
+    for index in [5, -1, slice(None), slice(2, 8), slice(7, 70, 4),
+                  slice(80, 5, -3), slice(50, 50), (slice(1, 9), 3),
+                  (4, slice(2, 5)), [1, 5, 99]]:
+        np.testing.assert_array_equal(array[index], data[index])
+    np.testing.assert_array_equal(np.asarray(array), data)
+    assert len(array._chunks) <= array.max_chunks
+    with pytest.raises(IndexError):
+        array[100]
+
+
+def test_chunked_array_reads_only_selected_chunks(tmp_path):
+    data = np.arange(100000, dtype=float)
+    info = archive.write_chunks(str(tmp_path / 'x'), data, chunk_size=8000)
+    array = archive.ChunkedArray(
+        str(tmp_path / 'x'), info['shape'], info['dtype'],
+        info['chunk_rows'], info['offsets'])
+
+    np.testing.assert_array_equal(array[1500:2500], data[1500:2500])
+    assert sorted(array._chunks) == [1, 2]
+
+
+def test_chunked_scalar(tmp_path):
+    info = archive.write_chunks(str(tmp_path / 'x'), np.array(2.5))
+    array = archive.ChunkedArray(
+        str(tmp_path / 'x'), info['shape'], info['dtype'],
+        info['chunk_rows'], info['offsets'])
+    assert np.asarray(array) == 2.5
+    assert array.ndim == 0
@@ -0,0 +1,41 @@
+"""Tests of the binary encoding of measurement arrays."""
+
+import numpy as np
+import pytest
+
+from stretchedwire.data import arraycodec
+
+
+ARRAYS = [
+    np.linspace(-1, 1, 25),
+    np.arange(24, dtype=np.int32).reshape(2, 3, 4),
+    np.array([1 + 2j, 3 - 4j]),
+    np.array([True, False]),
+    np.zeros((0, 3)),
+    np.array(5.0),
+    np.arange(10, dtype='>f8'),
+    np.arange(20.).reshape(4, 5)[:, ::2],
+]
+
+
+@pytest.mark.parametrize('compress', [False, True])
+@pytest.mark.parametrize('array', ARRAYS)
+def test_round_trip(array, compress):
+    blob = arraycodec.encode_array(array, compress=compress)
+    assert arraycodec.is_encoded_array(blob)
+
+    decoded = arraycodec.decode_array(blob)
+    assert decoded.shape == array.shape
+    assert decoded.dtype == array.dtype.newbyteorder('<')
+    np.testing.assert_array_equal(decoded, array)
+
+
+def test_unsupported_dtype():
+    with pytest.raises(ValueError):
+        arraycodec.encode_array(np.array(['a', 'b']))
+
+
+def test_invalid_blob():
+    assert not arraycodec.is_encoded_array(b'text')
+    with pytest.raises(ValueError):
+        arraycodec.decode_array(b'XXXX' + bytes(10))
@@ -0,0 +1,43 @@
+"""Tests of the bootstrap confidence intervals."""
+
+import numpy as np
+import pytest
+
+from stretchedwire.data import bootstrap, fitting
+
+
+def _scans(nscans=10, npts=21, seed=1):
+    rng = np.random.default_rng(seed)
+    positions = np.linspace(-0.01, 0.01, npts)
+    field = 1e-3 + 0.2*positions + 5*positions**2
+    return positions, field + 1e-5*rng.standard_normal((nscans, npts))
+
+
+def test_resample_means():
+    data = np.arange(12.).reshape(4, 3)
+    means = bootstrap.resample_means(data, nresamples=7, chunk_size=3, seed=5)
+
+    rng = np.random.default_rng(5)
+    counts = np.concatenate([
+        rng.multinomial(4, np.full(4, 0.25), size=size)
+        for size in (3, 3, 1)])
+    np.testing.assert_allclose(means, counts @ data/4)
+
+
+def test_intervals_contain_the_mean():
+    positions, scans = _scans()
+    result = bootstrap.bootstrap_scans(
+        positions, scans, nresamples=500, order=2, seed=0)
+    mean = fitting.fit_polynomial(positions, scans, order=2).mean
+
+    assert result.nresamples == 500
+    assert np.all(result.integral_lower <= scans.mean(axis=0))
+    assert np.all(scans.mean(axis=0) <= result.integral_upper)
+    assert np.all(result.multipoles_lower <= mean)
+    assert np.all(mean <= result.multipoles_upper)
+
+
+def test_single_scan():
+    positions, scans = _scans(nscans=1)
+    with pytest.raises(ValueError):
+        bootstrap.bootstrap_scans(positions, scans, nresamples=10)
@@ -0,0 +1,77 @@
+"""Tests of the analysis results cache."""
+
+import numpy as np
+
+from stretchedwire.data import cache
+
+
+def test_key_depends_on_content():
+    data = np.arange(10.0)
+    key = cache.get_key('f', [data], parameters={'a': 1}, version=1)
+
+    assert key == cache.get_key(
+        'f', [data.copy()], parameters={'a': 1}, version=1)
+    changed = data.copy()
+    changed[3] += 1
+    assert key != cache.get_key(
+        'f', [changed], parameters={'a': 1}, version=1)
+    assert key != cache.get_key(
+        'f', [data.reshape(2, 5)], parameters={'a': 1}, version=1)
+    assert key != cache.get_key(
+        'f', [data], parameters={'a': 2}, version=1)
+    assert key != cache.get_key(
+        'f', [data], parameters={'a': 1}, version=2)
+
+
+def test_memory_lru():
+    analysis_cache = cache.AnalysisCache(maxsize=2)
+    for key in 'abc':
+        analysis_cache.put(key, {'x': np.zeros(3)})
+
+    assert analysis_cache.get('a') is None
+    assert analysis_cache.get('c') is not None
+    assert analysis_cache.stats['hits'] == 1
+    assert analysis_cache.stats['misses'] == 1
+
+
+def test_memory_size_limit():
+    analysis_cache = cache.AnalysisCache(max_memory_size=100)
+    analysis_cache.put('small', {'x': np.zeros(10)})
+    analysis_cache.put('large', {'x': np.zeros(20)})
+
+    assert analysis_cache.get('large') is None
+    assert analysis_cache.stats['memory_size'] == 80
+
+
+def test_returns_copies():
+    analysis_cache = cache.AnalysisCache()
+    value = {'x': np.arange(3.0)}
+    analysis_cache.put('a', value)
+    value['x'][0] = 10
+    cached = analysis_cache.get('a')
+    cached['x'][1] = 10
+
+    np.testing.assert_array_equal(analysis_cache.get('a')['x'], [0, 1, 2])
+
+
+def test_disk_tier(tmp_path):
+    value = {'x': np.arange(6.0).reshape(2, 3)}
+    analysis_cache = cache.AnalysisCache(directory=str(tmp_path))
+    analysis_cache.put('a', value)
+    analysis_cache.put('b', value, disk=False)
+
+    reopened = cache.AnalysisCache(directory=str(tmp_path))
+    np.testing.assert_array_equal(reopened.get('a')['x'], value['x'])
+    assert reopened.get('b') is None
+    assert reopened.stats['disk_hits'] == 1
+
+
+def test_disk_size_limit(tmp_path):
+    analysis_cache = cache.AnalysisCache(
+        maxsize=0, directory=str(tmp_path), max_disk_size=2000)
+    for key in 'abcd':
+        analysis_cache.put(key, {'x': np.zeros(100)})
+
+    assert analysis_cache.stats['disk_size'] <= 2000
+    assert analysis_cache.get('d') is not None
+    assert analysis_cache.get('a') is None
@@ -0,0 +1,59 @@
+"""Tests of the magnetic center and roll routine."""
+
+import numpy as np
+
+from stretchedwire.data import centering
+
+
+X0, Y0, ROLL, GRADIENT = 0.3, -0.2, 2e-3, 5.0
+
+
+def _field(x, y):
+    cos2, sin2 = np.cos(2*ROLL), np.sin(2*ROLL)
+    by = GRADIENT*((x - X0)*cos2 + (y - Y0)*sin2)
+    bx = GRADIENT*((y - Y0)*cos2 - (x - X0)*sin2)
+    return bx, by
+
+
+def _scan(axis, start, end, fixed, npts=21):
+    """Return the integrals measured by a wire moving along axis."""
+    positions = np.linspace(start, end, npts)
+    if axis == 'X':
+        _, by = _field(positions, fixed)
+        return positions, by
+    bx, _ = _field(fixed, positions)
+    return positions, -bx
+
+
+def test_fit_center_roll():
+    x = np.linspace(-5, 5, 11)
+    y = np.linspace(-5, 5, 11)
+    x_scans = (
+        np.concatenate([x, x]), np.repeat([-1.0, 1.0], x.size),
+        np.concatenate([_scan('X', -5, 5, -1, 11)[1],
+                        _scan('X', -5, 5, 1, 11)[1]]))
+    y_scans = (
+        np.concatenate([y, y]), np.repeat([-1.0, 1.0], y.size),
+        np.concatenate([_scan('Y', -5, 5, -1, 11)[1],
+                        _scan('Y', -5, 5, 1, 11)[1]]))
+
+    values, errors = centering.fit_center_roll(x_scans, y_scans)
+    np.testing.assert_allclose(values, [X0, Y0, ROLL, GRADIENT], atol=1e-9)
+    assert np.all(errors < 1e-9)
+
+
+def test_routine_converges_with_measured_signs():
+    routine = centering.CenterRollRoutine(_scan, window=5.0)
+    result = routine.run()
+
+    assert result.converged
+    assert abs(result.x0 - X0) < 1e-6
+    assert abs(result.y0 - Y0) < 1e-6
+    assert abs(result.roll - ROLL) < 1e-6
+    assert abs(result.gradient - GRADIENT) < 1e-6
+
+
+def test_routine_stops_on_progress():
+    routine = centering.CenterRollRoutine(_scan, window=5.0, min_sets=5)
+    result = routine.run(progress=lambda result: False)
+    assert result.nsets == 1
@@ -0,0 +1,117 @@
+"""Tests of the min/max decimation of long series."""
+
+import numpy as np
+import pytest
+
+from stretchedwire.data import decimation
+
+
+def _series(npts=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    x = np.linspace(-0.1, 0.1, npts)
+    y = np.sin(50*x) + rng.standard_normal(npts)*0.1
+    return x, y
+
+
+def _assert_levels_equal(pyramid, expected):
+    assert len(pyramid.levels) == len(expected.levels)
+    for (block, mn, mx), (eblock, emn, emx) in zip(
+            pyramid.levels, expected.levels):
+        assert block == eblock
+        np.testing.assert_array_equal(mn, emn)
+        np.testing.assert_array_equal(mx, emx)
+
+
+def test_levels_bracket_data():
+    x, y = _series(npts=10001)
+    pyramid = decimation.MinMaxPyramid(x, y, factor=4, min_points=64)
+
+    assert len(pyramid.levels) > 1
+    assert pyramid.levels[-1][1].size <= 64
+    for block, mn, mx in pyramid.levels:
+        nblocks = -(-y.size // block)
+        assert mn.size == mx.size == nblocks
+        for i in range(nblocks):
+            samples = y[i*block:(i + 1)*block]
+            assert mn[i] == samples.min()
+            assert mx[i] == samples.max()
+
+
+@pytest.mark.parametrize('steps', [[1, 2, 3, 4], [5000, 5001, 20000]])
+def test_incremental_update_matches_rebuild(steps):
+    x, y = _series()
+    sizes = [int(y.size*s/steps[-1]) for s in steps]
+    pyramid = decimation.MinMaxPyramid(x[:1], y[:1], min_points=64)
+    for size in sizes:
+        pyramid.update(x[:size], y[:size])
+        expected = decimation.MinMaxPyramid(
+            x[:size], y[:size], min_points=64)
+        _assert_levels_equal(pyramid, expected)
+
+
+def test_shorter_series_rebuilds():
+    x, y = _series()
+    pyramid = decimation.MinMaxPyramid(x, y, min_points=64)
+    pyramid.update(x[:1000], y[:1000] + 1)
+    expected = decimation.MinMaxPyramid(x[:1000], y[:1000] + 1, min_points=64)
+    _assert_levels_equal(pyramid, expected)
+
+
+def _check_view(xv, yv, x, y, xmin, xmax, pixels):
+    # positions stay monotonic and in the series bounds
+    diff = np.diff(xv)
+    assert np.all(diff >= 0) or np.all(diff <= 0)
+    assert xv.min() >= x.min() and xv.max() <= x.max()
+
+    # the view keeps the series extrema and no values outside them
+    assert yv.min() == y.min() and yv.max() == y.max()
+
+    # the visible range, extended to the samples next to the viewport, is
+    # decimated to less than factor min/max pairs per pixel and keeps its
+    # extrema
+    inside = (x >= xmin) & (x <= xmax)
+    index = np.nonzero(inside)[0]
+    lo = x[max(index[0] - 1, 0)]
+    hi = x[min(index[-1] + 1, x.size - 1)]
+    view = (xv >= min(lo, hi)) & (xv <= max(lo, hi))
+    assert view.sum() <= 2*4*pixels + 4
+    assert yv[view].min() <= y[inside].min()
+    assert yv[view].max() >= y[inside].max()
+
+
+@pytest.mark.parametrize('descending', [False, True])
+def test_view_of_positions(descending):
+    x, y = _series()
+    if descending:
+        x = x[::-1]
+    pyramid = decimation.MinMaxPyramid(x, y, min_points=64)
+    pixels = 200
+
+    for xmin, xmax in [(-0.1, 0.1), (-0.02, 0.03), (0.05, 0.0501)]:
+        xv, yv = pyramid.get_view(xmin, xmax, pixels)
+        _check_view(xv, yv, x, y, xmin, xmax, pixels)
+
+    # a viewport outside the series shows the whole series
+    xv, yv = pyramid.get_view(1, 2, pixels)
+    assert yv.min() == y.min() and yv.max() == y.max()
+
+
+def test_view_of_indexes():
+    _, y = _series()
+    x = np.arange(y.size, dtype=float)
+    pyramid = decimation.MinMaxPyramid(None, y, min_points=64)
+    pixels = 100
+
+    for xmin, xmax in [(0, y.size - 1), (1234.5, 5678.2), (-100, 300)]:
+        xv, yv = pyramid.get_view(xmin, xmax, pixels)
+        _check_view(xv, yv, x, y, xmin, xmax, pixels)
+
+
+def test_short_view_is_not_decimated():
+    x, y = _series(npts=1000)
+    pyramid = decimation.MinMaxPyramid(x, y, min_points=64)
+    xv, yv = pyramid.get_view(x[100], x[150], 500)
+    np.testing.assert_array_equal(xv[(xv >= x[99]) & (xv <= x[151])],
+                                  x[99:152])
+    np.testing.assert_array_equal(yv[(xv >= x[99]) & (xv <= x[151])],
+                                  y[99:152])
@@ -0,0 +1,65 @@
+"""Tests of the polynomial multipole fitting."""
+
+import numpy as np
+import pytest
+
+from stretchedwire.data import fitting
+
+
+def _scans(nscans=10, npts=21, seed=0):
+    rng = np.random.default_rng(seed)
+    positions = np.linspace(-0.01, 0.01, npts)
+    coeffs = np.array([1e-3, 2e-2, 5e-1])
+    scans = np.polyval(coeffs[::-1], positions)
+    scans = scans + rng.standard_normal((nscans, npts))*1e-6
+    return positions, scans
+
+
+@pytest.mark.parametrize('order', [1, 2, 3])
+def test_matches_polyfit(order):
+    positions, scans = _scans()
+    fit = fitting.fit_polynomial(positions, scans, order=order)
+
+    expected = np.array(
+        [np.polyfit(positions, scan, order)[::-1] for scan in scans])
+    np.testing.assert_allclose(
+        fit.coefficients, expected, rtol=1e-7, atol=1e-12)
+
+    residuals = scans - np.array(
+        [np.polyval(c[::-1], positions) for c in expected])
+    np.testing.assert_allclose(fit.residuals, residuals, atol=1e-12)
+    np.testing.assert_allclose(
+        fit.rms, np.sqrt(np.mean(residuals**2, axis=1)), rtol=1e-6)
+
+    np.testing.assert_allclose(fit.mean, expected.mean(axis=0), rtol=1e-7)
+    np.testing.assert_allclose(
+        fit.mean_error,
+        expected.std(axis=0, ddof=1)/np.sqrt(scans.shape[0]), rtol=1e-6)
+
+
+def test_errors_match_polyfit_covariance():
+    positions, scans = _scans(nscans=1)
+    fit = fitting.fit_polynomial(positions, scans, order=2)
+
+    _, cov = np.polyfit(positions, scans[0], 2, cov='unscaled')
+    residuals = fit.residuals[0]
+    variance = np.sum(residuals**2)/(positions.size - 3)
+    np.testing.assert_allclose(
+        fit.errors[0], np.sqrt(variance*np.diag(cov))[::-1], rtol=1e-6)
+    np.testing.assert_allclose(fit.mean_error, fit.errors[0])
+
+
+def test_weights():
+    positions, scans = _scans(nscans=1)
+    weights = np.linspace(1, 4, positions.size)
+    fit = fitting.fit_polynomial(positions, scans, order=2, weights=weights)
+
+    # polyfit weights multiply the residuals, not their squares
+    expected = np.polyfit(positions, scans[0], 2, w=np.sqrt(weights))
+    np.testing.assert_allclose(
+        fit.coefficients[0], expected[::-1], rtol=1e-7, atol=1e-12)
+
+
+def test_too_few_points():
+    with pytest.raises(ValueError):
+        fitting.fit_polynomial([0, 1], [[1, 2]], order=2)
@@ -0,0 +1,47 @@
+"""Tests of the spectral analysis of integrator captures."""
+
+import numpy as np
+import pytest
+
+from stretchedwire.data import spectrum
+
+
+RATE = 1000.0
+
+
+def _capture(size=2**14, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(size)/RATE
+    data = (np.sin(2*np.pi*60*t) + 0.5*np.sin(2*np.pi*180*t)
+            + 0.3*np.sin(2*np.pi*23*t))
+    return data + 0.01*rng.standard_normal(size)
+
+
+def test_psd_power_matches_variance():
+    data = np.random.default_rng(1).standard_normal(2**14)
+    freqs, psd, nsegments = spectrum.welch_psd(
+        data, RATE, segment_size=1024, overlap=0, window='boxcar')
+
+    assert nsegments == 16
+    assert freqs[-1] == pytest.approx(RATE/2)
+    power = np.sum(psd)*(freqs[1] - freqs[0])
+    assert power == pytest.approx(np.var(data), rel=1e-2)
+
+
+def test_noise_spectrum_lines():
+    freqs, psd, peaks = spectrum.noise_spectrum(
+        _capture(), RATE, segment_size=1000)
+
+    lines = {round(p.frequency): p for p in peaks}
+    assert {23, 60, 180} <= set(lines)
+    assert lines[60].source == 'mains'
+    assert lines[60].harmonic == 1
+    assert lines[180].source == 'mains'
+    assert lines[180].harmonic == 3
+    assert lines[23].source == 'wire'
+    assert peaks[0].frequency == pytest.approx(60)
+
+
+def test_not_enough_data():
+    with pytest.raises(ValueError):
+        spectrum.welch_psd([1.0], RATE)
@@ -0,0 +1,57 @@
+"""Tests of the running statistics of scans."""
+
+import numpy as np
+import pytest
+
+from stretchedwire.data import statistics
+
+
+def _scans(nscans=20, npts=15, seed=0):
+    rng = np.random.default_rng(seed)
+    return 1e3 + rng.standard_normal((nscans, npts))*np.linspace(1, 5, npts)
+
+
+def test_matches_numpy():
+    scans = _scans()
+    stats = statistics.RunningStatistics(scans.shape[1])
+    for scan in scans:
+        stats.update(scan)
+
+    assert stats.count == scans.shape[0]
+    np.testing.assert_allclose(stats.mean, scans.mean(axis=0))
+    np.testing.assert_allclose(stats.variance, scans.var(axis=0, ddof=1))
+    np.testing.assert_allclose(
+        stats.standard_error,
+        scans.std(axis=0, ddof=1)/np.sqrt(scans.shape[0]))
+
+
+def test_batch_update():
+    scans = _scans()
+    one = statistics.RunningStatistics(scans.shape[1])
+    for scan in scans:
+        one.update(scan)
+    batch = statistics.RunningStatistics(scans.shape[1])
+    batch.update(scans[:7])
+    batch.update(scans[7:])
+    np.testing.assert_allclose(batch.mean, one.mean)
+    np.testing.assert_allclose(batch.variance, one.variance)
+
+
+def test_convergence():
+    scans = _scans(npts=5)
+    stats = statistics.RunningStatistics(5)
+    assert np.isinf(stats.max_standard_error)
+    stats.update(scans[:2])
+    assert not stats.is_converged(1e3)
+
+    stats.update(scans[2:])
+    target = stats.max_standard_error
+    assert stats.is_converged(target)
+    assert not stats.is_converged(0.5*target)
+    assert not stats.is_converged(None)
+
+
+def test_invalid_size():
+    stats = statistics.RunningStatistics(5)
+    with pytest.raises(ValueError):
+        stats.update(np.zeros(4))